@@ -10,6 +10,13 @@ def create_backup(agenda_file):
                 data = f.read()
             with open(backup_file, 'wb') as f:
                 f.write(data)
+            # El diario de cambios forma parte de los datos: se copia junto a la instantánea
+            journal_file = agenda_file + ".journal"
+            if os.path.exists(journal_file):
+                with open(journal_file, 'rb') as f:
+                    data = f.read()
+                with open(journal_file + ".backup", 'wb') as f:
+                    f.write(data)
             return True, "Backup creado exitosamente"
         except Exception as e:
             return False, f"Error creando backup: {e}"
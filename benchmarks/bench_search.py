@@ -0,0 +1,51 @@
+"""
+Benchmark de la búsqueda por subcadena
+Compara el índice de trigramas con el recorrido lineal de la agenda y mide
+la búsqueda difusa
+
+Uso: python benchmarks/bench_search.py [cantidad_de_contactos]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_vault import make_contacts
+from contacts import Contact, new_contact_id
+from search_index import TrigramIndex, contact_text, normalize_text
+
+QUERIES = ["butterfield", "martín 12", "2966 1234", "valentina.lópez1", "río", "zz", "ri", "a"]
+FUZZY_QUERIES = ["nicloas gonzales", "butterfeld", "valentna", "sanchez romero"]
+
+def best_of(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    contacts = [Contact.from_dict(dict(data, id=new_contact_id())) for data in make_contacts(count)]
+    index, build_time = best_of(lambda: TrigramIndex(contacts), repeat=1)
+    print(f"{count} contactos, índice construido en {build_time * 1000:.0f} ms")
+    print(f"{'consulta':<22}{'resultados':>12}{'1ª vez (ms)':>14}{'índice (ms)':>14}{'recorrido (ms)':>16}")
+    for query in QUERIES:
+        # La primera consulta de uno o dos caracteres arma su lista
+        _, first_time = best_of(lambda: index.search(query), repeat=1)
+        found, index_time = best_of(lambda: index.search(query))
+        needle = normalize_text(query)
+        scanned, scan_time = best_of(lambda: [c.id for c in contacts if needle in contact_text(c)])
+        assert found == scanned, query
+        print(f"{query:<22}{len(found):>12}{first_time * 1000:>14.3f}{index_time * 1000:>14.3f}"
+              f"{scan_time * 1000:>16.1f}")
+    print(f"{'difusa':<22}{'resultados':>12}{'índice (ms)':>14}")
+    for query in FUZZY_QUERIES:
+        found, index_time = best_of(lambda: index.fuzzy_search(query))
+        print(f"{query:<22}{len(found):>12}{index_time * 1000:>14.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark del arranque de la aplicación
+Mide, en un proceso nuevo por corrida (importaciones en frío), cuánto tarda
+en aparecer la ventana de autenticación y cuánto pasa desde que se acepta
+la contraseña hasta que la tabla muestra la primera fila. Mientras la
+ventana está abierta se simula que se escribe la contraseña durante
+TYPING_SECONDS, así entra en la medición la derivación adelantada.
+
+Los tiempos se comparan con una base medida antes en la misma máquina
+(BASELINE_FILE, por cantidad de contactos): termina con código 1 si alguna
+medición empeora más de TOLERANCE respecto de la base (2 si no se pudo
+abrir Tk, por ejemplo sin display). Con --guardar-base se anotan los
+tiempos de esta corrida como la base nueva.
+
+Uso: python benchmarks/bench_startup.py [--guardar-base] [cantidad_de_contactos] [corridas]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+START = time.perf_counter()
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+
+# Base de tiempos de esta máquina y cuánto más lento se acepta (el mejor de las corridas)
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_startup_baseline.json")
+TOLERANCE = 0.25
+MEASUREMENTS = (("importar main", "import_main"),
+                ("ventana de autenticación", "auth_window"),
+                ("primera fila (desde aceptar)", "first_row"))
+# Tiempo que "se escribe" la contraseña con la ventana abierta
+TYPING_SECONDS = 1.0
+PASSWORD = "benchmark"
+
+def find_widgets(widget, widget_class):
+    found = [widget] if isinstance(widget, widget_class) else []
+    for child in widget.winfo_children():
+        found.extend(find_widgets(child, widget_class))
+    return found
+
+def run_child():
+    """Arranca la aplicación en este proceso e imprime los tiempos en JSON."""
+    times = {}
+    import tkinter as tk
+    import main
+    times["import_main"] = time.perf_counter() - START
+    original_wait = tk.Toplevel.wait_window
+    original_set_rows = main.VirtualTable.set_rows
+
+    def wait_window(window, *args):
+        times.setdefault("auth_window", time.perf_counter() - START)
+        window.update_idletasks()
+        entry = find_widgets(window, tk.Entry)[0]
+        accept = [button for button in find_widgets(window, tk.Button)
+                  if button.cget("text") == "ACEPTAR"][0]
+        entry.insert(0, PASSWORD)
+        app.schedule_speculation(entry)
+
+        def submit():
+            times["submit"] = time.perf_counter() - START
+            accept.invoke()
+        window.after(int(TYPING_SECONDS * 1000), submit)
+        return original_wait(window, *args)
+
+    def set_rows(table, contact_ids):
+        original_set_rows(table, contact_ids)
+        if contact_ids and "first_row" not in times:
+            table.tree.update_idletasks()
+            times["first_row"] = time.perf_counter() - START - times["submit"]
+
+    tk.Toplevel.wait_window = wait_window
+    main.VirtualTable.set_rows = set_rows
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.stdout.flush()
+        os._exit(2)
+    # La ventana de autenticación se abre dentro de __init__ y wait_window ya usa `app`
+    app = main.AgendaApp.__new__(main.AgendaApp)
+    main.AgendaApp.__init__(app, root)
+    print(json.dumps(times))
+    sys.stdout.flush()
+    # Sin cerrar la aplicación: la carga en segundo plano no forma parte de la medición
+    os._exit(0)
+
+def create_vault(directory, count):
+    from concurrent.futures import ThreadPoolExecutor
+    from bench_vault import make_contacts
+    from contacts import new_contact_id
+    from storage import create_backend
+    from vault_session import VaultSession
+    import main
+    engine = main.STORAGE_ENGINE
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 2)) as pool:
+        storage = create_backend(engine, os.path.join(directory, main.STORAGE_PATHS[engine]), pool)
+        session = VaultSession()
+        session.unlock(PASSWORD, storage)
+        storage.replace_all([dict(data, id=new_contact_id()) for data in make_contacts(count)])
+        storage.close()
+
+def load_baselines():
+    try:
+        with open(BASELINE_FILE, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def save_baselines(baselines):
+    with open(BASELINE_FILE, "w", encoding="utf-8") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+
+def main():
+    args = sys.argv[1:]
+    save = "--guardar-base" in args
+    args = [arg for arg in args if arg != "--guardar-base"]
+    count = int(args[0]) if len(args) > 0 else 10000
+    runs = int(args[1]) if len(args) > 1 else 3
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        create_vault(tmp, count)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                                    cwd=tmp, env=env, capture_output=True, text=True)
+            lines = output.stdout.strip().splitlines()
+            times = json.loads(lines[-1]) if lines else {"error": output.stderr.strip()}
+            if "error" in times:
+                print(f"No se pudo arrancar la aplicación: {times['error']}")
+                sys.exit(2)
+            results.append(times)
+
+    best = {field: min(times[field] for times in results) for _, field in MEASUREMENTS}
+    baselines = load_baselines()
+    baseline = baselines.get(str(count))
+    print(f"{count} contactos, {runs} corridas (mejor tiempo)")
+    print(f"{'medición':<34}{'ms':>8}{'base':>8}{'cambio':>9}")
+    failed = False
+    for label, field in MEASUREMENTS:
+        if baseline is None or save:
+            print(f"{label:<34}{best[field] * 1000:>8.0f}{'-':>8}{'-':>9}")
+            continue
+        change = best[field] / baseline[field] - 1
+        over = change > TOLERANCE
+        failed = failed or over
+        print(f"{label:<34}{best[field] * 1000:>8.0f}{baseline[field] * 1000:>8.0f}{change:>+9.0%}"
+              f"{'  EXCEDIDO' if over else ''}")
+    if save:
+        baselines[str(count)] = best
+        save_baselines(baselines)
+        print(f"Base guardada en {BASELINE_FILE}")
+    elif baseline is None:
+        print("No hay base para esta cantidad de contactos: correr con --guardar-base para anotarla")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        run_child()
+    else:
+        main()
@@ -0,0 +1,85 @@
+"""
+Benchmark del formato de la bóveda
+Compara tamaño de archivo y tiempos de guardado/carga entre el formato viejo
+(JSON con indent=4 en un solo token Fernet) y las codificaciones segmentadas
+
+Uso: python benchmarks/bench_vault.py [cantidad_de_contactos]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cryptography.fernet import Fernet
+
+from vault_format import VaultReader, write_vault
+
+FIRST_NAMES = ["Nicolás", "María", "José", "Lucía", "Martín", "Sofía", "Andrés", "Camila",
+               "Juan", "Valentina", "Diego", "Florencia", "Tomás", "Agustina", "Iván"]
+LAST_NAMES = ["González", "Rodríguez", "Fernández", "López", "Martínez", "Pérez",
+              "Gómez", "Díaz", "Sánchez", "Romero", "Butterfield", "Álvarez"]
+STREETS = ["San Martín", "Belgrano", "Rivadavia", "Mitre", "Sarmiento", "Kirchner"]
+
+def make_contacts(count: int, seed: int = 42):
+    """Genera una agenda sintética reproducible."""
+    rng = random.Random(seed)
+    contacts = []
+    for i in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        contacts.append({
+            "name": f"{first} {last}",
+            "phone": f"+54 9 2966 {rng.randint(100000, 999999)}",
+            "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+            "address": f"{rng.choice(STREETS)} {rng.randint(1, 3000)}, Río Gallegos",
+            "birthday": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1950, 2010)}",
+        })
+    return contacts
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def bench_legacy(path, fernet, contacts):
+    def save():
+        data = json.dumps(contacts, indent=4, ensure_ascii=False).encode('utf-8')
+        with open(path, 'wb') as file:
+            file.write(fernet.encrypt(data))
+    def load():
+        with open(path, 'rb') as file:
+            return json.loads(fernet.decrypt(file.read()).decode('utf-8'))
+    _, save_time = timed(save)
+    loaded, load_time = timed(load)
+    assert len(loaded) == len(contacts)
+    return os.path.getsize(path), save_time, load_time
+
+def bench_segmented(path, fernet, contacts, encoding, pool):
+    _, save_time = timed(lambda: write_vault(path, fernet, contacts, pool, encoding=encoding))
+    loaded, load_time = timed(lambda: VaultReader(path, fernet).read_all(pool))
+    assert len(loaded) == len(contacts)
+    return os.path.getsize(path), save_time, load_time
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    contacts = make_contacts(count)
+    fernet = Fernet(Fernet.generate_key())
+    pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 2))
+    print(f"{count} contactos")
+    print(f"{'formato':<28}{'tamaño (KiB)':>14}{'guardar (ms)':>14}{'cargar (ms)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = [("un token, indent=4", bench_legacy(os.path.join(tmp, "legacy.enc"), fernet, contacts))]
+        for encoding in ("json", "json+zlib", "json+lzma"):
+            path = os.path.join(tmp, f"{encoding}.enc")
+            rows.append((f"segmentado, {encoding}", bench_segmented(path, fernet, contacts, encoding, pool)))
+    for label, (size, save_time, load_time) in rows:
+        print(f"{label:<28}{size / 1024:>14.0f}{save_time * 1000:>14.0f}{load_time * 1000:>14.0f}")
+
+if __name__ == "__main__":
+    main()
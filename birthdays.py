@@ -0,0 +1,139 @@
+"""
+Cumpleaños para la aplicación Agenda
+Cada fecha DD/MM/YYYY se convierte una sola vez en el día del año y se
+guarda en una lista ordenada, así "quién cumple en los próximos N días" se
+resuelve con búsqueda binaria
+"""
+
+import datetime
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from contacts import Contact
+
+# Año bisiesto de referencia: el 29/02 tiene su propio día del año
+_REFERENCE_YEAR = 2000
+_DAYS_IN_YEAR = 366
+UPCOMING_DAYS = 14
+
+def birthday_key(birthday: str) -> Optional[int]:
+    """Día del año (0-365, en un año bisiesto) de una fecha DD/MM/YYYY, o None."""
+    try:
+        day, month, _year = (int(part) for part in birthday.split("/"))
+        date = datetime.date(_REFERENCE_YEAR, month, day)
+    except (AttributeError, ValueError):
+        return None
+    return date.timetuple().tm_yday - 1
+
+def _key_to_month_day(key: int) -> Tuple[int, int]:
+    date = datetime.date(_REFERENCE_YEAR, 1, 1) + datetime.timedelta(days=key)
+    return date.month, date.day
+
+def next_birthday(key: int, today: datetime.date) -> datetime.date:
+    """Próxima fecha (hoy incluido) en que se cumple años; el 29/02 se festeja el 28/02."""
+    month, day = _key_to_month_day(key)
+    for year in (today.year, today.year + 1):
+        try:
+            date = datetime.date(year, month, day)
+        except ValueError:
+            date = datetime.date(year, 2, 28)
+        if date >= today:
+            return date
+    raise AssertionError("unreachable")
+
+class BirthdayIndex:
+    """Lista ordenada de (día del año, id) con actualización incremental."""
+
+    def __init__(self, contacts: Iterable[Contact] = ()):
+        self._keys: Dict[str, int] = {}
+        # Contactos con una fecha cargada que no se pudo leer
+        self._unparsed: Dict[str, None] = {}
+        entries = []
+        for contact in contacts:
+            key = birthday_key(contact.birthday)
+            if key is not None:
+                self._keys[contact.id] = key
+                entries.append((key, contact.id))
+            elif contact.birthday.strip():
+                self._unparsed[contact.id] = None
+        entries.sort()
+        self._entries: List[Tuple[int, str]] = entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, contact: Contact) -> None:
+        """Indexa el cumpleaños de un contacto (o lo actualiza si cambió)."""
+        key = birthday_key(contact.birthday)
+        if key is not None and self._keys.get(contact.id) == key:
+            return
+        self.remove(contact.id)
+        if key is not None:
+            self._keys[contact.id] = key
+            insort(self._entries, (key, contact.id))
+        elif contact.birthday.strip():
+            self._unparsed[contact.id] = None
+
+    update = add
+
+    def remove(self, contact_id: str) -> None:
+        self._unparsed.pop(contact_id, None)
+        key = self._keys.pop(contact_id, None)
+        if key is not None:
+            position = bisect_left(self._entries, (key, contact_id))
+            del self._entries[position]
+
+    def _between(self, start: int, end: int) -> List[Tuple[int, str]]:
+        """Entradas con start <= día < end, dando la vuelta al fin de año."""
+        if end <= _DAYS_IN_YEAR:
+            low = bisect_left(self._entries, (start,))
+            high = bisect_left(self._entries, (end,))
+            return self._entries[low:high]
+        return self._between(start, _DAYS_IN_YEAR) + self._between(0, end - _DAYS_IN_YEAR)
+
+    def matching(self, day: Optional[int] = None, month: Optional[int] = None) -> List[str]:
+        """Ids de quienes cumplen ese día y/o mes (None = cualquiera)."""
+        if month is None:
+            months = range(1, 13)
+        elif 1 <= month <= 12:
+            months = (month,)
+        else:
+            return []
+        entries = []
+        for current in months:
+            if day is None:
+                start = birthday_key(f"01/{current}/{_REFERENCE_YEAR}")
+                end = birthday_key(f"01/{current + 1}/{_REFERENCE_YEAR}") if current < 12 else _DAYS_IN_YEAR
+            else:
+                start = birthday_key(f"{day}/{current}/{_REFERENCE_YEAR}")
+                if start is None:
+                    continue
+                end = start + 1
+            entries.extend(self._between(start, end))
+        return [contact_id for _key, contact_id in entries]
+
+    def unparsed(self) -> List[str]:
+        """Ids de los contactos con una fecha de cumpleaños ilegible."""
+        return list(self._unparsed)
+
+    def upcoming(self, days: int = UPCOMING_DAYS,
+                 today: Optional[datetime.date] = None) -> List[Tuple[str, datetime.date, int]]:
+        """
+        Cumpleaños de hoy a `days` días, como (id, fecha, días que faltan),
+        ordenados por cercanía.
+        """
+        today = today or datetime.date.today()
+        start = birthday_key(today.strftime("%d/%m/%Y"))
+        # Un día de margen: fuera de los bisiestos el día del año corre uno
+        if days + 2 >= _DAYS_IN_YEAR:
+            entries = self._entries
+        else:
+            entries = self._between(start, start + days + 2)
+        result = []
+        for key, contact_id in entries:
+            date = next_birthday(key, today)
+            remaining = (date - today).days
+            if remaining <= days:
+                result.append((contact_id, date, remaining))
+        result.sort(key=lambda item: item[2])
+        return result
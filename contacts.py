@@ -0,0 +1,109 @@
+"""
+Modelo de contactos para la aplicación Agenda
+Cada contacto es un objeto con __slots__ (sin diccionario por instancia) e
+identificador estable; la agenda los indexa por id
+"""
+
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional
+
+FIELDS = ("id", "name", "phone", "email", "address", "birthday")
+
+def new_contact_id() -> str:
+    """Genera un identificador estable para un contacto nuevo."""
+    return uuid.uuid4().hex
+
+def normalize_phone(phone: str) -> str:
+    """Deja solo los dígitos del teléfono."""
+    return ''.join(filter(str.isdigit, phone or ""))
+
+def normalize_email(email: str) -> str:
+    """Correo sin espacios y en minúsculas."""
+    return (email or "").strip().casefold()
+
+class Contact:
+    """
+    Contacto de la agenda.
+
+    Admite también el acceso tipo diccionario (`contact["name"]`,
+    `contact.get("birthday", "")`) que usan la exportación y la mensajería.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, id: str, name: str, phone: str = "", email: str = "",
+                 address: str = "", birthday: str = ""):
+        self.id = id
+        self.name = name
+        self.phone = phone
+        self.email = email
+        self.address = address
+        self.birthday = birthday
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Contact":
+        """Crea un contacto desde el diccionario guardado en el almacenamiento."""
+        return cls(data.get("id") or new_contact_id(), data.get("name", ""),
+                   data.get("phone", ""), data.get("email", ""),
+                   data.get("address", ""), data.get("birthday", ""))
+
+    def to_dict(self) -> Dict:
+        """Devuelve el diccionario que se guarda en el almacenamiento."""
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def __getitem__(self, field: str) -> str:
+        if field not in FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field: str, default=None):
+        return getattr(self, field) if field in FIELDS else default
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Contact):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Contact(id={self.id!r}, name={self.name!r})"
+
+class ContactStore:
+    """
+    Contactos en el orden de la agenda, indexados por id.
+
+    Un diccionario mantiene el orden de inserción, así que buscar, reemplazar
+    (en su lugar) y borrar un contacto por id son O(1).
+    """
+
+    def __init__(self, contacts: Iterable[Contact] = ()):
+        self._by_id: Dict[str, Contact] = {}
+        self.extend(contacts)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[Contact]:
+        return iter(self._by_id.values())
+
+    def __contains__(self, contact_id: str) -> bool:
+        return contact_id in self._by_id
+
+    def get(self, contact_id: str) -> Optional[Contact]:
+        return self._by_id.get(contact_id)
+
+    def put(self, contact: Contact) -> None:
+        """Agrega el contacto o reemplaza al que tiene su mismo id."""
+        self._by_id[contact.id] = contact
+
+    def extend(self, contacts: Iterable[Contact]) -> None:
+        for contact in contacts:
+            self._by_id[contact.id] = contact
+
+    def remove(self, contact_id: str) -> Contact:
+        return self._by_id.pop(contact_id)
+
+    def to_dicts(self) -> List[Dict]:
+        """Copia de la agenda en el formato del almacenamiento."""
+        return [contact.to_dict() for contact in self._by_id.values()]
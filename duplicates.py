@@ -0,0 +1,139 @@
+"""
+Detección de contactos duplicados para la aplicación Agenda
+En lugar de comparar todos contra todos, cada contacto se reparte en
+bloques (teléfono, correo, nombre fonético) y solo se comparan los
+contactos que comparten algún bloque
+"""
+
+from itertools import combinations
+from typing import Dict, Iterable, List, Set, Tuple
+
+from contacts import FIELDS, Contact, normalize_email, normalize_phone
+from lookup_index import PHONE_SUFFIX_DIGITS
+from search_index import normalize_text, trigrams
+
+# Bloques más grandes que esto (un nombre muy común) no generan pares:
+# compararlos sería cuadrático y ya los cubren los otros bloques
+MAX_BLOCK_SIZE = 50
+# Puntaje mínimo para sugerir que dos contactos son el mismo
+DUPLICATE_THRESHOLD = 0.6
+
+# Simplificaciones fonéticas del español, en orden
+_PHONETIC_RULES = [
+    ("ch", "x"), ("ll", "y"), ("qu", "k"), ("ce", "se"), ("ci", "si"),
+    ("c", "k"), ("z", "s"), ("v", "b"), ("w", "u"), ("h", ""), ("y", "i"),
+]
+
+def phonetic_key(word: str) -> str:
+    """Clave fonética aproximada de una palabra ya normalizada."""
+    for old, new in _PHONETIC_RULES:
+        word = word.replace(old, new)
+    # Letras repetidas seguidas cuentan como una
+    return "".join(char for i, char in enumerate(word) if i == 0 or char != word[i - 1])
+
+def blocking_keys(contact: Contact) -> Set[str]:
+    """Bloques a los que pertenece un contacto."""
+    keys = set()
+    phone = normalize_phone(contact.phone)
+    if len(phone) >= 6:
+        keys.add("p:" + phone[-PHONE_SUFFIX_DIGITS:])
+    email = normalize_email(contact.email)
+    if email:
+        keys.add("e:" + email)
+    words = normalize_text(contact.name).split()
+    if words:
+        keys.add("n:" + " ".join(sorted(phonetic_key(word) for word in words)))
+    return keys
+
+def candidate_pairs(contacts: Iterable[Contact]) -> Set[Tuple[str, str]]:
+    """Pares de ids que comparten al menos un bloque (cada par una sola vez)."""
+    blocks: Dict[str, List[str]] = {}
+    for contact in contacts:
+        for key in blocking_keys(contact):
+            blocks.setdefault(key, []).append(contact.id)
+    pairs = set()
+    for ids in blocks.values():
+        if 1 < len(ids) <= MAX_BLOCK_SIZE:
+            pairs.update(combinations(ids, 2))
+    return pairs
+
+def _similarity(a: str, b: str) -> float:
+    """Similitud de Jaccard entre los trigramas de dos textos."""
+    grams_a = trigrams(f" {normalize_text(a)} ")
+    grams_b = trigrams(f" {normalize_text(b)} ")
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+def score_pair(a: Contact, b: Contact) -> float:
+    """Puntaje entre 0 y 1 de que dos contactos sean la misma persona."""
+    score = 0.5 * _similarity(a.name, b.name)
+    phone_a, phone_b = normalize_phone(a.phone), normalize_phone(b.phone)
+    if phone_a and phone_b and (phone_a.endswith(phone_b) or phone_b.endswith(phone_a)):
+        score += 0.35
+    email_a, email_b = normalize_email(a.email), normalize_email(b.email)
+    if email_a and email_a == email_b:
+        score += 0.35
+    if a.birthday and b.birthday:
+        score += 0.1 if a.birthday == b.birthday else -0.3
+    if a.address and b.address and _similarity(a.address, b.address) > 0.6:
+        score += 0.1
+    return max(0.0, min(score, 1.0))
+
+def _completeness(contact: Contact) -> int:
+    return sum(1 for field in FIELDS if getattr(contact, field))
+
+def find_duplicates(contacts: List[Contact],
+                    threshold: float = DUPLICATE_THRESHOLD) -> List[Tuple[float, List[Contact]]]:
+    """
+    Agrupa los contactos que parecen duplicados.
+
+    Devuelve (puntaje, contactos) por grupo, de mayor a menor puntaje. El
+    puntaje del grupo es el mejor de sus pares. El primer contacto de cada
+    grupo es el más completo: es el que se conserva al fusionar.
+    """
+    by_id = {contact.id: contact for contact in contacts}
+    # Conjuntos disjuntos: cada par que supera el umbral une dos grupos
+    parent: Dict[str, str] = {}
+    best: Dict[str, float] = {}
+
+    def find(contact_id: str) -> str:
+        while parent[contact_id] != contact_id:
+            parent[contact_id] = parent[parent[contact_id]]
+            contact_id = parent[contact_id]
+        return contact_id
+
+    for id_a, id_b in candidate_pairs(contacts):
+        score = score_pair(by_id[id_a], by_id[id_b])
+        if score < threshold:
+            continue
+        root_a = find(parent.setdefault(id_a, id_a))
+        root_b = find(parent.setdefault(id_b, id_b))
+        parent[root_b] = root_a
+        best[root_a] = max(score, best.get(root_a, 0.0),
+                           best.pop(root_b, 0.0) if root_b != root_a else 0.0)
+
+    groups: Dict[str, List[Contact]] = {}
+    for contact in contacts:
+        if contact.id in parent:
+            groups.setdefault(find(contact.id), []).append(contact)
+    result = []
+    for root, group in groups.items():
+        # sort es estable: a igual completitud queda el que aparece antes
+        group.sort(key=_completeness, reverse=True)
+        result.append((best[root], group))
+    result.sort(key=lambda item: item[0], reverse=True)
+    return result
+
+def merge_group(group: List[Contact]) -> Contact:
+    """
+    Fusiona un grupo en su primer contacto: conserva su id y sus valores,
+    y completa los campos vacíos con los de los demás.
+    """
+    primary = group[0]
+    values = {field: getattr(primary, field) for field in FIELDS}
+    for other in group[1:]:
+        for field in FIELDS:
+            if not values[field]:
+                values[field] = getattr(other, field)
+    return Contact(**values)
@@ -0,0 +1,310 @@
+"""
+Exportaciones en segundo plano para la aplicación Agenda
+Los PDF se generan en un proceso aparte (reportlab no suelta el GIL), de a
+uno por vez y en el orden en que se pidieron. El proceso informa el avance
+por una cola y la interfaz lo consulta desde el hilo de Tk
+
+La exportación "un PDF por contacto" reparte los contactos en lotes entre
+varios procesos, uno por núcleo
+"""
+
+import datetime
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+# Funciones de export_pdf que se pueden usar en un trabajo
+EXPORT_FUNCTIONS = ("export_selected_to_pdf", "export_all_to_pdf", "export_individual_to_pdf")
+# Trabajo de un PDF por contacto (lo resuelve ExportJobs con varios procesos)
+BATCH_EXPORT = "export_contacts_batch"
+# Contactos por tarea del lote: menos viajes entre procesos, sin dejar
+# núcleos sin trabajo al final
+BATCH_CHUNK = 20
+BATCH_WORKERS = os.cpu_count() or 1
+
+# Estados de un trabajo
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+# Del lado del proceso de exportación: cola de avance y trabajo a cancelar
+_progress_queue = None
+_cancelled_job = None
+
+def _init_worker(progress_queue, cancelled_job) -> None:
+    global _progress_queue, _cancelled_job
+    _progress_queue = progress_queue
+    _cancelled_job = cancelled_job
+    _prepare_documents()
+
+def _run_export(job_id: int, function: str, contacts: List[Dict]):
+    """Corre en el proceso de exportación: devuelve (éxito, mensaje)."""
+    import export_pdf
+
+    def progress(rows: int, pages: int) -> None:
+        if _cancelled_job.value == job_id:
+            raise export_pdf.ExportCancelled()
+        _progress_queue.put((job_id, rows, pages))
+
+    return getattr(export_pdf, function)(contacts, progress=progress)
+
+def _prepare_documents() -> None:
+    # Estilos y encabezado una sola vez por proceso, antes del primer documento
+    import export_pdf
+    export_pdf.document_header()
+
+def _render_batch(contacts: List[Dict], directory: Optional[str]) -> Tuple[List[Tuple[str, Optional[bytes]]], int]:
+    """
+    Corre en un proceso del lote: escribe el PDF de cada contacto en
+    `directory` o, sin carpeta, devuelve su contenido para el zip. Devuelve
+    también el total de páginas escritas.
+    """
+    import io
+    import export_pdf
+    files = []
+    pages = 0
+    for contact in contacts:
+        filename = export_pdf.contact_pdf_filename(contact)
+        if directory is None:
+            buffer = io.BytesIO()
+            pages += export_pdf.write_contact_pdf(contact, buffer)
+            files.append((filename, buffer.getvalue()))
+        else:
+            pages += export_pdf.write_contact_pdf(contact, os.path.join(directory, filename))
+            files.append((filename, None))
+    return files, pages
+
+class ExportJob:
+    """Estado de una exportación, visto desde la interfaz."""
+
+    def __init__(self, job_id: int, function: str, label: str, contacts: List[Dict],
+                 zip_output: bool = False):
+        self.id = job_id
+        self.function = function
+        self.label = label
+        self.zip_output = zip_output
+        self.cancel_requested = False
+        self.total = len(contacts)
+        self.rows = 0
+        self.pages = 0
+        self.state = QUEUED
+        self.message = ""
+        self._contacts: Optional[List[Dict]] = contacts
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+class ExportJobs:
+    """
+    Cola de exportaciones que corren en un proceso de trabajo.
+
+    El proceso se crea con el primer trabajo y se reutiliza (reportlab se
+    importa una sola vez). Hay un solo trabajo en el proceso a la vez: los
+    demás esperan acá, así cancelar uno en espera es solo sacarlo de la
+    cola; el que está corriendo se interrumpe en la próxima página.
+    `poll()` se llama desde el hilo de Tk y devuelve los trabajos que
+    cambiaron desde la llamada anterior.
+
+    Un trabajo BATCH_EXPORT no usa ese proceso: un hilo lo reparte en lotes
+    entre un pool de BATCH_WORKERS procesos que se crea para ese trabajo.
+    """
+
+    def __init__(self):
+        # "spawn": hacer fork de un proceso con hilos y Tk no es seguro
+        self._context = multiprocessing.get_context("spawn")
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._progress = None
+        self._cancelled = None
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._running: Optional[ExportJob] = None
+        self._finished = queue.Queue()
+        # Avance de los trabajos por lotes (lo informa su hilo, no el proceso)
+        self._batch_progress = queue.Queue()
+        self._batch_thread: Optional[threading.Thread] = None
+        self._next_id = 1
+        self.jobs: Dict[int, ExportJob] = {}
+
+    def submit(self, function: str, label: str, contacts: List[Dict],
+               zip_output: bool = False) -> ExportJob:
+        """
+        Encola una exportación (`contacts` ya debe ser una copia).
+        `zip_output` solo vale para BATCH_EXPORT: junta los PDF en un .zip.
+        """
+        if function not in EXPORT_FUNCTIONS and function != BATCH_EXPORT:
+            raise ValueError(f"Exportación desconocida: {function}")
+        with self._lock:
+            job = ExportJob(self._next_id, function, label, contacts, zip_output)
+            self._next_id += 1
+            self.jobs[job.id] = job
+            self._pending.append(job)
+            self._start_next()
+        return job
+
+    def cancel(self, job_id: int) -> None:
+        """Cancela un trabajo en espera o interrumpe el que está corriendo."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            if job in self._pending:
+                self._pending.remove(job)
+                job._contacts = None
+                self._finished.put((job, CANCELLED, "Exportación cancelada"))
+            elif job is self._running:
+                job.cancel_requested = True
+                if job.function != BATCH_EXPORT:
+                    self._cancelled.value = job_id
+
+    @property
+    def active(self) -> bool:
+        """Indica si queda algún trabajo sin terminar."""
+        return any(not job.finished for job in self.jobs.values())
+
+    def poll(self) -> List[ExportJob]:
+        """Aplica el avance y los resultados recibidos; devuelve los trabajos que cambiaron."""
+        changed = {}
+        for progress in (self._progress, self._batch_progress):
+            while progress is not None:
+                try:
+                    job_id, rows, pages = progress.get_nowait()
+                except queue.Empty:
+                    break
+                job = self.jobs.get(job_id)
+                if job is not None and not job.finished:
+                    job.rows, job.pages = rows, pages
+                    changed[job.id] = job
+        with self._lock:
+            running = self._running
+        if running is not None and running.state == QUEUED:
+            running.state = RUNNING
+            changed[running.id] = running
+        while True:
+            try:
+                job, state, message = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            job.state, job.message = state, message
+            changed[job.id] = job
+        return list(changed.values())
+
+    def shutdown(self) -> None:
+        """Cancela todo y espera a que termine el proceso de exportación."""
+        with self._lock:
+            for job in self._pending:
+                job._contacts = None
+            self._pending.clear()
+            if self._running is not None:
+                self._running.cancel_requested = True
+                if self._cancelled is not None:
+                    self._cancelled.value = self._running.id
+            executor, self._executor = self._executor, None
+            batch = self._batch_thread
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if batch is not None:
+            batch.join()
+
+    def _start_next(self) -> None:
+        # Se llama con _lock tomado
+        if self._running is not None or not self._pending:
+            return
+        if self._pending[0].function == BATCH_EXPORT:
+            job = self._pending.popleft()
+            contacts, job._contacts = job._contacts, None
+            self._running = job
+            self._batch_thread = threading.Thread(target=self._run_batch, args=(job, contacts),
+                                                  name="exportacion-lote", daemon=True)
+            self._batch_thread.start()
+            return
+        if self._executor is None:
+            self._progress = self._context.Queue()
+            self._cancelled = self._context.Value('i', 0)
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=self._context,
+                                                 initializer=_init_worker,
+                                                 initargs=(self._progress, self._cancelled))
+        job = self._pending.popleft()
+        contacts, job._contacts = job._contacts, None
+        self._running = job
+        future = self._executor.submit(_run_export, job.id, job.function, contacts)
+        future.add_done_callback(lambda future: self._job_done(job, future))
+
+    def _job_done(self, job: ExportJob, future: Future) -> None:
+        try:
+            success, message = future.result()
+            state = DONE if success else FAILED
+            if not success and self._cancelled.value == job.id:
+                state = CANCELLED
+        except Exception as e:
+            state, message = FAILED, f"Error al exportar: {e}"
+        self._finish(job, state, message)
+
+    def _finish(self, job: ExportJob, state: str, message: str) -> None:
+        self._finished.put((job, state, message))
+        with self._lock:
+            self._running = None
+            self._start_next()
+
+    def _run_batch(self, job: ExportJob, contacts: List[Dict]) -> None:
+        """Hilo de un trabajo BATCH_EXPORT: reparte los lotes y arma el zip."""
+        import export_pdf
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        # Con el número de trabajo: dos lotes en el mismo segundo no se pisan
+        name = f"contactos_individuales_{stamp}_{job.id}"
+        archive = directory = target = None
+        try:
+            if job.zip_output:
+                target = export_pdf.export_path(name + ".zip")
+                archive = zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED)
+            else:
+                directory = export_pdf.export_path(name)
+                os.makedirs(directory)
+                target = directory
+            chunks = [contacts[i:i + BATCH_CHUNK] for i in range(0, len(contacts), BATCH_CHUNK)]
+            workers = max(1, min(BATCH_WORKERS, len(chunks)))
+            written = pages = 0
+            with ProcessPoolExecutor(max_workers=workers, mp_context=self._context,
+                                     initializer=_prepare_documents) as pool:
+                futures = {pool.submit(_render_batch, chunk, directory): len(chunk) for chunk in chunks}
+                try:
+                    for future in as_completed(futures):
+                        if job.cancel_requested:
+                            break
+                        files, chunk_pages = future.result()
+                        for filename, data in files:
+                            if archive is not None:
+                                archive.writestr(filename, data)
+                        written += futures[future]
+                        pages += chunk_pages
+                        self._batch_progress.put((job.id, written, pages))
+                finally:
+                    # Al cancelar o fallar, los lotes que no empezaron ya no se corren
+                    for pending in futures:
+                        pending.cancel()
+            if archive is not None:
+                archive.close()
+            if job.cancel_requested:
+                self._remove_output(target, job.zip_output)
+                self._finish(job, CANCELLED, "Exportación cancelada")
+                return
+            self._finish(job, DONE, f"{len(contacts)} contactos exportados a {target}")
+        except Exception as e:
+            if archive is not None:
+                archive.close()
+            if target is not None:
+                self._remove_output(target, job.zip_output)
+            self._finish(job, FAILED, f"Error al exportar contactos: {e}")
+
+    @staticmethod
+    def _remove_output(target: str, is_archive: bool) -> None:
+        # Como en las otras exportaciones, no queda nada a medias
+        if is_archive:
+            if os.path.exists(target):
+                os.remove(target)
+        else:
+            shutil.rmtree(target, ignore_errors=True)
@@ -1,31 +1,141 @@
 import datetime
 import os
+import re
+from functools import lru_cache
+from xml.sax.saxutils import escape
+from itertools import chain, islice
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import (
     SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 )
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase.pdfmetrics import stringWidth
 
 from reportlab.lib.colors import HexColor
 from reportlab.platypus import Flowable
 
 EXPORT_DIR = "exports"
-os.makedirs(EXPORT_DIR, exist_ok=True)
-
-def build_table(data, header):
-    table = Table([header] + data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), '#4CAF50'),
-        ('TEXTCOLOR', (0, 0), (-1, 0), 'white'),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), '#f9f9f9'),
-        ('GRID', (0, 0), (-1, -1), 1, '#000000')
-    ]))
+# Alto de las filas de la tabla de contactos: las que entran en una línea
+# llevan ROW_HEIGHT y reportlab no las mide; las demás se miden una vez al
+# armarlas, así se sabe qué filas entran en cada página
+HEADER_ROW_HEIGHT = 26
+ROW_HEIGHT = 18
+# Anchos de Nombre, Teléfono, Correo y Cumpleaños (suman el ancho útil de la hoja)
+CONTACT_COLUMN_WIDTHS = (134, 104, 150, 80)
+# Fuente del cuerpo de la tabla (la de reportlab por omisión) y márgenes
+# internos de la celda: el texto que no entra en el ancho se parte en líneas
+CELL_FONT = ("Helvetica", 10)
+CELL_PADDING = 6
+CELL_VERTICAL_PADDING = 3
+CELL_STYLE = ParagraphStyle("ContactCell", fontName=CELL_FONT[0], fontSize=CELL_FONT[1],
+                            leading=CELL_FONT[1] + 2)
+# Flowables que se generan por adelantado mientras reportlab arma las páginas
+STREAM_BUFFER = 4
+
+# Estilo compartido por todas las tablas (se arma una sola vez)
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), '#4CAF50'),
+    ('TEXTCOLOR', (0, 0), (-1, 0), 'white'),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), '#f9f9f9'),
+    ('GRID', (0, 0), (-1, -1), 1, '#000000')
+])
+
+def export_path(filename):
+    """Ruta del archivo dentro de EXPORT_DIR (la carpeta se crea al exportar, no al importar)."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    return os.path.join(EXPORT_DIR, filename)
+
+class ExportCancelled(Exception):
+    """La lanza el callback de progreso para interrumpir una exportación."""
+
+def table_cell(value, width):
+    """
+    Celda de la tabla de contactos y alto de su fila: el texto tal cual si
+    entra en `width` puntos, o un párrafo partido en líneas si no entra.
+    """
+    text = "" if value is None else str(value)
+    if stringWidth(text, *CELL_FONT) <= width:
+        return text, ROW_HEIGHT
+    paragraph = Paragraph(escape(text), CELL_STYLE)
+    _, height = paragraph.wrap(width, 1e6)
+    return paragraph, max(ROW_HEIGHT, height + 2 * CELL_VERTICAL_PADDING)
+
+def build_table(data, header, col_widths=None, row_heights=None):
+    table = Table([header] + data, colWidths=col_widths, rowHeights=row_heights, repeatRows=1)
+    table.setStyle(TABLE_STYLE)
     return table
 
+class FlowableStream(list):
+    """
+    Lista de flowables que se va llenando desde un generador a medida que
+    reportlab la consume (build solo mira el primero y lo borra), así nunca
+    hay más de STREAM_BUFFER flowables armados a la vez.
+    """
+    def __init__(self, flowables):
+        super().__init__()
+        self._source = iter(flowables)
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < STREAM_BUFFER:
+            flowable = next(self._source, None)
+            if flowable is None:
+                self._source = None
+            else:
+                self.append(flowable)
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+def flowables_height(flowables, width, height):
+    """Alto que ocupan unos flowables uno debajo del otro."""
+    total = 0
+    for flowable in flowables:
+        _, flowable_height = flowable.wrap(width, height)
+        total += flowable_height + flowable.getSpaceBefore() + flowable.getSpaceAfter()
+    return total
+
+def contact_table_chunks(rows, header, first_page_height, page_height):
+    """
+    Genera una tabla por página: la primera con las filas que entran en
+    `first_page_height` (debajo del encabezado del documento) y las demás en
+    `page_height`, sin contar la fila de títulos. Ninguna celda se recorta:
+    la que no entra en su columna se parte en líneas y su fila crece. Cada
+    tabla lleva en `rows_done` cuántas filas hay hasta ella inclusive.
+    """
+    widths = [width - 2 * CELL_PADDING for width in CONTACT_COLUMN_WIDTHS]
+
+    def measured():
+        for row in rows:
+            cells = [table_cell(value, width) for value, width in zip(row, widths)]
+            yield [cell for cell, _ in cells], max(height for _, height in cells)
+
+    measured = measured()
+    pending = next(measured, None)
+    available = first_page_height
+    done = 0
+    while pending is not None:
+        chunk, heights, used = [], [], 0
+        # Siempre al menos una fila por tabla, aunque no entre entera
+        while pending is not None and (not chunk or used + pending[1] <= available):
+            chunk.append(pending[0])
+            heights.append(pending[1])
+            used += pending[1]
+            pending = next(measured, None)
+        done += len(chunk)
+        table = build_table(chunk, header, CONTACT_COLUMN_WIDTHS, [HEADER_ROW_HEIGHT] + heights)
+        table.rows_done = done
+        yield table
+        available = page_height
+
 class HorizontalLine(Flowable):
     """Línea decorativa para usar con Platypus."""
     def __init__(self, width, thickness=1, color=HexColor("#2E86C1")):
@@ -39,6 +149,11 @@ class HorizontalLine(Flowable):
         self.canv.setLineWidth(self.thickness)
         self.canv.line(0, 0, self.width, 0)
 
+def safe_filename(text, default="SinNombre", max_length=60):
+    """Texto apto para nombre de archivo: solo letras, dígitos, '-' y '_'."""
+    cleaned = re.sub(r"[^\w-]+", "_", text or "").strip("_")[:max_length]
+    return cleaned or default
+
 def build_header(styles, width=500):
     header = []
     app_name = Paragraph("<b><font size=16 color='#2E86C1'>ContactVault</font></b>", styles['Normal'])
@@ -48,80 +163,137 @@ def build_header(styles, width=500):
     header.append(Spacer(1, 12))
     return header
 
+@lru_cache(maxsize=None)
+def document_styles():
+    """Hoja de estilos compartida por todos los documentos del proceso."""
+    return getSampleStyleSheet()
+
+@lru_cache(maxsize=None)
+def document_header(width=500):
+    """Encabezado de los documentos, armado una vez por proceso (los flowables se reutilizan)."""
+    return tuple(build_header(document_styles(), width))
+
+def contact_pdf_filename(contact):
+    """Nombre del PDF de un contacto en una exportación por lotes (único por id)."""
+    return f"contacto_{safe_filename(contact.get('name', ''))}_{contact.get('id', '')[:8]}.pdf"
+
+def write_contact_pdf(contact, target):
+    """
+    Escribe el PDF de un contacto en `target` (ruta o archivo abierto en modo
+    binario) y devuelve cuántas páginas tiene.
+    """
+    doc = SimpleDocTemplate(target, pagesize=letter)
+    styles = document_styles()
+    story = list(document_header())
+    # El nombre va dentro del marcado del párrafo: escapar "<" y "&"
+    story.append(Paragraph(f"<b>Contacto - {escape(contact.get('name', 'Sin nombre'))}</b>", styles['Title']))
+    story.append(Spacer(1, 12))
+
+    data = [
+        ["Campo", "Valor"],
+        ["Nombre", contact.get('name', '')],
+        ["Teléfono", contact.get('phone', '')],
+        ["Correo", contact.get('email', '')],
+        ["Dirección", contact.get('address', '')],
+        ["Cumpleaños", contact.get('birthday', '')]
+    ]
+
+    story.append(build_table(data[1:], data[0]))
+    story.append(Spacer(1, 12))
+
+    story.append(Paragraph(f"Exportado el: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+
+    doc.build(story)
+    return doc.page
+
 def export_contact_to_pdf(contact):
     """Exporta un contacto individual a PDF."""
     try:
-        filename = f"contacto_{contact.get('name', 'SinNombre').replace(' ', '_')}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        filepath = os.path.join(EXPORT_DIR, filename)
-        doc = SimpleDocTemplate(filepath, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-        story.extend(build_header(styles))
-        story.append(Paragraph(f"<b>Contacto - {contact.get('name', 'Sin nombre')}</b>", styles['Title']))
-        story.append(Spacer(1, 12))
-
-        data = [
-            ["Campo", "Valor"],
-            ["Nombre", contact.get('name', '')],
-            ["Teléfono", contact.get('phone', '')],
-            ["Correo", contact.get('email', '')],
-            ["Dirección", contact.get('address', '')],
-            ["Cumpleaños", contact.get('birthday', '')]
-        ]
-
-        story.append(build_table(data[1:], data[0]))
-        story.append(Spacer(1, 12))
-
-        story.append(Paragraph(f"Exportado el: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
-
-        doc.build(story)
+        filename = f"contacto_{safe_filename(contact.get('name', ''))}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        filepath = export_path(filename)
+        write_contact_pdf(contact, filepath)
         return True, f"Contacto exportado a {filepath}"
 
     except Exception as e:
         return False, f"Error al exportar contacto: {e}"
 
-def export_contacts_to_pdf(contacts, filename_prefix="contactos_exportados", title="Contactos"):
-    """Exporta una lista de contactos a PDF (usado por export_selected y export_all)."""
+def export_individual_to_pdf(contacts, progress=None):
+    """Exporta el único contacto de `contacts` (forma de los trabajos de export_jobs)."""
+    if progress is not None:
+        try:
+            progress(0, 0)
+        except ExportCancelled:
+            return False, "Exportación cancelada"
+    return export_contact_to_pdf(contacts[0])
+
+def export_contacts_to_pdf(contacts, filename_prefix="contactos_exportados", title="Contactos",
+                           progress=None):
+    """
+    Exporta contactos a PDF (usado por export_selected y export_all).
+
+    Las filas se generan a medida que se arman las páginas, en tablas de una
+    página cada una: la memoria no depende de la cantidad de contactos y el
+    tiempo crece en forma lineal. `progress(filas, páginas)` se llama cuando
+    reportlab termina de ubicar cada página de la tabla (no cuando se genera,
+    que va STREAM_BUFFER flowables adelante); si lanza ExportCancelled no se
+    escribe nada.
+    """
     try:
-        if not contacts:
+        contacts = iter(contacts)
+        first = next(contacts, None)
+        if first is None:
             return False, "No hay contactos para exportar"
+        contacts = chain([first], contacts)
 
         filename = f"{filename_prefix}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        filepath = os.path.join(EXPORT_DIR, filename)
+        filepath = export_path(filename)
         doc = SimpleDocTemplate(filepath, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-
-        story.extend(build_header(styles))
-        story.append(Paragraph(f"<b>{title}</b>", styles['Title']))
-        story.append(Spacer(1, 12))
-
-        data = []
-        for c in contacts:
-            data.append([
-                c.get('name', ''),
-                c.get('phone', ''),
-                c.get('email', ''),
-                c.get('birthday', '')
-            ])
+        styles = document_styles()
 
+        heading = list(document_header())
+        heading.append(Paragraph(f"<b>{title}</b>", styles['Title']))
+        heading.append(Spacer(1, 12))
+
+        count = 0
+        def rows():
+            nonlocal count
+            for c in contacts:
+                count += 1
+                yield [c.get('name', ''), c.get('phone', ''), c.get('email', ''), c.get('birthday', '')]
+
+        # Alto útil del marco de SimpleDocTemplate (6 puntos de margen interno arriba y abajo)
+        frame_height = doc.height - 12
+        page_height = frame_height - HEADER_ROW_HEIGHT
+        first_page_height = page_height - flowables_height(heading, doc.width, frame_height)
         header = ["Nombre", "Teléfono", "Correo", "Cumpleaños"]
-        story.append(build_table(data, header))
-        story.append(Spacer(1, 12))
 
-        story.append(Paragraph(f"Total de contactos: {len(contacts)}", styles['Normal']))
-        story.append(Spacer(1, 6))
-        story.append(Paragraph(f"Exportado el: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+        if progress is not None:
+            def after_flowable(flowable):
+                rows_done = getattr(flowable, 'rows_done', None)
+                if rows_done is not None:
+                    progress(rows_done, doc.page)
+            doc.afterFlowable = after_flowable
+
+        def story():
+            yield from heading
+            yield from contact_table_chunks(rows(), header, first_page_height, page_height)
+            yield Spacer(1, 12)
+            yield Paragraph(f"Total de contactos: {count}", styles['Normal'])
+            yield Spacer(1, 6)
+            yield Paragraph(f"Exportado el: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal'])
 
-        doc.build(story)
+        doc.build(FlowableStream(story()))
         return True, f"Contactos exportados a {filepath}"
 
+    except ExportCancelled:
+        # El archivo recién se escribe al terminar el documento: no queda nada a medias
+        return False, "Exportación cancelada"
     except Exception as e:
         return False, f"Error al exportar contactos: {e}"
 
 # Aliases para usarlos desde la app
-export_selected_to_pdf = lambda selected: export_contacts_to_pdf(
-    selected, "contactos_seleccionados", "Contactos Seleccionados")
+export_selected_to_pdf = lambda selected, **kwargs: export_contacts_to_pdf(
+    selected, "contactos_seleccionados", "Contactos Seleccionados", **kwargs)
 
-export_all_to_pdf = lambda all_contacts: export_contacts_to_pdf(
-    all_contacts, "agenda_completa", "Agenda Completa")
+export_all_to_pdf = lambda all_contacts, **kwargs: export_contacts_to_pdf(
+    all_contacts, "agenda_completa", "Agenda Completa", **kwargs)
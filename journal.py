@@ -0,0 +1,120 @@
+"""
+Diario de cambios para la aplicación Agenda
+Cada alta, edición o baja se agrega como un registro encriptado al final del
+diario, en lugar de reescribir la agenda completa
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List
+
+from cryptography.fernet import Fernet, InvalidToken
+
+JOURNAL_SUFFIX = ".journal"
+
+# Umbrales a partir de los cuales conviene volcar el diario a una nueva instantánea
+MAX_JOURNAL_RECORDS = 500
+MAX_JOURNAL_BYTES = 1024 * 1024
+
+def snapshot_id(encrypted_data: bytes) -> str:
+    """Identifica una instantánea por el hash de sus bytes encriptados."""
+    return hashlib.sha256(encrypted_data).hexdigest()[:16]
+
+def apply_change(agenda: List[Dict], change: Dict) -> None:
+    """
+    Aplica un registro del diario sobre la lista de contactos.
+
+    Los registros identifican al contacto por su id: {"op": "put",
+    "contact": {...}} lo agrega o lo reemplaza y {"op": "delete", "id": ...}
+    lo quita.
+    """
+    op = change["op"]
+    if op == "put":
+        contact = change["contact"]
+        for i, current in enumerate(agenda):
+            if current.get("id") == contact["id"]:
+                agenda[i] = contact
+                return
+        agenda.append(contact)
+    elif op == "delete":
+        agenda[:] = [current for current in agenda if current.get("id") != change["id"]]
+    else:
+        raise ValueError(f"Operación desconocida en el diario: {op}")
+
+class ChangeJournal:
+    """
+    Diario de solo-anexado que acompaña a la instantánea de la agenda.
+
+    Cada línea es un token Fernet con un cambio en JSON. Los registros llevan
+    el identificador de la instantánea sobre la que se escribieron, así que si
+    la aplicación se corta entre escribir una instantánea nueva y vaciar el
+    diario, los registros viejos se ignoran en lugar de aplicarse dos veces.
+    """
+
+    def __init__(self, path: str, max_records: int = MAX_JOURNAL_RECORDS,
+                 max_bytes: int = MAX_JOURNAL_BYTES):
+        self.path = path
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.records = 0
+        self.size = 0
+
+    def append(self, fernet: Fernet, snapshot: str, change: Dict) -> None:
+        """Agrega un cambio al final del diario y lo baja a disco."""
+        self.append_many(fernet, snapshot, [change])
+
+    def append_many(self, fernet: Fernet, snapshot: str, changes: List[Dict]) -> None:
+        """Agrega varios cambios con una sola escritura y un solo fsync."""
+        lines = []
+        for change in changes:
+            record = dict(change, snap=snapshot)
+            data = json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+            lines.append(fernet.encrypt(data) + b"\n")
+        block = b"".join(lines)
+        with open(self.path, 'ab') as file:
+            file.write(block)
+            file.flush()
+            os.fsync(file.fileno())
+        self.records += len(lines)
+        self.size += len(block)
+
+    def read_records(self, fernet: Fernet, snapshot: str) -> List[Dict]:
+        """Devuelve, en orden, los cambios escritos para esta instantánea."""
+        self.records = 0
+        self.size = 0
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        # Un corte durante el último append deja una línea incompleta: se recorta
+        # para que el próximo registro no quede pegado a ella.
+        if data and not data.endswith(b"\n"):
+            data = data[:data.rfind(b"\n") + 1]
+            with open(self.path, 'r+b') as file:
+                file.truncate(len(data))
+        self.size = len(data)
+        records = []
+        for line in data.splitlines():
+            if not line:
+                continue
+            try:
+                record = json.loads(fernet.decrypt(line).decode('utf-8'))
+            except (InvalidToken, json.JSONDecodeError):
+                continue
+            if record.get("snap") != snapshot:
+                continue
+            records.append(record)
+        self.records = len(records)
+        return records
+
+    def needs_compaction(self) -> bool:
+        """Indica si el diario ya es lo bastante grande como para compactarlo."""
+        return self.records >= self.max_records or self.size >= self.max_bytes
+
+    def reset(self) -> None:
+        """Vacía el diario tras escribir una instantánea nueva."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.records = 0
+        self.size = 0
@@ -0,0 +1,120 @@
+"""
+Índices de búsqueda exacta para la aplicación Agenda
+Tablas hash por teléfono normalizado, correo y dominio del correo, para
+responder "de quién es este número" o "quiénes son de este dominio" sin
+recorrer la agenda
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+from contacts import Contact, normalize_email, normalize_phone
+
+# Dígitos finales con los que se comparan los teléfonos: alcanzan para que
+# "2966 123456" y "+54 9 2966 123456" caigan en la misma entrada
+PHONE_SUFFIX_DIGITS = 8
+
+LOOKUP_KINDS = ("phone", "email", "domain")
+
+def email_domain(email: str) -> str:
+    """Dominio de un correo ya normalizado ("" si no tiene)."""
+    return email.rpartition("@")[2] if "@" in email else ""
+
+def lookup_matches(kind: str, contact: Contact, value: str) -> bool:
+    """Si `contact` estaría en LookupIndex.lookup(kind, value), sin usar el índice."""
+    if kind == "phone":
+        digits, phone = normalize_phone(value), normalize_phone(contact.phone)
+        if not digits or not phone:
+            return False
+        if len(digits) < PHONE_SUFFIX_DIGITS:
+            return phone == digits
+        return (phone[-PHONE_SUFFIX_DIGITS:] == digits[-PHONE_SUFFIX_DIGITS:]
+                and (phone.endswith(digits) or digits.endswith(phone)))
+    email = normalize_email(contact.email)
+    if kind == "email":
+        return bool(email) and email == normalize_email(value)
+    if kind == "domain":
+        domain = email_domain(email)
+        return bool(domain) and domain == normalize_email(value).lstrip("@")
+    raise ValueError(f"Tipo de búsqueda desconocido: {kind}")
+
+class LookupIndex:
+    """
+    Índices exactos por teléfono, correo y dominio.
+
+    Cada entrada guarda los ids en un diccionario usado como conjunto
+    ordenado, así los resultados salen en el orden en que se indexaron.
+    Se recuerdan las claves de cada contacto para poder sacarlo de sus
+    entradas al editarlo o borrarlo.
+    """
+
+    def __init__(self, contacts: Iterable[Contact] = ()):
+        self._phones: Dict[str, Dict[str, None]] = {}
+        self._phone_suffixes: Dict[str, Dict[str, None]] = {}
+        self._emails: Dict[str, Dict[str, None]] = {}
+        self._domains: Dict[str, Dict[str, None]] = {}
+        self._keys: Dict[str, Tuple[str, str]] = {}
+        for contact in contacts:
+            self.add(contact)
+
+    def _tables(self, phone: str, email: str):
+        yield self._phones, phone
+        yield self._phone_suffixes, phone[-PHONE_SUFFIX_DIGITS:]
+        yield self._emails, email
+        yield self._domains, email_domain(email)
+
+    def add(self, contact: Contact) -> None:
+        """Indexa un contacto (o lo reindexa si ya estaba)."""
+        if contact.id in self._keys:
+            self.remove(contact.id)
+        phone = normalize_phone(contact.phone)
+        email = normalize_email(contact.email)
+        self._keys[contact.id] = (phone, email)
+        for table, key in self._tables(phone, email):
+            if key:
+                table.setdefault(key, {})[contact.id] = None
+
+    update = add
+
+    def remove(self, contact_id: str) -> None:
+        """Saca un contacto de todos los índices."""
+        keys = self._keys.pop(contact_id, None)
+        if keys is None:
+            return
+        for table, key in self._tables(*keys):
+            ids = table.get(key)
+            if ids is not None:
+                ids.pop(contact_id, None)
+                if not ids:
+                    del table[key]
+
+    def by_phone(self, phone: str) -> List[str]:
+        """
+        Contactos con ese teléfono, en forma local o internacional.
+
+        Con PHONE_SUFFIX_DIGITS dígitos o más se busca por los dígitos finales
+        y se acepta que un número termine con el otro; con menos, solo la
+        coincidencia exacta.
+        """
+        digits = normalize_phone(phone)
+        if len(digits) < PHONE_SUFFIX_DIGITS:
+            return list(self._phones.get(digits, ()))
+        candidates = self._phone_suffixes.get(digits[-PHONE_SUFFIX_DIGITS:], {})
+        return [contact_id for contact_id in candidates
+                if self._keys[contact_id][0].endswith(digits)
+                or digits.endswith(self._keys[contact_id][0])]
+
+    def by_email(self, email: str) -> List[str]:
+        return list(self._emails.get(normalize_email(email), ()))
+
+    def by_domain(self, domain: str) -> List[str]:
+        return list(self._domains.get(normalize_email(domain).lstrip("@"), ()))
+
+    def lookup(self, kind: str, value: str) -> List[str]:
+        """Búsqueda por `kind` ("phone", "email" o "domain")."""
+        if kind == "phone":
+            return self.by_phone(value)
+        if kind == "email":
+            return self.by_email(value)
+        if kind == "domain":
+            return self.by_domain(value)
+        raise ValueError(f"Tipo de búsqueda desconocido: {kind}")
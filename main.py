@@ -1,22 +1,70 @@
-import json
 import os
 import sys
-from typing import Dict, List, Optional
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
-import base64
+import importlib
+from typing import Callable, Iterable, List, Optional, Tuple
 import tkinter as tk
 from tkinter import ttk, messagebox
 import re
+import locale
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from bisect import bisect_right
 
 # Archivo para los datos encriptados
 AGENDA_FILE = "agenda.json.enc"
+# Base de datos del motor SQLite
+SQLITE_FILE = "agenda.db"
+# Motor de almacenamiento: "file" (archivo encriptado) o "sqlite"
+STORAGE_ENGINE = os.environ.get("CONTACTVAULT_STORAGE", "file")
+STORAGE_PATHS = {"file": AGENDA_FILE, "sqlite": SQLITE_FILE}
+# Contactos que se muestran antes de terminar de cargar la agenda
+FIRST_SCREEN_ROWS = 100
+# Espera (ms) desde la última tecla antes de filtrar la tabla
+SEARCH_DELAY_MS = 150
+# Modos del cuadro de búsqueda: etiqueta -> modo de IncrementalSearch o tipo
+# de búsqueda exacta de LookupIndex ("query": lenguaje de consultas)
+SEARCH_MODES = {"Contiene": "contains", "Difusa": "fuzzy",
+                "Teléfono": "phone", "Correo": "email", "Dominio": "domain",
+                "Avanzada": "query"}
+# Filas por página de la tabla (0: una sola lista con desplazamiento continuo)
+PAGE_SIZES = (0, 50, 100, 250, 500)
+PAGE_SIZE = int(os.environ.get("CONTACTVAULT_PAGE_SIZE", "0"))
+# Destinos del salto por letra ("#": valores que no empiezan con letra)
+JUMP_LETTERS = ("#",) + tuple("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+# Espera (ms) desde la última tecla de la contraseña antes de adelantar la derivación
+SPECULATE_DELAY_MS = 300
+# Módulos de la bóveda (cryptography, sqlite3): se importan en otro hilo mientras
+# se arma la ventana de autenticación. export_pdf (reportlab) y messaging
+# (webbrowser) se importan recién al usarlos
+VAULT_MODULES = ("vault_session", "storage", "persistence")
 
 # Importar funciones de otros módulos
-from export_pdf import export_contact_to_pdf, export_selected_to_pdf, export_all_to_pdf
 from backup_manager import create_backup
-from messaging import send_email, send_whatsapp
+from contacts import Contact, ContactStore, new_contact_id
+from search_index import IncrementalSearch, TrigramIndex, normalize_text
+from lookup_index import LOOKUP_KINDS, LookupIndex, lookup_matches
+from birthdays import UPCOMING_DAYS, BirthdayIndex
+from duplicates import find_duplicates, merge_group
+from query_language import Condition, QueryPlanner, QuerySyntaxError, parse_query
+from table_sort import (LETTER_FIELDS, SORT_FIELDS, SortCache, letter_offsets,
+                        letter_position)
+from virtual_table import VirtualTable
+
+def preload_modules(names: Iterable[str]) -> threading.Thread:
+    """
+    Importa los módulos en segundo plano. Un `import` posterior del mismo
+    módulo espera a que termine; si falla, el error aparece en ese import.
+    """
+    def run():
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
 
 class AgendaApp:
     def __init__(self, root: tk.Tk):
@@ -26,23 +74,74 @@ class AgendaApp:
         self.root.geometry("1024x800")
         self.root.minsize(600, 400)
         
-        # Variable para almacenar la contraseña
+        # Variable para almacenar la contraseña (solo hasta derivar la clave)
         self.password = None
-        self.agenda = []
+        self.speculate_job = None
+        self.agenda = ContactStore()
+        self.install_indexes()
+        self.search_job = None
+        # Columna por la que se ordena la tabla (None = orden de la agenda)
+        self.sort_field = None
+        self.sort_descending = False
+        # Índice del salto por letra: ((versión de la tabla, columna, sentido), posiciones)
+        self.letter_index = None
+        # Exportaciones a PDF en segundo plano (se crea con la primera) y sus filas
+        # en la ventana de exportaciones: id -> (barra, estado, botón cancelar)
+        self.export_jobs = None
+        self.export_rows = {}
+        self.exports_list = None
+        
+        self.loading = False
+        self.load_progress = (0, 0)
+        
+        # Hilos para encriptar/desencriptar en paralelo
+        self.crypto_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 2))
+        
+        # Sesión, motor de almacenamiento y el hilo que escribe en él sin
+        # bloquear la interfaz: se crean con open_storage
+        self.session = None
+        self.storage = None
+        self.persistence = None
         
         # Configurar estilo de ventana principal
         self.root.configure(bg='white')
         
         # Mostrar ventana de autenticación
-        if not self.show_authentication():
+        if not self.authenticate():
             self.root.destroy()
             return
-            
-        # Cargar agenda
-        self.agenda = self.load_agenda()
         
         # Configurar la interfaz gráfica
         self.setup_ui()
+        
+        # Cargar agenda: la primera pantalla enseguida, el resto en segundo plano
+        self.load_agenda_lazily()
+        self.poll_persistence()
+    
+    def open_storage(self) -> None:
+        """Crea la sesión, el motor de almacenamiento y su hilo de escritura (una sola vez)."""
+        if self.storage is not None:
+            return
+        from vault_session import VaultSession
+        from storage import create_backend
+        from persistence import PersistenceWorker
+        self.session = VaultSession()
+        self.storage = create_backend(STORAGE_ENGINE, STORAGE_PATHS[STORAGE_ENGINE], self.crypto_pool)
+        self.persistence = PersistenceWorker(self.storage)
+    
+    def schedule_speculation(self, password_entry: tk.Entry) -> None:
+        """Adelanta la derivación de la clave cuando se deja de escribir un momento."""
+        if self.speculate_job is not None:
+            self.root.after_cancel(self.speculate_job)
+        
+        def speculate():
+            self.speculate_job = None
+            try:
+                self.session.speculate(password_entry.get(), self.storage, self.crypto_pool)
+            except Exception:
+                pass  # Es solo un adelanto: unlock deriva igual
+        
+        self.speculate_job = self.root.after(SPECULATE_DELAY_MS, speculate)
     
     def show_authentication(self) -> bool:
         """Muestra ventana de autenticación y devuelve True si es exitosa."""
@@ -76,10 +175,11 @@ class AgendaApp:
             password_entry = tk.Entry(main_frame, show="*", width=30, font=("Arial", 10))
             password_entry.pack(pady=5)
             password_entry.focus_set()
+            password_entry.bind('<KeyRelease>', lambda event: self.schedule_speculation(password_entry))
             
             # Confirmar contraseña si es nueva
             confirm_entry = None
-            if not os.path.exists(AGENDA_FILE):
+            if not self.vault_exists():
                 tk.Label(main_frame, text="Confirmar contraseña:", font=("Arial", 10),
                         fg='black', bg='white').pack(anchor=tk.W, pady=(10, 0))
                 confirm_entry = tk.Entry(main_frame, show="*", width=30, font=("Arial", 10))
@@ -87,7 +187,7 @@ class AgendaApp:
             
             def submit_auth():
                 password = password_entry.get()
-                if not os.path.exists(AGENDA_FILE):
+                if not self.vault_exists():
                     confirm = confirm_entry.get() if confirm_entry else ""
                     if password and password == confirm:
                         self.password = password
@@ -144,61 +244,251 @@ class AgendaApp:
             
             # Esperar a que se cierre la ventana
             auth_window.wait_window()
+            if self.speculate_job is not None:
+                self.root.after_cancel(self.speculate_job)
+                self.speculate_job = None
+            if self.password is None:
+                self.session.cancel_speculation()
             
             return self.password is not None
         except Exception as e:
             print(f"Error en autenticación: {e}")
             return False
     
-    def derive_key(self, password: str) -> bytes:
-        """Deriva una clave Fernet desde la contraseña usando PBKDF2."""
-        salt = b'agenda_salt'  # Salt fijo para consistencia
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8')))
-        return key
-    
-    def load_agenda(self) -> List[Dict]:
-        """Carga los contactos desde el archivo encriptado."""
-        if not os.path.exists(AGENDA_FILE):
-            return []
+    def vault_exists(self) -> bool:
+        """Indica si ya hay una agenda guardada (en el motor actual o en el archivo)."""
+        self.open_storage()
+        return self.storage.exists() or os.path.exists(AGENDA_FILE)
+    
+    def authenticate(self) -> bool:
+        """Pide la contraseña hasta poder abrir la agenda; False si se cancela."""
+        while True:
+            if not self.show_authentication():
+                return False
+            if self.unlock_session():
+                return True
+    
+    def unlock_session(self) -> bool:
+        """Desenvuelve la clave de datos, olvida la contraseña y abre el almacenamiento."""
+        password, self.password = self.password, None
+        self.open_storage()
         try:
-            if self.password is None:
-                raise ValueError("Contraseña no inicializada.")
-            key = self.derive_key(self.password)
-            fernet = Fernet(key)
-            with open(AGENDA_FILE, 'rb') as file:
-                encrypted_data = file.read()
-            decrypted_data = fernet.decrypt(encrypted_data)
-            agenda = json.loads(decrypted_data.decode('utf-8'))
-            # Asegurar que cada contacto tenga el campo 'birthday'
-            for contact in agenda:
-                contact.setdefault("birthday", "")
-            return agenda
-        except (json.JSONDecodeError, ValueError, Exception):
+            if not self.storage.exists() and os.path.exists(AGENDA_FILE):
+                # Primer uso de otro motor: importar la agenda del archivo encriptado
+                from storage import FileBackend, migrate
+                source = FileBackend(AGENDA_FILE, self.crypto_pool)
+                self.session.unlock(password, source)
+                migrate(source, self.storage, self.session.key)
+                source.clear_key()
+            else:
+                self.session.unlock(password, self.storage, self.crypto_pool)
+        except Exception:
+            self.session.lock()
+            self.storage.clear_key()
+            messagebox.showerror("Error", "Contraseña incorrecta o archivo corrupto.")
+            return False
+        return True
+    
+    def lock_agenda(self) -> None:
+        """Bloquea la agenda: borra la clave de sesión y vuelve a pedir la contraseña."""
+        if not self.ensure_loaded():
+            return
+        if not self.persistence.flush():
+            self.persistence.results()  # El error se informa acá abajo
+            if not messagebox.askyesno("Error", "No se pudieron guardar todos los cambios. "
+                                       "¿Bloquear de todos modos? Se perderán los cambios sin guardar."):
+                return
+        self.session.lock()
+        self.storage.clear_key()
+        self.agenda = ContactStore()
+        self.install_indexes()
+        self.search_var.set("")
+        self.set_sort(None)
+        self.update_table()
+        if not self.authenticate():
+            self.exit_app()
+            return
+        self.load_agenda_lazily()
+    
+    def exit_app(self) -> None:
+        """Escribe lo pendiente, borra la clave de sesión y cierra la aplicación."""
+        if self.export_jobs is not None and self.export_jobs.active:
+            if not messagebox.askyesno("Exportaciones", "Hay exportaciones en curso. ¿Cancelarlas y salir?"):
+                return
+        if self.export_jobs is not None:
+            self.export_jobs.shutdown()
+        if not self.persistence.flush():
+            self.persistence.results()  # El error se informa acá abajo
+            if not messagebox.askyesno("Error", "No se pudieron guardar todos los cambios. ¿Salir de todos modos?"):
+                return
+        self.persistence.stop()
+        self.storage.close()
+        self.crypto_pool.shutdown(wait=False, cancel_futures=True)
+        self.session.lock()
+        self.storage.clear_key()
+        self.root.quit()
+    
+    def ensure_loaded(self) -> bool:
+        """Avisa si la agenda todavía se está desencriptando en segundo plano."""
+        if self.loading:
+            messagebox.showinfo("Información", "La agenda todavía se está cargando. Intente en unos segundos.")
+            return False
+        return True
+    
+    def load_agenda_lazily(self) -> None:
+        """Muestra la primera pantalla enseguida y carga el resto en segundo plano."""
+        contacts = map(Contact.from_dict, self.storage.iterate(progress=self.report_load_progress))
+        try:
+            first = list(islice(contacts, FIRST_SCREEN_ROWS))
+        except Exception:
             messagebox.showerror("Error", "Contraseña incorrecta o archivo corrupto. Iniciando con agenda vacía.")
-            return []
+            self.agenda = ContactStore()
+            self.finish_loading(rewrite=False)
+            return
+        self.agenda = ContactStore(first)
+        if len(first) < FIRST_SCREEN_ROWS:
+            self.finish_loading()
+            return
+        self.update_table()
+        self.loading = True
+        
+        # Un hilo recorre el resto de la agenda y arma los índices de búsqueda;
+        # el pool desencripta en paralelo
+        future = Future()
+        def load_rest():
+            try:
+                agenda = ContactStore(first)
+                agenda.extend(contacts)
+                future.set_result((agenda, self.build_indexes(agenda)))
+            except Exception as e:
+                future.set_exception(e)
+        threading.Thread(target=load_rest, daemon=True).start()
+        self.wait_for(future, lambda: self.on_agenda_loaded(future),
+                      on_tick=self.show_load_progress)
     
-    def save_agenda(self) -> None:
-        """Guarda los contactos en el archivo encriptado."""
+    def report_load_progress(self, loaded: int, total: int) -> None:
+        """Registra el avance de la carga (se llama desde el hilo de carga)."""
+        self.load_progress = (loaded, total)
+    
+    def show_load_progress(self) -> None:
+        """Muestra el avance de la carga en la barra de estado."""
+        loaded, total = self.load_progress
+        self.show_status(f"Cargando contactos... {loaded} de {total}")
+    
+    def on_agenda_loaded(self, future: Future) -> None:
+        """Completa la agenda cuando termina la carga en segundo plano."""
         try:
-            if self.password is None:
-                raise ValueError("Contraseña no inicializada.")
-            key = self.derive_key(self.password)
-            fernet = Fernet(key)
-            data = json.dumps(self.agenda, indent=4, ensure_ascii=False).encode('utf-8')
-            encrypted_data = fernet.encrypt(data)
-            with open(AGENDA_FILE, 'wb') as file:
-                file.write(encrypted_data)
-        except (IOError, ValueError) as e:
-            messagebox.showerror("Error", f"No se pudo guardar el archivo: {e}")
+            self.agenda, indexes = future.result()
+        except Exception:
+            messagebox.showerror("Error", "Archivo corrupto. Iniciando con agenda vacía.")
+            self.agenda = ContactStore()
+            self.finish_loading(rewrite=False)
+            return
+        self.finish_loading(indexes=indexes)
+    
+    def finish_loading(self, rewrite: bool = True, indexes: Optional[Tuple] = None) -> None:
+        """Muestra la agenda cargada y la reescribe si quedó en un formato viejo."""
+        self.install_indexes(indexes)
+        self.loading = False
+        if rewrite and self.storage.needs_rewrite:
+            self.save_agenda()
+        self.refresh_table()
+    
+    @staticmethod
+    def build_indexes(agenda: ContactStore) -> Tuple[TrigramIndex, LookupIndex, BirthdayIndex]:
+        """Arma los índices de búsqueda (se puede llamar desde otro hilo)."""
+        return TrigramIndex(agenda), LookupIndex(agenda), BirthdayIndex(agenda)
+    
+    def install_indexes(self, indexes: Optional[Tuple] = None) -> None:
+        """Instala los índices de la agenda; si no se pasan, los arma."""
+        self.search_index, self.lookup_index, self.birthday_index = \
+            indexes or self.build_indexes(self.agenda)
+        self.live_search = IncrementalSearch(self.search_index)
+        self.query_planner = QueryPlanner(self.agenda, self.search_index,
+                                          self.lookup_index, self.birthday_index)
+        self.sort_cache = SortCache(self.agenda)
+    
+    def wait_for(self, future: Future, callback, on_tick=None) -> None:
+        """Llama a `callback` desde el hilo de Tk cuando termina la tarea."""
+        if future.done():
+            callback()
+            return
+        if on_tick:
+            on_tick()
+        self.root.after(50, self.wait_for, future, callback, on_tick)
+    
+    def show_status(self, text: str) -> None:
+        """Actualiza la barra de estado de la ventana principal."""
+        self.status_var.set(text)
+    
+    def save_agenda(self) -> None:
+        """Encola una instantánea completa de los contactos."""
+        self.persistence.submit_snapshot(self.agenda.to_dicts())
+    
+    def store_contact(self, contact: Contact) -> None:
+        """Agrega o reemplaza un contacto en la agenda, los índices y el almacenamiento."""
+        self.apply_contact_changes(put=[contact])
+    
+    def discard_contact(self, contact_id: str) -> Contact:
+        """Quita un contacto de la agenda, los índices y el almacenamiento."""
+        return self.apply_contact_changes(delete=[contact_id])[0]
+    
+    def apply_contact_changes(self, put: Iterable[Contact] = (),
+                              delete: Iterable[str] = ()) -> List[Contact]:
+        """
+        Aplica altas/ediciones y bajas en la agenda y los índices, y las
+        guarda juntas en un solo lote. Devuelve los contactos quitados.
+        """
+        put = list(put)
+        changes = []
+        for contact in put:
+            self.sort_cache.put(contact, self.agenda.get(contact.id))
+            self.agenda.put(contact)
+            self.search_index.update(contact)
+            self.lookup_index.update(contact)
+            self.birthday_index.update(contact)
+            changes.append({"op": "put", "contact": contact.to_dict()})
+        removed = []
+        for contact_id in delete:
+            removed.append(self.agenda.remove(contact_id))
+            self.sort_cache.remove(contact_id)
+            self.search_index.remove(contact_id)
+            self.lookup_index.remove(contact_id)
+            self.birthday_index.remove(contact_id)
+            changes.append({"op": "delete", "id": contact_id})
+        self.persistence.submit_changes(changes)
+        self.update_table_rows([contact.id for contact in put],
+                               [contact.id for contact in removed])
+        return removed
+    
+    def poll_persistence(self) -> None:
+        """Recoge en el hilo de Tk los resultados del hilo de guardado."""
+        for success, message, needs_compaction in self.persistence.results():
+            if not success:
+                messagebox.showerror("Error", message)
+            elif needs_compaction:
+                # El diario del archivo creció demasiado: volcarlo a una instantánea nueva
+                self.save_agenda()
+        self.root.after(100, self.poll_persistence)
     
     def setup_ui(self) -> None:
         """Configura la interfaz gráfica."""
+        # Menú de herramientas (las funciones que no entran en la barra de botones)
+        menubar = tk.Menu(self.root)
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        tools_menu.add_command(label="Próximos cumpleaños...", command=self.birthdays_window)
+        tools_menu.add_command(label="Buscar duplicados...", command=self.duplicates_window)
+        tools_menu.add_command(label="Exportaciones...", command=self.exports_window)
+        menubar.add_cascade(label="Herramientas", menu=tools_menu)
+        view_menu = tk.Menu(menubar, tearoff=0)
+        self.page_size_var = tk.IntVar(value=PAGE_SIZE)
+        for size in PAGE_SIZES:
+            view_menu.add_radiobutton(label=f"{size} contactos por página" if size else "Lista continua",
+                                      variable=self.page_size_var, value=size,
+                                      command=self.apply_page_size)
+        menubar.add_cascade(label="Ver", menu=view_menu)
+        self.root.config(menu=menubar)
+        
         # Marco para botones
         button_frame = tk.Frame(self.root, bg='white')
         button_frame.pack(pady=10, padx=10, fill=tk.X)
@@ -206,12 +496,13 @@ class AgendaApp:
         # Botones principales
         buttons_config = [
             ("Agregar Contacto", self.add_contact_window),
-            ("Buscar Contacto", self.search_contact_window),
+            ("Buscar Contacto", self.focus_search),
             ("Editar Contacto", self.edit_contact_window),
             ("Eliminar Contacto", self.delete_contact),
             ("Exportar", self.export_menu),  # Nuevo botón de exportación
             ("Configuración", self.config_window),
-            ("Salir", self.root.quit)
+            ("Bloquear", self.lock_agenda),
+            ("Salir", self.exit_app)
         ]
         
         for text, command in buttons_config:
@@ -220,6 +511,50 @@ class AgendaApp:
                            font=("Arial", 10, "bold"))
             btn.pack(side=tk.LEFT, padx=5, pady=5)
         
+        # Cerrar la ventana equivale a "Salir"
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
+        
+        # Búsqueda en vivo: filtra la tabla mientras se escribe
+        search_frame = tk.Frame(self.root, bg='white')
+        search_frame.pack(padx=10, fill=tk.X)
+        tk.Label(search_frame, text="Buscar:", bg='white').pack(side=tk.LEFT)
+        self.search_var = tk.StringVar(value="")
+        self.search_entry = tk.Entry(search_frame, textvariable=self.search_var, width=40)
+        self.search_entry.pack(side=tk.LEFT, padx=5)
+        self.search_mode = tk.StringVar(value="Contiene")
+        mode_box = ttk.Combobox(search_frame, textvariable=self.search_mode,
+                                values=list(SEARCH_MODES), state="readonly", width=10)
+        mode_box.pack(side=tk.LEFT)
+        mode_box.bind('<<ComboboxSelected>>', lambda event: self.schedule_search())
+        self.search_var.trace_add("write", lambda *args: self.schedule_search())
+        self.search_entry.bind('<Escape>', lambda event: self.search_var.set(""))
+        self.root.bind('<Control-f>', lambda event: self.focus_search())
+        
+        # Barra de estado (se empaqueta antes que la tabla para que quede abajo)
+        self.status_var = tk.StringVar(value="")
+        tk.Label(self.root, textvariable=self.status_var, anchor=tk.W,
+                 bg='white', fg='gray', font=("Arial", 9)).pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 5))
+        
+        # Navegación: salto por letra y, en modo paginado, los botones de página
+        pager_frame = tk.Frame(self.root, bg='white')
+        pager_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10)
+        tk.Label(pager_frame, text="Ir a la letra:", bg='white').pack(side=tk.LEFT)
+        self.jump_letter = tk.StringVar(value="")
+        letter_box = ttk.Combobox(pager_frame, textvariable=self.jump_letter,
+                                  values=JUMP_LETTERS, state="readonly", width=3)
+        letter_box.pack(side=tk.LEFT, padx=5)
+        letter_box.bind('<<ComboboxSelected>>', lambda event: self.jump_to_letter(self.jump_letter.get()))
+        self.page_controls = tk.Frame(pager_frame, bg='white')
+        self.page_buttons = {}
+        for text, step in (("⏮", "first"), ("◀", "previous"), ("▶", "next"), ("⏭", "last")):
+            button = tk.Button(self.page_controls, text=text, width=3,
+                               command=lambda step=step: self.go_to_page(step))
+            button.pack(side=tk.LEFT, padx=2)
+            self.page_buttons[step] = button
+            if step == "previous":
+                self.page_label = tk.Label(self.page_controls, text="", bg='white', width=18)
+                self.page_label.pack(side=tk.LEFT, padx=5)
+        
         # Marco para la tabla
         table_frame = tk.Frame(self.root, bg='white')
         table_frame.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
@@ -228,15 +563,18 @@ class AgendaApp:
         columns = ("Nombre", "Teléfono", "Correo", "Dirección", "Cumpleaños")
         self.tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
         
-        # Configurar encabezados
-        for col in columns:
-            self.tree.heading(col, text=col)
+        # Configurar encabezados (clic para ordenar por esa columna)
+        self.column_fields = dict(zip(columns, SORT_FIELDS))
+        for col, field in self.column_fields.items():
+            self.tree.heading(col, text=col, command=lambda field=field: self.sort_by(field))
             self.tree.column(col, width=120)
         
-        # Scrollbars
-        v_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        # Scrollbars (la vertical la maneja la tabla virtual: recorre toda la vista)
+        v_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL)
         h_scrollbar = ttk.Scrollbar(table_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+        # Solo se crean las filas que se ven
+        self.table = VirtualTable(self.tree, v_scrollbar, self.row_values, on_render=self.update_pager)
         
         # Empaquetar elementos
         self.tree.grid(row=0, column=0, sticky='nsew')
@@ -251,6 +589,7 @@ class AgendaApp:
         self.tree.bind('<Double-1>', self.edit_contact_double_click)  # Doble clic
         
         # Actualizar tabla
+        self.apply_page_size()
         self.update_table()
     
     def show_context_menu(self, event):
@@ -259,14 +598,15 @@ class AgendaApp:
         item = self.tree.identify_row(event.y)
         if item:
             # Seleccionar el ítem
-            self.tree.selection_set(item)
+            self.table.select(item)
             
             # Crear menú contextual
             context_menu = tk.Menu(self.root, tearoff=0)
             
-            # Obtener datos del contacto seleccionado
-            index = self.tree.index(item)
-            contact = self.agenda[index]
+            # Obtener datos del contacto seleccionado (el iid de la fila es su id)
+            contact = self.agenda.get(item)
+            if contact is None:
+                return
             
             # Agregar opciones al menú
             context_menu.add_command(label="📧 Enviar Email", 
@@ -279,9 +619,9 @@ class AgendaApp:
             
             # Opciones de edición
             context_menu.add_command(label="Editar Contacto", 
-                                   command=lambda: self.edit_contact_by_index(index))
+                                   command=lambda: self.edit_contact_by_id(contact.id))
             context_menu.add_command(label="Eliminar Contacto", 
-                                   command=lambda: self.delete_contact_by_index(index))
+                                   command=lambda: self.delete_contact_by_id(contact.id))
             
             # Mostrar menú contextual
             context_menu.post(event.x_root, event.y_root)
@@ -290,11 +630,11 @@ class AgendaApp:
         """Edita un contacto con doble clic."""
         item = self.tree.identify_row(event.y)
         if item:
-            index = self.tree.index(item)
-            self.edit_contact_by_index(index)
+            self.edit_contact_by_id(item)
     
     def send_email_action(self, contact):
         """Envía un correo electrónico al contacto."""
+        from messaging import send_email
         success, message = send_email(contact)
         if success:
             messagebox.showinfo("Éxito", message)
@@ -303,16 +643,19 @@ class AgendaApp:
     
     def send_whatsapp_action(self, contact):
         """Envía un mensaje de WhatsApp al contacto."""
+        from messaging import send_whatsapp
         success, message = send_whatsapp(contact)
         if success:
             messagebox.showinfo("Éxito", message)
         else:
             messagebox.showerror("Error", message)
     
-    def edit_contact_by_index(self, index):
-        """Edita un contacto por su índice."""
-        if index < len(self.agenda):
-            contact = self.agenda[index]
+    def edit_contact_by_id(self, contact_id: str) -> None:
+        """Edita un contacto por su id."""
+        if not self.ensure_loaded():
+            return
+        contact = self.agenda.get(contact_id)
+        if contact is not None:
             # Crear ventana de edición
             window = tk.Toplevel(self.root)
             window.title("Editar Contacto")
@@ -364,15 +707,15 @@ class AgendaApp:
                 if not self.validate_date(birthday):
                     messagebox.showerror("Error", "Formato de fecha inválido. Use DD/MM/YYYY o déjelo vacío.")
                     return
-                self.agenda[index] = {
-                    "name": name,
-                    "phone": phone_entry.get().strip(),
-                    "email": email_entry.get().strip(),
-                    "address": address_entry.get().strip(),
-                    "birthday": birthday
-                }
-                self.save_agenda()
-                self.update_table()
+                updated = Contact(
+                    contact.id,
+                    name,
+                    phone_entry.get().strip(),
+                    email_entry.get().strip(),
+                    address_entry.get().strip(),
+                    birthday
+                )
+                self.store_contact(updated)
                 messagebox.showinfo("Éxito", f"Contacto '{name}' actualizado correctamente.")
                 window.destroy()
             
@@ -395,32 +738,95 @@ class AgendaApp:
             # Permitir que Esc cierre la ventana
             window.bind('<Escape>', lambda event: window.destroy())
     
-    def delete_contact_by_index(self, index):
-        """Elimina un contacto por su índice."""
-        if index < len(self.agenda):
-            contact = self.agenda[index]
+    def delete_contact_by_id(self, contact_id: str) -> None:
+        """Elimina un contacto por su id."""
+        if not self.ensure_loaded():
+            return
+        contact = self.agenda.get(contact_id)
+        if contact is not None:
             if messagebox.askyesno("Confirmar Eliminación", 
-                                 f"¿Estás seguro de que deseas eliminar a '{contact['name']}'?"):
-                self.agenda.pop(index)
-                self.save_agenda()
-                self.update_table()
-                messagebox.showinfo("Éxito", f"Contacto '{contact['name']}' eliminado correctamente.")
+                                 f"¿Estás seguro de que deseas eliminar a '{contact.name}'?"):
+                self.discard_contact(contact.id)
+                messagebox.showinfo("Éxito", f"Contacto '{contact.name}' eliminado correctamente.")
+    
+    def sort_by(self, field: str) -> None:
+        """Ordena por una columna; otro clic en la misma invierte el orden."""
+        if not self.ensure_loaded():
+            return
+        descending = not self.sort_descending if field == self.sort_field else False
+        self.set_sort(field, descending)
+        self.refresh_table()
+    
+    def set_sort(self, field: Optional[str], descending: bool = False) -> None:
+        """Cambia la columna de orden y marca su encabezado con una flecha."""
+        self.sort_field = field
+        self.sort_descending = descending
+        for col, column_field in self.column_fields.items():
+            arrow = (" ▼" if descending else " ▲") if column_field == field else ""
+            self.tree.heading(col, text=col + arrow)
+    
+    def apply_page_size(self) -> None:
+        """Pasa la tabla al tamaño de página elegido en el menú Ver."""
+        page_size = self.page_size_var.get()
+        if page_size:
+            self.page_controls.pack(side=tk.RIGHT)
+        else:
+            self.page_controls.pack_forget()
+        self.table.set_page_size(page_size)
+    
+    def update_pager(self) -> None:
+        """Muestra la página actual y habilita los botones que corresponden."""
+        if not self.table.page_size:
+            return
+        page, pages = self.table.page()
+        self.page_label.config(text=f"Página {page + 1} de {pages}")
+        for step, button in self.page_buttons.items():
+            enabled = page > 0 if step in ("first", "previous") else page < pages - 1
+            button.config(state=tk.NORMAL if enabled else tk.DISABLED)
+    
+    def go_to_page(self, step: str) -> None:
+        """Primera, anterior, siguiente o última página."""
+        page, pages = self.table.page()
+        targets = {"first": 0, "previous": page - 1, "next": page + 1, "last": pages - 1}
+        self.table.show_page(targets[step])
+    
+    def jump_to_letter(self, letter: str) -> None:
+        """Lleva la tabla al primer contacto cuya columna de orden empieza con `letter`."""
+        if not letter:
+            return
+        if self.sort_field not in LETTER_FIELDS:
+            # El salto necesita un orden alfabético: ordenar por nombre
+            if not self.ensure_loaded():
+                return
+            self.set_sort("name")
+            self.refresh_table()
+        field = self.sort_field
+        key = (self.table.version, field, self.sort_descending)
+        if self.letter_index is None or self.letter_index[0] != key:
+            offsets = letter_offsets(self.table.rows, lambda contact_id: getattr(self.agenda.get(contact_id), field))
+            self.letter_index = (key, offsets)
+        position = letter_position(self.letter_index[1], letter, self.sort_descending)
+        if position is None:
+            position = len(self.table) - 1
+        self.table.show_row(position)
     
-    def update_table(self, contacts: Optional[List[Dict]] = None) -> None:
+    def update_table(self, contacts: Optional[Iterable[Contact]] = None) -> None:
         """Actualiza la tabla con los contactos proporcionados o todos los contactos."""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        contacts = contacts or self.agenda
-        for contact in contacts:
-            if contact is None:
-                continue
-            self.tree.insert("", tk.END, values=(
-                contact.get("name", ""), 
-                contact.get("phone", ""), 
-                contact.get("email", ""), 
-                contact.get("address", ""), 
-                contact.get("birthday", "")
-            ))
+        if self.sort_field is not None:
+            if contacts is None:
+                contact_ids = self.sort_cache.order(self.sort_field, self.sort_descending)
+            else:
+                contact_ids = self.sort_cache.sort([contact.id for contact in contacts],
+                                                   self.sort_field, self.sort_descending)
+        else:
+            contacts = self.agenda if contacts is None else contacts
+            contact_ids = [contact.id for contact in contacts]
+        self.table.set_rows(contact_ids)
+    
+    def row_values(self, contact_id: str) -> Tuple:
+        """Valores de la fila de un contacto (la tabla virtual los pide al mostrarla)."""
+        contact = self.agenda.get(contact_id)
+        return (contact.name, contact.phone, contact.email, contact.address, contact.birthday)
     
     def validate_date(self, date: str) -> bool:
         """Valida que la fecha tenga el formato DD/MM/YYYY o esté vacía."""
@@ -431,6 +837,8 @@ class AgendaApp:
     
     def add_contact_window(self) -> None:
         """Abre una ventana para agregar un contacto."""
+        if not self.ensure_loaded():
+            return
         window = tk.Toplevel(self.root)
         window.title("Agregar Contacto")
         window.geometry("450x400")
@@ -476,16 +884,15 @@ class AgendaApp:
             if not self.validate_date(birthday):
                 messagebox.showerror("Error", "Formato de fecha inválido. Use DD/MM/YYYY o déjelo vacío.")
                 return
-            contact = {
-                "name": name,
-                "phone": phone_entry.get().strip(),
-                "email": email_entry.get().strip(),
-                "address": address_entry.get().strip(),
-                "birthday": birthday
-            }
-            self.agenda.append(contact)
-            self.save_agenda()
-            self.update_table()
+            contact = Contact(
+                new_contact_id(),
+                name,
+                phone_entry.get().strip(),
+                email_entry.get().strip(),
+                address_entry.get().strip(),
+                birthday
+            )
+            self.store_contact(contact)
             messagebox.showinfo("Éxito", f"Contacto '{name}' agregado correctamente.")
             window.destroy()
         
@@ -508,13 +915,147 @@ class AgendaApp:
         # Permitir que Esc cierre la ventana
         window.bind('<Escape>', lambda event: window.destroy())
     
-    def search_contact_window(self) -> None:
-        """Abre una ventana para buscar contactos."""
+    def focus_search(self) -> None:
+        """Lleva el foco al cuadro de búsqueda."""
+        self.search_entry.focus_set()
+    
+    def schedule_search(self) -> None:
+        """Reprograma el filtrado hasta que se deje de escribir por SEARCH_DELAY_MS."""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, self.run_search)
+    
+    def run_search(self) -> None:
+        """Filtra la tabla con el texto del cuadro de búsqueda."""
+        self.search_job = None
+        self.refresh_table()
+    
+    def refresh_table(self) -> None:
+        """Muestra la agenda, filtrada por la búsqueda en vivo si hay texto."""
+        query = self.search_var.get().strip()
+        if not query or self.loading:
+            self.update_table()
+            self.show_status(f"{len(self.agenda)} contactos")
+            return
+        mode = SEARCH_MODES[self.search_mode.get()]
+        plan = None
+        if mode == "query":
+            try:
+                contact_ids, plan = self.query_planner.execute(query)
+            except QuerySyntaxError as e:
+                self.show_status(f"Error en la consulta: {e}")
+                return
+        elif mode in LOOKUP_KINDS:
+            contact_ids = self.lookup_index.lookup(mode, query)
+        else:
+            contact_ids = self.live_search.search(query, mode)
+        self.update_table([self.agenda.get(contact_id) for contact_id in contact_ids])
+        self.show_table_status(plan)
+    
+    def show_table_status(self, plan=None) -> None:
+        """Muestra en la barra de estado cuántos contactos hay en la tabla."""
+        if not self.search_var.get().strip():
+            status = f"{len(self.agenda)} contactos"
+        elif len(self.table):
+            status = f"{len(self.table)} de {len(self.agenda)} contactos"
+        else:
+            status = "No se encontraron contactos."
+        if plan is not None:
+            # Mostrar cómo se resolvió la consulta avanzada
+            status += f" | {plan.describe()}"
+        self.show_status(status)
+    
+    def row_filter(self) -> Optional[Callable[[Contact], bool]]:
+        """
+        La búsqueda en curso como condición sobre un contacto suelto, o None
+        si no se puede evaluar así (la difusa ordena por parecido).
+        """
+        query = self.search_var.get().strip()
+        if not query:
+            return lambda contact: True
+        mode = SEARCH_MODES[self.search_mode.get()]
+        if mode == "contains":
+            return Condition(None, "contains", normalize_text(query)).matches
+        if mode in LOOKUP_KINDS:
+            return lambda contact: lookup_matches(mode, contact, query)
+        if mode == "query":
+            try:
+                return parse_query(query).matches
+            except QuerySyntaxError:
+                return None
+        return None
+    
+    def update_table_rows(self, changed_ids: List[str], removed_ids: List[str]) -> None:
+        """
+        Aplica a la tabla solo los contactos agregados, editados o quitados,
+        conservando el orden y el filtro en curso.
+        """
+        matches = self.row_filter()
+        if matches is None or self.loading:
+            self.refresh_table()
+            return
+        # Primero se quitan todas las filas que salen o cambian de lugar, en
+        # una sola pasada por la vista; después se ubican las que entran
+        gone = list(removed_ids)
+        moved = []
+        placed = []
+        for contact_id in changed_ids:
+            contact = self.agenda.get(contact_id)
+            shown = contact_id in self.table
+            if not matches(contact):
+                if shown:
+                    gone.append(contact_id)
+            elif shown and self.sort_field is None:
+                self.table.update_row(contact_id)
+            else:
+                # Nuevo en la vista, o editado con la tabla ordenada: puede cambiar de lugar
+                if shown:
+                    moved.append(contact_id)
+                placed.append(contact_id)
+        self.table.remove_rows(gone)
+        self.table.remove_rows(moved, keep_selection=True)
+        for contact_id in placed:
+            self.table.insert_row(self.row_position(contact_id), contact_id)
+        self.show_table_status()
+    
+    def row_position(self, contact_id: str) -> int:
+        """Lugar de un contacto dentro de la vista, según el orden en curso."""
+        rows = self.table.rows
+        if self.sort_field is not None:
+            return self.sort_cache.insert_position(rows, contact_id, self.sort_field,
+                                                   self.sort_descending)
+        return bisect_right(rows, self.search_index.order_key(contact_id),
+                            key=self.search_index.order_key)
+    
+    def edit_contact_window(self) -> None:
+        """Abre una ventana para editar un contacto seleccionado."""
+        if not self.ensure_loaded():
+            return
+        selected = self.table.selection()
+        if not selected:
+            messagebox.showerror("Error", "Seleccione un contacto para editar.")
+            return
+        self.edit_contact_by_id(selected[0])
+    
+    def delete_contact(self) -> None:
+        """Elimina un contacto seleccionado."""
+        if not self.ensure_loaded():
+            return
+        selected = self.table.selection()
+        if not selected:
+            messagebox.showerror("Error", "Seleccione un contacto para eliminar.")
+            return
+        contact = self.discard_contact(selected[0])
+        messagebox.showinfo("Éxito", f"Contacto '{contact.name}' eliminado correctamente.")
+    
+    def birthdays_window(self) -> None:
+        """Muestra quiénes cumplen años en los próximos días."""
+        if not self.ensure_loaded():
+            return
         window = tk.Toplevel(self.root)
-        window.title("Buscar Contacto")
-        window.geometry("400x150")
+        window.title("Próximos Cumpleaños")
+        window.geometry("450x400")
         window.transient(self.root)
-        window.grab_set()
         
         # Centrar ventana
         window.update_idletasks()
@@ -522,51 +1063,69 @@ class AgendaApp:
         y = (window.winfo_screenheight() // 2) - (window.winfo_height() // 2)
         window.geometry(f"+{x}+{y}")
         
-        tk.Label(window, text="Nombre a buscar:").pack(pady=10)
-        search_entry = tk.Entry(window, width=30)
-        search_entry.pack(pady=5)
+        top_frame = tk.Frame(window)
+        top_frame.pack(pady=10)
+        tk.Label(top_frame, text="Días:").pack(side=tk.LEFT)
+        days_var = tk.StringVar(value=str(UPCOMING_DAYS))
+        tk.Spinbox(top_frame, from_=0, to=365, width=5, textvariable=days_var).pack(side=tk.LEFT, padx=5)
         
-        def search():
-            search_term = search_entry.get().strip().lower()
-            if not search_term:
-                self.update_table()
-                return
-            found_contacts = [
-                contact for contact in self.agenda if search_term in contact["name"].lower()
-            ]
-            self.update_table(found_contacts)
-            if not found_contacts:
-                messagebox.showinfo("Resultado", "No se encontraron contactos.")
-            window.destroy()
+        columns = ("Nombre", "Fecha", "Faltan")
+        tree = ttk.Treeview(window, columns=columns, show="headings", height=12)
+        for col in columns:
+            tree.heading(col, text=col)
+        tree.column("Nombre", width=220)
+        tree.column("Fecha", width=90)
+        tree.column("Faltan", width=80)
+        tree.pack(padx=10, fill=tk.BOTH, expand=True)
         
-        # Botones con atajos de teclado
-        button_frame = tk.Frame(window)
-        button_frame.pack(pady=10)
+        def refresh(*args):
+            try:
+                days = int(days_var.get())
+            except ValueError:
+                return
+            for item in tree.get_children():
+                tree.delete(item)
+            for contact_id, date, remaining in self.birthday_index.upcoming(days):
+                contact = self.agenda.get(contact_id)
+                when = "Hoy" if remaining == 0 else f"{remaining} días"
+                tree.insert("", tk.END, iid=contact_id,
+                            values=(contact.name, date.strftime("%d/%m"), when))
         
-        search_btn = tk.Button(button_frame, text="Buscar", command=search)
-        search_btn.pack(side=tk.LEFT, padx=5)
-        search_btn.bind('<Return>', lambda event: search())
+        def edit_selected(event):
+            item = tree.identify_row(event.y)
+            if item and item in self.agenda:
+                window.destroy()
+                self.edit_contact_by_id(item)
         
-        cancel_btn = tk.Button(button_frame, text="Cancelar", command=window.destroy)
-        cancel_btn.pack(side=tk.LEFT, padx=5)
-        cancel_btn.bind('<Escape>', lambda event: window.destroy())
+        days_var.trace_add("write", refresh)
+        tree.bind('<Double-1>', edit_selected)
+        refresh()
         
-        # Permitir que Enter active el botón de buscar
-        window.bind('<Return>', lambda event: search())
-        # Permitir que Esc cierre la ventana
+        tk.Button(window, text="Cerrar", command=window.destroy, width=15).pack(pady=10)
         window.bind('<Escape>', lambda event: window.destroy())
     
-    def edit_contact_window(self) -> None:
-        """Abre una ventana para editar un contacto seleccionado."""
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showerror("Error", "Seleccione un contacto para editar.")
+    def duplicates_window(self) -> None:
+        """Busca contactos duplicados en segundo plano y ofrece fusionarlos."""
+        if not self.ensure_loaded():
+            return
+        self.show_status("Buscando duplicados...")
+        future = self.crypto_pool.submit(find_duplicates, list(self.agenda))
+        self.wait_for(future, lambda: self.show_duplicates(future))
+    
+    def show_duplicates(self, future: Future) -> None:
+        """Muestra los grupos de duplicados; cada grupo se puede marcar para fusionar."""
+        self.show_table_status()
+        try:
+            groups = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudieron buscar duplicados: {e}")
+            return
+        if not groups:
+            messagebox.showinfo("Duplicados", "No se encontraron contactos duplicados.")
             return
-        index = self.tree.index(selected[0])
-        contact = self.agenda[index]
         window = tk.Toplevel(self.root)
-        window.title("Editar Contacto")
-        window.geometry("450x400")
+        window.title("Contactos Duplicados")
+        window.geometry("750x450")
         window.transient(self.root)
         window.grab_set()
         
@@ -576,89 +1135,65 @@ class AgendaApp:
         y = (window.winfo_screenheight() // 2) - (window.winfo_height() // 2)
         window.geometry(f"+{x}+{y}")
         
-        # Formulario
-        form_frame = tk.Frame(window, padx=20, pady=20)
-        form_frame.pack(fill=tk.BOTH, expand=True)
-        
-        tk.Label(form_frame, text="Nombre *:", font=("Arial", 10, "bold")).grid(row=0, column=0, sticky=tk.W, pady=5)
-        name_entry = tk.Entry(form_frame, width=30)
-        name_entry.insert(0, contact["name"])
-        name_entry.grid(row=1, column=0, sticky=tk.W, pady=5)
-        
-        tk.Label(form_frame, text="Teléfono:", font=("Arial", 10, "bold")).grid(row=2, column=0, sticky=tk.W, pady=5)
-        phone_entry = tk.Entry(form_frame, width=30)
-        phone_entry.insert(0, contact["phone"])
-        phone_entry.grid(row=3, column=0, sticky=tk.W, pady=5)
-        
-        tk.Label(form_frame, text="Correo:", font=("Arial", 10, "bold")).grid(row=4, column=0, sticky=tk.W, pady=5)
-        email_entry = tk.Entry(form_frame, width=30)
-        email_entry.insert(0, contact["email"])
-        email_entry.grid(row=5, column=0, sticky=tk.W, pady=5)
+        tk.Label(window, text="Doble clic en un grupo para marcarlo o desmarcarlo. "
+                              "Se conserva el primer contacto de cada grupo.").pack(pady=5)
+        columns = ("Fusionar", "Teléfono", "Email", "Cumpleaños")
+        tree = ttk.Treeview(window, columns=columns, show="tree headings", height=15)
+        tree.heading("#0", text="Nombre")
+        tree.column("#0", width=250)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=110)
+        tree.pack(padx=10, fill=tk.BOTH, expand=True)
         
-        tk.Label(form_frame, text="Dirección:", font=("Arial", 10, "bold")).grid(row=6, column=0, sticky=tk.W, pady=5)
-        address_entry = tk.Entry(form_frame, width=30)
-        address_entry.insert(0, contact["address"])
-        address_entry.grid(row=7, column=0, sticky=tk.W, pady=5)
+        # iid del grupo -> contactos del grupo (el primero es el que se conserva)
+        rows = {}
+        for number, (score, group) in enumerate(groups):
+            iid = f"grupo{number}"
+            rows[iid] = group
+            tree.insert("", tk.END, iid=iid, open=True,
+                        text=f"{group[0].name} ({len(group)}, {score:.0%})",
+                        values=("Sí", "", "", ""))
+            for contact in group:
+                tree.insert(iid, tk.END, text=contact.name,
+                            values=("", contact.phone, contact.email, contact.birthday))
         
-        tk.Label(form_frame, text="Cumpleaños (DD/MM/YYYY):", font=("Arial", 10, "bold")).grid(row=8, column=0, sticky=tk.W, pady=5)
-        birthday_entry = tk.Entry(form_frame, width=30)
-        birthday_entry.insert(0, contact.get("birthday", ""))
-        birthday_entry.grid(row=9, column=0, sticky=tk.W, pady=5)
+        def toggle(event):
+            item = tree.identify_row(event.y)
+            if item in rows:
+                marked = tree.set(item, "Fusionar") == "Sí"
+                tree.set(item, "Fusionar", "No" if marked else "Sí")
         
-        def save_changes():
-            name = name_entry.get().strip()
-            birthday = birthday_entry.get().strip()
-            if not name:
-                messagebox.showerror("Error", "El nombre es obligatorio.")
+        def merge_marked():
+            put, delete = [], []
+            for iid, group in rows.items():
+                # Saltear grupos marcados como "No" o que cambiaron mientras se buscaba
+                if tree.set(iid, "Fusionar") != "Sí":
+                    continue
+                if any(self.agenda.get(contact.id) is not contact for contact in group):
+                    continue
+                put.append(merge_group(group))
+                delete.extend(contact.id for contact in group[1:])
+            if not put:
+                messagebox.showinfo("Duplicados", "No hay grupos marcados para fusionar.")
                 return
-            if not self.validate_date(birthday):
-                messagebox.showerror("Error", "Formato de fecha inválido. Use DD/MM/YYYY o déjelo vacío.")
-                return
-            self.agenda[index] = {
-                "name": name,
-                "phone": phone_entry.get().strip(),
-                "email": email_entry.get().strip(),
-                "address": address_entry.get().strip(),
-                "birthday": birthday
-            }
-            self.save_agenda()
-            self.update_table()
-            messagebox.showinfo("Éxito", f"Contacto '{name}' actualizado correctamente.")
+            self.apply_contact_changes(put, delete)
             window.destroy()
+            messagebox.showinfo("Éxito", f"{len(put)} grupos fusionados, {len(delete)} contactos eliminados.")
         
-        # Botones con atajos de teclado
+        tree.bind('<Double-1>', toggle)
         button_frame = tk.Frame(window)
         button_frame.pack(pady=10)
-        
-        save_btn = tk.Button(button_frame, text="Guardar", command=save_changes, 
-                            bg='#4CAF50', fg='white', width=10)
-        save_btn.pack(side=tk.LEFT, padx=5)
-        save_btn.bind('<Return>', lambda event: save_changes())
-        
-        cancel_btn = tk.Button(button_frame, text="Cancelar", command=window.destroy, 
-                              bg='#f44336', fg='white', width=10)
-        cancel_btn.pack(side=tk.LEFT, padx=5)
-        cancel_btn.bind('<Escape>', lambda event: window.destroy())
-        
-        # Permitir que Enter active el botón de guardar
-        window.bind('<Return>', lambda event: save_changes())
-        # Permitir que Esc cierre la ventana
+        tk.Button(button_frame, text="Fusionar marcados", command=merge_marked,
+                  bg='#4CAF50', fg='white', width=15).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Cancelar", command=window.destroy,
+                  bg='#f44336', fg='white', width=15).pack(side=tk.LEFT, padx=5)
         window.bind('<Escape>', lambda event: window.destroy())
     
-    def delete_contact(self) -> None:
-        """Elimina un contacto seleccionado."""
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showerror("Error", "Seleccione un contacto para eliminar.")
-            return
-        index = self.tree.index(selected[0])
-        contact = self.agenda.pop(index)
-        self.save_agenda()
-        self.update_table()
-        messagebox.showinfo("Éxito", f"Contacto '{contact['name']}' eliminado correctamente.")
-    
     def config_window(self) -> None:
         """Abre una ventana para actualizar la contraseña."""
+        if not self.ensure_loaded():
+            return
         window = tk.Toplevel(self.root)
         window.title("Configuración - Cambiar Contraseña")
         window.geometry("400x250")
@@ -681,7 +1216,17 @@ class AgendaApp:
         confirm_password_entry = tk.Entry(window, show="*", width=30)
         confirm_password_entry.pack(pady=5)
         
+        saving = False
+        
+        def close():
+            # Mientras se escribe la ranura nueva la ventana queda abierta
+            if not saving:
+                window.destroy()
+        
         def change_password():
+            nonlocal saving
+            if saving:
+                return
             new_password = new_password_entry.get()
             confirm_password = confirm_password_entry.get()
             if not new_password:
@@ -690,16 +1235,34 @@ class AgendaApp:
             if new_password != confirm_password:
                 messagebox.showerror("Error", "Las contraseñas no coinciden.")
                 return
-            # Re-encriptar los datos con la nueva contraseña
-            old_password = self.password
-            self.password = new_password
+            
+            # Solo se vuelve a envolver la clave de datos: los contactos no se tocan.
+            # Derivar la clave nueva tarda lo que un desbloqueo: fuera del hilo de Tk
+            def rewrap():
+                self.persistence.submit_keyslot(self.session.rewrap(new_password))
+                return self.persistence.flush()
+            
+            saving = True
+            save_btn.config(state=tk.DISABLED)
+            cancel_btn.config(state=tk.DISABLED)
+            future = self.crypto_pool.submit(rewrap)
+            self.wait_for(future, lambda: password_changed(future))
+        
+        def password_changed(future: Future):
+            nonlocal saving
+            saving = False
             try:
-                self.save_agenda()
-                messagebox.showinfo("Éxito", "Contraseña actualizada correctamente.")
-                window.destroy()
+                if not future.result():
+                    self.persistence.results()  # El error se informa acá abajo
+                    raise IOError("no se pudo guardar la nueva clave")
             except Exception as e:
-                self.password = old_password  # Restaurar contraseña anterior si falla
+                # Si falla sigue valiendo la contraseña anterior
+                save_btn.config(state=tk.NORMAL)
+                cancel_btn.config(state=tk.NORMAL)
                 messagebox.showerror("Error", f"No se pudo actualizar la contraseña: {str(e)}")
+                return
+            messagebox.showinfo("Éxito", "Contraseña actualizada correctamente.")
+            window.destroy()
         
         # Botones con atajos de teclado
         button_frame = tk.Frame(window)
@@ -710,21 +1273,24 @@ class AgendaApp:
         save_btn.pack(side=tk.LEFT, padx=5)
         save_btn.bind('<Return>', lambda event: change_password())
         
-        cancel_btn = tk.Button(button_frame, text="Cancelar", command=window.destroy, 
+        cancel_btn = tk.Button(button_frame, text="Cancelar", command=close, 
                               bg='#f44336', fg='white', width=15)
         cancel_btn.pack(side=tk.LEFT, padx=5)
-        cancel_btn.bind('<Escape>', lambda event: window.destroy())
+        cancel_btn.bind('<Escape>', lambda event: close())
         
         # Permitir que Enter active el botón de guardar
         window.bind('<Return>', lambda event: change_password())
         # Permitir que Esc cierre la ventana
-        window.bind('<Escape>', lambda event: window.destroy())
+        window.bind('<Escape>', lambda event: close())
+        window.protocol("WM_DELETE_WINDOW", close)
     
     def export_menu(self):
         """Muestra menú de opciones de exportación."""
+        if not self.ensure_loaded():
+            return
         menu_window = tk.Toplevel(self.root)
         menu_window.title("Exportar Contactos")
-        menu_window.geometry("300x200")
+        menu_window.geometry("320x400")
         menu_window.transient(self.root)
         menu_window.grab_set()
         
@@ -737,16 +1303,32 @@ class AgendaApp:
         tk.Label(menu_window, text="Seleccionar opción de exportación:", 
                  font=("Arial", 12, "bold")).pack(pady=10)
         
-        # Botones de exportación
+        # Botones de exportación (la ventana se cierra: el avance se ve en la de exportaciones)
+        def run(action):
+            menu_window.destroy()
+            action()
+        
         tk.Button(menu_window, text="Exportar Contacto Seleccionado", 
-                 command=self.export_selected_to_pdf, width=30).pack(pady=5)
+                 command=lambda: run(self.export_selected_to_pdf), width=30).pack(pady=5)
         
         tk.Button(menu_window, text="Exportar Todos los Contactos", 
-                 command=self.export_all_to_pdf, width=30).pack(pady=5)
+                 command=lambda: run(self.export_all_to_pdf), width=30).pack(pady=5)
         
-        # Eliminar esta línea ya que no existe la función
-        # tk.Button(menu_window, text="Exportar Contacto Individual", 
-        #          command=self.export_individual_contact, width=30).pack(pady=5)
+        tk.Button(menu_window, text="Exportar Contacto Individual", 
+                 command=lambda: run(self.export_individual_contact), width=30).pack(pady=5)
+        
+        # Un PDF por contacto, repartido entre varios procesos
+        zip_output = tk.BooleanVar(value=False)
+        tk.Button(menu_window, text="Un PDF por Contacto (Selección)", 
+                 command=lambda: run(lambda: self.export_each_to_pdf(True, zip_output.get())),
+                 width=30).pack(pady=5)
+        
+        tk.Button(menu_window, text="Un PDF por Contacto (Todos)", 
+                 command=lambda: run(lambda: self.export_each_to_pdf(False, zip_output.get())),
+                 width=30).pack(pady=5)
+        
+        tk.Checkbutton(menu_window, text="Guardar los PDF en un archivo .zip",
+                       variable=zip_output).pack()
         
         tk.Button(menu_window, text="Cancelar", command=menu_window.destroy, 
                  width=15).pack(pady=10)
@@ -754,22 +1336,16 @@ class AgendaApp:
     def export_selected_to_pdf(self):
         """Exporta los contactos seleccionados a PDF."""
         try:
-            selected = self.tree.selection()
+            selected = self.table.selection()
             if not selected:
                 messagebox.showerror("Error", "Seleccione al menos un contacto para exportar.")
                 return
                 
             # Obtener contactos seleccionados
-            selected_contacts = []
-            for item in selected:
-                index = self.tree.index(item)
-                selected_contacts.append(self.agenda[index])
-            
-            success, message = export_selected_to_pdf(selected_contacts)
-            if success:
-                messagebox.showinfo("Éxito", message)
-            else:
-                messagebox.showerror("Error", message)
+            selected_contacts = [self.agenda.get(item) for item in selected]
+            
+            self.start_export("export_selected_to_pdf",
+                              f"{len(selected_contacts)} contactos seleccionados", selected_contacts)
                 
         except Exception as e:
             messagebox.showerror("Error", f"No se pudieron exportar los contactos: {str(e)}")
@@ -781,30 +1357,118 @@ class AgendaApp:
                 messagebox.showinfo("Información", "No hay contactos para exportar.")
                 return
             
-            success, message = export_all_to_pdf(self.agenda)
-            if success:
-                messagebox.showinfo("Éxito", message)
-            else:
-                messagebox.showerror("Error", message)
+            self.start_export("export_all_to_pdf", f"Agenda completa ({len(self.agenda)} contactos)",
+                              self.agenda)
                 
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo exportar la agenda: {str(e)}")
     
+    def export_each_to_pdf(self, selected_only: bool, zip_output: bool = False) -> None:
+        """Exporta un PDF por contacto, de la selección o de toda la agenda."""
+        from export_jobs import BATCH_EXPORT
+        if selected_only:
+            selected = self.table.selection()
+            if not selected:
+                messagebox.showerror("Error", "Seleccione al menos un contacto para exportar.")
+                return
+            contacts = [self.agenda.get(item) for item in selected]
+        else:
+            if not self.agenda:
+                messagebox.showinfo("Información", "No hay contactos para exportar.")
+                return
+            contacts = list(self.agenda)
+        destination = "en un .zip" if zip_output else "en una carpeta"
+        self.start_export(BATCH_EXPORT, f"Un PDF por contacto ({len(contacts)} contactos, {destination})",
+                          contacts, zip_output)
+    
+    def start_export(self, function: str, label: str, contacts: Iterable[Contact],
+                     zip_output: bool = False) -> None:
+        """Encola una exportación a PDF en el proceso de exportación y muestra su avance."""
+        from export_jobs import ExportJobs
+        if self.export_jobs is None:
+            self.export_jobs = ExportJobs()
+        was_active = self.export_jobs.active
+        # Se manda una copia: la agenda puede cambiar mientras se exporta
+        job = self.export_jobs.submit(function, label, [contact.to_dict() for contact in contacts],
+                                      zip_output)
+        self.exports_window()
+        self.update_export_row(job)
+        if not was_active:
+            self.poll_exports()
+    
+    def exports_window(self) -> None:
+        """Muestra (o trae al frente) la ventana con el avance de las exportaciones."""
+        if self.exports_list is not None:
+            self.exports_list.winfo_toplevel().lift()
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Exportaciones")
+        window.geometry("520x300")
+        window.transient(self.root)
+        
+        def on_close():
+            # Las exportaciones siguen: la ventana se puede volver a abrir desde Herramientas
+            self.exports_list = None
+            self.export_rows = {}
+            window.destroy()
+        
+        window.protocol("WM_DELETE_WINDOW", on_close)
+        window.bind('<Escape>', lambda event: on_close())
+        self.exports_list = tk.Frame(window, padx=10, pady=10)
+        self.exports_list.pack(fill=tk.BOTH, expand=True)
+        if self.export_jobs is None:
+            tk.Label(self.exports_list, text="No hay exportaciones.").pack()
+            return
+        for job in self.export_jobs.jobs.values():
+            self.update_export_row(job)
+    
+    def update_export_row(self, job) -> None:
+        """Crea o actualiza la fila de un trabajo en la ventana de exportaciones."""
+        if self.exports_list is None:
+            return
+        from export_jobs import CANCELLED, DONE, FAILED, QUEUED
+        row = self.export_rows.get(job.id)
+        if row is None:
+            frame = tk.Frame(self.exports_list)
+            frame.pack(fill=tk.X, pady=4)
+            tk.Label(frame, text=job.label, anchor=tk.W).pack(fill=tk.X)
+            bar = ttk.Progressbar(frame, maximum=max(1, job.total), length=360)
+            bar.pack(side=tk.LEFT)
+            cancel = tk.Button(frame, text="Cancelar", command=lambda: self.export_jobs.cancel(job.id))
+            cancel.pack(side=tk.RIGHT)
+            status = tk.Label(frame, text="", anchor=tk.W, fg='gray')
+            status.pack(side=tk.BOTTOM, fill=tk.X)
+            row = self.export_rows[job.id] = (bar, status, cancel)
+        bar, status, cancel = row
+        texts = {QUEUED: "En espera", DONE: job.message, FAILED: job.message, CANCELLED: "Cancelada"}
+        text = texts.get(job.state, f"{job.rows} de {job.total} contactos, {job.pages} páginas")
+        bar.configure(value=job.total if job.state == DONE else job.rows)
+        status.config(text=text)
+        if job.finished:
+            cancel.config(state=tk.DISABLED)
+    
+    def poll_exports(self) -> None:
+        """Recoge el avance de las exportaciones mientras quede alguna."""
+        from export_jobs import DONE, FAILED
+        for job in self.export_jobs.poll():
+            self.update_export_row(job)
+            if job.state == DONE:
+                messagebox.showinfo("Éxito", job.message)
+            elif job.state == FAILED:
+                messagebox.showerror("Error", job.message)
+        if self.export_jobs.active:
+            self.root.after(100, self.poll_exports)
+    
     def export_individual_contact(self):
         """Exporta un contacto individual seleccionado."""
         try:
-            selected = self.tree.selection()
+            selected = self.table.selection()
             if not selected:
                 messagebox.showerror("Error", "Seleccione un contacto para exportar.")
                 return
             
-            index = self.tree.index(selected[0])
-            contact = self.agenda[index]
-            success, message = export_contact_to_pdf(contact)
-            if success:
-                messagebox.showinfo("Éxito", message)
-            else:
-                messagebox.showerror("Error", message)
+            contact = self.agenda.get(selected[0])
+            self.start_export("export_individual_to_pdf", f"Contacto: {contact.name}", [contact])
                 
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo exportar el contacto: {str(e)}")
@@ -827,9 +1491,18 @@ class AgendaApp:
 def main():
     """Inicia la aplicación."""
     print("Arrancando app...")
+    try:
+        # Ordenar la tabla según el idioma del sistema
+        locale.setlocale(locale.LC_COLLATE, "")
+    except locale.Error:
+        pass
+    preload_modules(VAULT_MODULES)
     root = tk.Tk()
     app = AgendaApp(root)
     root.mainloop()
 
 if __name__ == "__main__":
+    # Necesario para el proceso de exportación en ejecutables congelados
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -7,6 +7,8 @@ import webbrowser
 import tkinter as tk
 from tkinter import messagebox
 
+from contacts import normalize_phone
+
 def send_email(contact):
     """
     Envía un correo electrónico al contacto seleccionado.
@@ -49,7 +51,7 @@ def send_whatsapp(contact):
             return False, "Este contacto no tiene número de teléfono registrado."
         
         # Limpiar número de teléfono (quitar caracteres no numéricos)
-        phone = ''.join(filter(str.isdigit, contact["phone"]))
+        phone = normalize_phone(contact["phone"])
         
         # Verificar que tenga al menos 10 dígitos
         if len(phone) < 10:
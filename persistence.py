@@ -0,0 +1,136 @@
+"""
+Persistencia en segundo plano para la aplicación Agenda
+Un hilo dedicado encripta y escribe los cambios para que la interfaz no se
+congele durante el guardado
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from storage import StorageBackend
+
+# Tiempo que se espera a que lleguen más cambios antes de escribir
+SAVE_DELAY = 0.3
+
+_STOP = object()
+
+class PersistenceWorker:
+    """
+    Hilo que recibe pedidos de guardado desde la interfaz y los escribe en disco.
+
+    Los pedidos que llegan en ráfaga se juntan en una sola escritura: los
+    cambios consecutivos se aplican como un lote, y una instantánea completa
+    reemplaza a los cambios e instantáneas que la preceden (ya están
+    incluidos). Los resultados se dejan en una cola que la interfaz consulta
+    desde el hilo de Tk; cada uno es una tupla (éxito, mensaje, hay_que_compactar).
+    """
+
+    def __init__(self, storage: StorageBackend, delay: float = SAVE_DELAY):
+        self.storage = storage
+        self.delay = delay
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._failed = False
+        self._thread = threading.Thread(target=self._run, name="persistencia", daemon=True)
+        self._thread.start()
+
+    def submit_changes(self, changes: List[Dict]) -> None:
+        """Encola cambios ({"op": "put"/"delete", ...}) que deben escribirse juntos."""
+        self._requests.put(("change", list(changes)))
+
+    def submit_snapshot(self, agenda: List[Dict]) -> None:
+        """Encola una instantánea completa (la lista ya debe ser una copia)."""
+        self._requests.put(("snapshot", agenda))
+
+    def submit_keyslot(self, keyslot: Dict) -> None:
+        """Encola una ranura de clave nueva (cambio de contraseña)."""
+        self._requests.put(("keyslot", keyslot))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que se escriba todo lo encolado hasta ahora.
+
+        Devuelve False si alguna escritura falló desde el último flush.
+        """
+        done = threading.Event()
+        self._requests.put(("flush", done))
+        done.wait(timeout)
+        failed, self._failed = self._failed, False
+        return done.is_set() and not failed
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """Escribe lo pendiente y termina el hilo."""
+        ok = self.flush(timeout)
+        self._requests.put(_STOP)
+        self._thread.join(timeout)
+        return ok
+
+    def results(self) -> List[Tuple[bool, str, bool]]:
+        """Devuelve los resultados disponibles sin bloquear."""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def _run(self) -> None:
+        while True:
+            request = self._requests.get()
+            if request is _STOP:
+                return
+            batch = [request]
+            # Juntar la ráfaga, salvo que alguien esté esperando un flush
+            deadline = time.monotonic() + self.delay
+            while batch[-1][0] != "flush":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is _STOP:
+                    self._write(batch)
+                    return
+                batch.append(request)
+            self._write(batch)
+
+    @staticmethod
+    def _coalesce(batch: List[Tuple]) -> List[Tuple]:
+        """Reduce la ráfaga a la menor cantidad de escrituras equivalentes."""
+        operations = []
+        for kind, data in batch:
+            if kind == "flush":
+                continue
+            if kind == "snapshot":
+                # La instantánea ya incluye los cambios anteriores (no los cambios de clave)
+                while operations and operations[-1][0] in ("change", "snapshot"):
+                    operations.pop()
+                operations.append((kind, data))
+            elif kind == "change" and operations and operations[-1][0] == "change":
+                operations[-1][1].extend(data)
+            else:
+                operations.append((kind, list(data) if kind == "change" else data))
+        return operations
+
+    def _write(self, batch: List[Tuple]) -> None:
+        waiters = [data for kind, data in batch if kind == "flush"]
+        operations = self._coalesce(batch)
+        try:
+            for kind, data in operations:
+                if kind == "snapshot":
+                    self.storage.replace_all(data)
+                elif kind == "change":
+                    self.storage.apply(data)
+                elif kind == "keyslot":
+                    self.storage.write_keyslot(data)
+            if operations:
+                self._results.put((True, "Cambios guardados", self.storage.needs_compaction()))
+        except Exception as e:
+            self._failed = True
+            self._results.put((False, f"No se pudo guardar el archivo: {e}", False))
+        for event in waiters:
+            event.set()
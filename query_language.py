@@ -0,0 +1,357 @@
+"""
+Lenguaje de consultas para la aplicación Agenda
+Una consulta como `email:@gmail.com phone:2966 birthday:03/* -address:""` se
+convierte en un árbol de condiciones. El planificador manda la condición más
+selectiva a un índice (trigramas, teléfonos/correos o cumpleaños) y evalúa
+el resto solo sobre los candidatos que devuelve
+
+Sintaxis:
+    texto               contiene "texto" en nombre, teléfono, correo o dirección
+    campo:texto         contiene "texto" en ese campo
+    campo:=texto        igual a "texto" (teléfono: mismo número; correo:
+                        misma dirección, o mismo dominio si empieza con @)
+    campo:pa*ron        patrón con * y ? sobre todo el campo
+    campo:""            campo vacío
+    "con espacios"      las comillas agrupan un texto
+    -condición          negación
+    a b                 ambas condiciones
+    a OR b              alguna de las dos
+    ( ... )             agrupa
+"""
+
+import re
+import time
+from fnmatch import fnmatchcase
+from typing import Callable, List, Optional, Tuple
+
+from birthdays import birthday_key
+from contacts import Contact
+from lookup_index import lookup_matches
+from search_index import SEARCH_FIELDS, normalize_text
+
+# Nombres de campo aceptados (en inglés o en castellano) -> atributo del contacto
+FIELD_ALIASES = {
+    "name": "name", "nombre": "name",
+    "phone": "phone", "telefono": "phone", "teléfono": "phone",
+    "email": "email", "correo": "email",
+    "address": "address", "direccion": "address", "dirección": "address",
+    "birthday": "birthday", "cumpleaños": "birthday", "cumpleanos": "birthday",
+}
+
+_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<open>\()
+  | (?P<close>\))
+  | (?P<negation>-)(?=[^\s)])
+  | (?:(?P<field>[^\W\d_]+):(?P<exact>=)?)?
+    (?:"(?P<quoted>[^"]*)"|(?P<word>[^\s()"]+))
+''', re.VERBOSE)
+
+class QuerySyntaxError(ValueError):
+    """Consulta mal escrita."""
+
+class Condition:
+    """
+    Condición sobre un campo (o sobre todos los de búsqueda si `field` es None).
+
+    `op` es "contains", "exact", "glob" o "empty". `value` ya está
+    normalizado, salvo en "exact" de teléfono y correo, que se comparan con
+    la normalización de LookupIndex.
+    """
+
+    def __init__(self, field: Optional[str], op: str, value: str):
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def lookup_kind(self) -> str:
+        """Búsqueda de LookupIndex equivalente a un "exact" de teléfono o correo."""
+        if self.field == "phone":
+            return "phone"
+        return "domain" if self.value.startswith("@") else "email"
+
+    def _values(self, contact: Contact) -> List[str]:
+        fields = SEARCH_FIELDS if self.field is None else (self.field,)
+        return [getattr(contact, field) for field in fields]
+
+    def matches(self, contact: Contact) -> bool:
+        if self.op == "empty":
+            return not any(value.strip() for value in self._values(contact))
+        if self.op == "exact" and self.field in ("phone", "email"):
+            return lookup_matches(self.lookup_kind(), contact, self.value)
+        for value in self._values(contact):
+            value = normalize_text(value)
+            if self.op == "contains" and self.value in value:
+                return True
+            if self.op == "exact" and self.value == value.strip():
+                return True
+            if self.op == "glob" and fnmatchcase(value.strip(), self.value):
+                return True
+        return False
+
+    def __str__(self) -> str:
+        field = self.field or "todo"
+        if self.op == "empty":
+            return f'{field} vacío'
+        symbols = {"contains": "contiene", "exact": "=", "glob": "como"}
+        return f'{field} {symbols[self.op]} "{self.value}"'
+
+class Not:
+    def __init__(self, child):
+        self.child = child
+
+    def matches(self, contact: Contact) -> bool:
+        return not self.child.matches(contact)
+
+    def __str__(self) -> str:
+        return f"NO ({self.child})"
+
+class And:
+    def __init__(self, children: List):
+        self.children = children
+
+    def matches(self, contact: Contact) -> bool:
+        return all(child.matches(contact) for child in self.children)
+
+    def __str__(self) -> str:
+        return " Y ".join(f"({child})" for child in self.children)
+
+class Or:
+    def __init__(self, children: List):
+        self.children = children
+
+    def matches(self, contact: Contact) -> bool:
+        return any(child.matches(contact) for child in self.children)
+
+    def __str__(self) -> str:
+        return " O ".join(f"({child})" for child in self.children)
+
+def _tokenize(text: str) -> List[Tuple]:
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            raise QuerySyntaxError(f"Comillas sin cerrar en la posición {position + 1}.")
+        position = match.end()
+        if match.group("space"):
+            continue
+        if match.group("open") or match.group("close"):
+            tokens.append((match.group(0),))
+        elif match.group("negation"):
+            tokens.append(("-",))
+        elif match.group("word") == "OR" and not match.group("field"):
+            tokens.append(("OR",))
+        else:
+            tokens.append(("term", match))
+    return tokens
+
+def _condition(match) -> Condition:
+    field = match.group("field")
+    quoted = match.group("quoted")
+    value = quoted if quoted is not None else match.group("word")
+    if field is not None and field.casefold() not in FIELD_ALIASES:
+        # "http://..." o "a:b" no son campos: se busca el texto tal cual
+        if quoted is not None:
+            raise QuerySyntaxError(f"Campo desconocido: {field}")
+        value = match.group(0)
+        field = None
+    elif field is not None:
+        field = FIELD_ALIASES[field.casefold()]
+    if value == "" and quoted is not None:
+        if field is None:
+            raise QuerySyntaxError('"" solo se puede usar con un campo, por ejemplo address:""')
+        return Condition(field, "empty", "")
+    if match.group("exact"):
+        # Teléfono y correo se comparan con su propia normalización
+        if field in ("phone", "email"):
+            return Condition(field, "exact", value.strip())
+        return Condition(field, "exact", normalize_text(value.strip()))
+    value = normalize_text(value.strip())
+    if "*" in value or "?" in value:
+        return Condition(field, "glob", value)
+    return Condition(field, "contains", value)
+
+class _Parser:
+    """Descenso recursivo: OR tiene menor precedencia que la conjunción."""
+
+    def __init__(self, tokens: List[Tuple]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError("Paréntesis de cierre sin abrir.")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.position += 1
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = []
+        while self.peek() not in (None, ")", "OR"):
+            children.append(self.parse_unary())
+        if not children:
+            raise QuerySyntaxError("Falta una condición.")
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_unary(self):
+        kind = self.peek()
+        if kind == "-":
+            self.position += 1
+            return Not(self.parse_unary())
+        if kind == "(":
+            self.position += 1
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise QuerySyntaxError("Falta cerrar un paréntesis.")
+            self.position += 1
+            return node
+        token = self.tokens[self.position]
+        self.position += 1
+        return _condition(token[1])
+
+def parse_query(text: str):
+    """Convierte el texto de una consulta en un árbol de condiciones."""
+    tokens = _tokenize(text)
+    if not tokens:
+        raise QuerySyntaxError("La consulta está vacía.")
+    return _Parser(tokens).parse()
+
+def _glob_literal(pattern: str) -> str:
+    """El tramo sin comodines más largo: todo valor que cumple el patrón lo contiene."""
+    pattern = re.sub(r"\[[^\]]*\]", "*", pattern)
+    return max(re.split(r"[*?]", pattern), key=len)
+
+def _birthday_parts(condition: Condition) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """
+    Día y mes (None = cualquiera) que tiene que tener una fecha válida para
+    cumplir la condición, o None si no se pueden deducir.
+    """
+    if condition.op == "exact":
+        key = birthday_key(condition.value)
+        if key is None:
+            return None
+        day, month, _year = (int(part) for part in condition.value.split("/"))
+        return day, month
+    if condition.op != "glob" or "[" in condition.value:
+        return None
+    parts = condition.value.split("/")
+    # Una fecha válida tiene exactamente dos barras: con tres partes cada
+    # una corresponde a día, mes y año; con dos, solo el día queda fijo
+    if len(parts) == 3:
+        day, month = parts[0], parts[1]
+    elif len(parts) == 2 and parts[0].isdigit():
+        day, month = parts[0], "*"
+    else:
+        return None
+    return (int(day) if day.isdigit() else None,
+            int(month) if month.isdigit() else None)
+
+class QueryPlan:
+    """Cómo se resolvió una consulta: índice usado, candidatos y tiempo."""
+
+    def __init__(self, access: str, estimate: int, candidates: int = 0,
+                 matched: int = 0, elapsed: float = 0.0):
+        self.access = access
+        self.estimate = estimate
+        self.candidates = candidates
+        self.matched = matched
+        self.elapsed = elapsed
+
+    def describe(self) -> str:
+        return (f"{self.access}: {self.candidates} candidatos, "
+                f"{self.matched} resultados en {self.elapsed * 1000:.1f} ms")
+
+class QueryPlanner:
+    """
+    Resuelve consultas sobre la agenda usando sus índices.
+
+    Cada condición de la conjunción principal que un índice puede responder
+    (positiva, y en un OR todas sus ramas) propone un acceso con una
+    estimación barata de cuántos candidatos daría; se usa el de menor
+    estimación. Los candidatos de un índice son un superconjunto del
+    resultado: el árbol completo se evalúa sobre ellos. Sin ningún acceso por
+    índice se recorre la agenda.
+    """
+
+    def __init__(self, agenda, search_index, lookup_index, birthday_index):
+        self.agenda = agenda
+        self.search_index = search_index
+        self.lookup_index = lookup_index
+        self.birthday_index = birthday_index
+
+    def _access(self, node) -> Optional[Tuple[int, Callable[[], List[str]], str]]:
+        """(estimación, función que trae los candidatos, descripción) o None."""
+        if isinstance(node, Or):
+            accesses = [self._access(child) for child in node.children]
+            if not all(accesses):
+                return None
+            def fetch():
+                ids = {}
+                for _estimate, fetch_child, _description in accesses:
+                    ids.update(dict.fromkeys(fetch_child()))
+                return list(ids)
+            return (sum(access[0] for access in accesses), fetch,
+                    " + ".join(access[2] for access in accesses))
+        if not isinstance(node, Condition):
+            return None
+        if node.field == "birthday":
+            parts = _birthday_parts(node)
+            if parts is None:
+                return None
+            ids = self.birthday_index.matching(*parts) + self.birthday_index.unparsed()
+            return len(ids), lambda: ids, f"índice de cumpleaños ({node})"
+        if node.op == "exact" and node.field in ("phone", "email"):
+            ids = self.lookup_index.lookup(node.lookup_kind(), node.value)
+            return len(ids), lambda: ids, f"índice exacto ({node})"
+        if node.op in ("contains", "exact"):
+            literal = node.value
+        elif node.op == "glob":
+            literal = _glob_literal(node.value)
+        else:
+            return None
+        if not literal:
+            return None
+        return (self.search_index.estimate(literal),
+                lambda: self.search_index.search(literal),
+                f'índice de trigramas ("{literal}")')
+
+    def plan(self, tree) -> Tuple[Optional[Callable[[], List[str]]], QueryPlan]:
+        """Elige el acceso más selectivo para el árbol."""
+        children = tree.children if isinstance(tree, And) else [tree]
+        best = None
+        for child in children:
+            access = self._access(child)
+            if access is not None and (best is None or access[0] < best[0]):
+                best = access
+        if best is None:
+            return None, QueryPlan("recorrido completo", len(self.agenda))
+        estimate, fetch, description = best
+        return fetch, QueryPlan(description, estimate)
+
+    def execute(self, text: str) -> Tuple[List[str], QueryPlan]:
+        """Ids que cumplen la consulta, en el orden de la agenda, y su plan."""
+        start = time.perf_counter()
+        tree = parse_query(text)
+        fetch, plan = self.plan(tree)
+        if fetch is None:
+            plan.candidates = len(self.agenda)
+            result = [contact.id for contact in self.agenda if tree.matches(contact)]
+        else:
+            candidates = fetch()
+            plan.candidates = len(candidates)
+            result = [contact_id for contact_id in candidates
+                      if tree.matches(self.agenda.get(contact_id))]
+            result = self.search_index.agenda_order(result)
+        plan.matched = len(result)
+        plan.elapsed = time.perf_counter() - start
+        return result, plan
@@ -0,0 +1,457 @@
+"""
+Índice de búsqueda para la aplicación Agenda
+Índice invertido de trigramas sobre nombre, teléfono, correo y dirección:
+una búsqueda por subcadena intersecta listas de contactos en lugar de
+recorrer toda la agenda. La búsqueda difusa usa un vocabulario de palabras
+con su propio índice de trigramas para tolerar errores de tipeo
+"""
+
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from contacts import Contact
+
+SEARCH_FIELDS = ("name", "phone", "email", "address")
+# Campos cuyas palabras entran en la búsqueda difusa
+FUZZY_FIELDS = ("name", "address")
+NGRAM = 3
+# Separador entre campos: ningún trigrama de una consulta lo contiene, así
+# que no hay coincidencias que empiecen en un campo y terminen en otro
+_FIELD_SEPARATOR = "\x00"
+# Relleno al final del texto al indexarlo: así cada carácter empieza un
+# trigrama y las consultas de uno o dos caracteres salen de sus prefijos
+_PADDING = _FIELD_SEPARATOR * (NGRAM - 1)
+# Con tan pocos candidatos ya conviene verificarlos directamente (es también
+# el tamaño de la muestra que decide si vale la pena intersectar listas)
+_VERIFY_LIMIT = 64
+# Proporción de entradas obsoletas a partir de la cual se reconstruye el índice
+_COMPACT_RATIO = 0.25
+# Consultas recientes que guarda la búsqueda en vivo
+SEARCH_CACHE_SIZE = 32
+# Palabras de al menos dos letras (sin dígitos)
+_WORD_RE = re.compile(r"[^\W\d_]{2,}")
+_FUZZY_POSITIONS = [SEARCH_FIELDS.index(field) for field in FUZZY_FIELDS]
+
+def normalize_text(text: str) -> str:
+    """Normaliza un texto para buscarlo sin distinguir mayúsculas ni acentos."""
+    text = (text or "").casefold()
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+def trigrams(text: str) -> Set[str]:
+    """Devuelve los trigramas distintos de un texto ya normalizado."""
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+def contact_text(contact: Contact) -> str:
+    """Texto normalizado de los campos en los que se busca."""
+    return _FIELD_SEPARATOR.join(normalize_text(getattr(contact, field)) for field in SEARCH_FIELDS)
+
+def text_words(text: str) -> Set[str]:
+    """Palabras de los campos de la búsqueda difusa, a partir de `contact_text`."""
+    parts = text.split(_FIELD_SEPARATOR)
+    return {word for position in _FUZZY_POSITIONS for word in _WORD_RE.findall(parts[position])}
+
+def max_typos(word: str) -> int:
+    """Errores tolerados según el largo de la palabra buscada."""
+    if len(word) <= 3:
+        return 0
+    return 1 if len(word) <= 6 else 2
+
+def levenshtein(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """
+    Distancia de edición entre dos textos.
+
+    Con `max_distance` corta en cuanto se sabe que la supera y devuelve
+    max_distance + 1.
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    limit = max_distance + 1 if max_distance is not None else None
+    if limit is not None and len(a) - len(b) >= limit:
+        return limit
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if limit is not None and min(current) >= limit:
+            return limit
+        previous = current
+    distance = previous[-1]
+    return distance if limit is None else min(distance, limit)
+
+class TrigramIndex:
+    """
+    Índice invertido trigrama -> contactos.
+
+    Cada contacto tiene un número de documento que respeta el orden de la
+    agenda (una edición conserva el número, igual que ContactStore conserva
+    la posición). Las listas son arrays ordenados de enteros de 32 bits para
+    que el índice de 100k contactos ocupe decenas de MB y no cientos.
+
+    Al editar o borrar no se quitan entradas de las listas: quedan obsoletas
+    y esos documentos ("sucios") se verifican contra el texto actual. Cuando
+    las entradas obsoletas superan _COMPACT_RATIO, el índice se reconstruye.
+    Una consulta que es exactamente un trigrama, o que tiene uno o dos
+    caracteres, sale de una sola lista sin verificar los documentos limpios.
+    Las listas de uno y dos caracteres se arman la primera vez que se piden
+    (uniendo las de los trigramas que empiezan así) y después se mantienen.
+
+    Para la búsqueda difusa se mantiene además palabra -> documentos (esto
+    sí exacto) y un índice de trigramas del vocabulario, que es mucho más
+    chico que la agenda: los errores de tipeo se comparan contra palabras
+    distintas y no contra cada contacto.
+    """
+
+    def __init__(self, contacts: Iterable[Contact] = ()):
+        self._postings: Dict[str, array] = {}
+        self._texts: List[Optional[str]] = []
+        self._ids: List[Optional[str]] = []
+        self._docs: Dict[str, int] = {}
+        self._entries = 0
+        self._stale = 0
+        self._dirty: Set[int] = set()
+        # Prefijo de uno o dos caracteres -> trigramas que empiezan así
+        self._prefixes: Dict[str, List[str]] = {}
+        self._short: Dict[str, array] = {}
+        self._words: Dict[str, Set[int]] = {}
+        self._vocabulary_grams: Dict[str, List[str]] = {}
+        # Cambia con cada modificación: invalida los resultados guardados
+        self.version = 0
+        for contact in contacts:
+            self.add(contact)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, contact: Contact) -> None:
+        """Indexa un contacto nuevo, o reindexa uno existente si ya tiene id."""
+        if contact.id in self._docs:
+            self.update(contact)
+            return
+        self.version += 1
+        doc = len(self._texts)
+        text = contact_text(contact)
+        self._texts.append(text)
+        self._ids.append(contact.id)
+        self._docs[contact.id] = doc
+        self._post(doc, trigrams(text + _PADDING))
+        for gram, posting in self._short.items():
+            if gram in text:
+                posting.append(doc)
+        self._add_words(doc, text_words(text))
+
+    def update(self, contact: Contact) -> None:
+        """Reindexa un contacto editado, conservando su lugar."""
+        doc = self._docs.get(contact.id)
+        if doc is None:
+            self.add(contact)
+            return
+        self.version += 1
+        old_text = self._texts[doc]
+        old = trigrams(old_text + _PADDING)
+        text = contact_text(contact)
+        new = trigrams(text + _PADDING)
+        self._texts[doc] = text
+        old_words, new_words = text_words(old_text), text_words(text)
+        self._remove_words(doc, old_words - new_words)
+        self._add_words(doc, new_words - old_words)
+        if text != old_text:
+            self._dirty.add(doc)
+        self._stale += len(old - new)
+        self._insert(doc, new - old)
+        for gram, posting in self._short.items():
+            if gram in text:
+                _insort(posting, doc)
+        self._maybe_compact()
+
+    def remove(self, contact_id: str) -> None:
+        """Quita un contacto del índice."""
+        doc = self._docs.pop(contact_id, None)
+        if doc is None:
+            return
+        self.version += 1
+        self._stale += len(trigrams(self._texts[doc] + _PADDING))
+        self._remove_words(doc, text_words(self._texts[doc]))
+        self._texts[doc] = None
+        self._ids[doc] = None
+        self._dirty.add(doc)
+        self._maybe_compact()
+
+    def _post(self, doc: int, grams: Set[str]) -> None:
+        # Un documento nuevo tiene el número más alto: las listas siguen ordenadas
+        postings = self._postings
+        for gram in grams:
+            try:
+                postings[gram].append(doc)
+            except KeyError:
+                self._new_posting(gram, doc)
+        self._entries += len(grams)
+
+    def _insert(self, doc: int, grams: Set[str]) -> None:
+        # Un documento editado conserva su número: se inserta en su lugar
+        postings = self._postings
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                self._new_posting(gram, doc)
+            else:
+                _insort(posting, doc)
+        self._entries += len(grams)
+
+    def _new_posting(self, gram: str, doc: int) -> None:
+        self._postings[gram] = array('I', (doc,))
+        for size in range(1, NGRAM):
+            self._prefixes.setdefault(gram[:size], []).append(gram)
+
+    def _add_words(self, doc: int, words: Set[str]) -> None:
+        for word in words:
+            docs = self._words.get(word)
+            if docs is None:
+                docs = self._words[word] = set()
+                for gram in trigrams(f" {word} "):
+                    self._vocabulary_grams.setdefault(gram, []).append(word)
+            docs.add(doc)
+
+    def _remove_words(self, doc: int, words: Set[str]) -> None:
+        # Las palabras que quedan sin contactos siguen en el vocabulario
+        # (sin documentos) hasta la próxima reconstrucción
+        for word in words:
+            self._words[word].discard(doc)
+
+    def _maybe_compact(self) -> None:
+        if self._stale > self._entries * _COMPACT_RATIO:
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        texts = [(contact_id, text) for contact_id, text in zip(self._ids, self._texts)
+                 if text is not None]
+        self._postings = {}
+        self._texts = []
+        self._ids = []
+        self._docs = {}
+        self._entries = 0
+        self._stale = 0
+        self._dirty = set()
+        self._prefixes = {}
+        self._short = {}
+        self._words = {}
+        self._vocabulary_grams = {}
+        for doc, (contact_id, text) in enumerate(texts):
+            self._texts.append(text)
+            self._ids.append(contact_id)
+            self._docs[contact_id] = doc
+            self._post(doc, trigrams(text + _PADDING))
+            self._add_words(doc, text_words(text))
+
+    def search(self, query: str) -> List[str]:
+        """
+        Devuelve, en el orden de la agenda, los ids de los contactos que
+        contienen `query` en alguno de los campos indexados.
+        """
+        query = normalize_text(query.strip())
+        if not query:
+            return [contact_id for contact_id in self._ids if contact_id is not None]
+        if len(query) < NGRAM:
+            return self._exact(self._short_posting(query), query)
+        postings = []
+        for gram in trigrams(query):
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        if len(query) == NGRAM:
+            return self._exact(postings[0], query)
+        postings.sort(key=len)
+        texts = self._texts
+        return [self._ids[doc] for doc in self._candidates(postings, query)
+                if texts[doc] is not None and query in texts[doc]]
+
+    def _exact(self, posting: Sequence[int], query: str) -> List[str]:
+        """Ids de una lista que coincide con la consulta salvo en los documentos sucios."""
+        ids = self._ids
+        if not self._dirty:
+            return list(map(ids.__getitem__, posting))
+        dirty = self._dirty
+        texts = self._texts
+        return [ids[doc] for doc in posting
+                if doc not in dirty or (texts[doc] is not None and query in texts[doc])]
+
+    def _short_posting(self, query: str) -> array:
+        """Lista de una consulta de uno o dos caracteres (se arma una vez)."""
+        posting = self._short.get(query)
+        if posting is None:
+            postings = [self._postings[gram] for gram in self._prefixes.get(query, ())]
+            if sum(map(len, postings)) > len(self._texts):
+                # Unir listas que suman más que la agenda cuesta más que recorrerla
+                docs = [doc for doc, text in enumerate(self._texts)
+                        if text is not None and query in text]
+            else:
+                docs = sorted(set().union(*postings))
+            posting = self._short[query] = array('I', docs)
+        return posting
+
+    def estimate(self, query: str) -> int:
+        """
+        Cota barata de cuántos contactos devolvería search(query): el largo
+        de la lista de trigramas más corta (o toda la agenda si no tiene).
+        """
+        query = normalize_text(query.strip())
+        if not query:
+            return len(self._docs)
+        if len(query) < NGRAM:
+            posting = self._short.get(query)
+            if posting is not None:
+                return len(posting)
+            return min(len(self._docs), sum(len(self._postings[gram])
+                                            for gram in self._prefixes.get(query, ())))
+        return min(len(self._postings.get(gram, ())) for gram in trigrams(query))
+
+    def agenda_order(self, contact_ids: Iterable[str]) -> List[str]:
+        """Ordena ids indexados según la agenda."""
+        return sorted(contact_ids, key=self._docs.__getitem__)
+
+    def order_key(self, contact_id: str) -> int:
+        """Clave de un contacto indexado que respeta el orden de la agenda."""
+        return self._docs[contact_id]
+
+    def _candidates(self, postings: List[array], query: str) -> Sequence[int]:
+        """Documentos a verificar, en orden, a partir de las listas de menor a mayor."""
+        first = postings[0]
+        if len(postings) == 1 or len(first) <= _VERIFY_LIMIT:
+            return first
+        # Si la mayoría de una muestra de la lista más corta ya contiene la
+        # consulta, intersectarla con las demás casi no descarta documentos
+        texts = self._texts
+        sample = first[:_VERIFY_LIMIT]
+        hits = sum(1 for doc in sample if texts[doc] is not None and query in texts[doc])
+        if hits * 2 >= len(sample):
+            return first
+        candidates = set(first)
+        for posting in postings[1:]:
+            # Recorrer una lista mucho más larga que los candidatos cuesta más
+            # que verificar cada candidato contra su texto
+            if len(candidates) <= _VERIFY_LIMIT or len(posting) > 2 * len(candidates):
+                break
+            candidates.intersection_update(posting)
+        return sorted(candidates)
+
+    def fuzzy_search(self, query: str) -> List[str]:
+        """
+        Búsqueda tolerante a errores de tipeo en nombre y dirección.
+
+        Cada palabra de la consulta tiene que parecerse (hasta max_typos
+        errores) a una palabra del contacto o al comienzo de una. Los ids
+        vuelven ordenados por la suma de errores y después por la agenda.
+        """
+        scores: Optional[Dict[int, int]] = None
+        for token in set(_WORD_RE.findall(normalize_text(query))):
+            token_scores: Dict[int, int] = {}
+            for word, distance in self._similar_words(token).items():
+                for doc in self._words[word]:
+                    if distance < token_scores.get(doc, distance + 1):
+                        token_scores[doc] = distance
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc: score + token_scores[doc]
+                          for doc, score in scores.items() if doc in token_scores}
+            if not scores:
+                return []
+        if not scores:
+            return []
+        return [self._ids[doc] for doc in sorted(scores, key=lambda doc: (scores[doc], doc))]
+
+    def _similar_words(self, token: str) -> Dict[str, int]:
+        """Palabras del vocabulario a max_typos o menos de `token` (o de su comienzo)."""
+        max_distance = max_typos(token)
+        grams = trigrams(f" {token} ")
+        # Cada error cambia a lo sumo NGRAM trigramas, y un prefijo no comparte
+        # el trigrama del final: una palabra parecida comparte al menos estos
+        needed = len(grams) - NGRAM * max_distance - 1
+        if needed > 0:
+            counts: Dict[str, int] = {}
+            for gram in grams:
+                for word in self._vocabulary_grams.get(gram, ()):
+                    counts[word] = counts.get(word, 0) + 1
+            candidates = [word for word, count in counts.items() if count >= needed]
+        else:
+            candidates = list(self._words)
+        similar = {}
+        for word in candidates:
+            if not self._words[word]:
+                continue
+            distance = levenshtein(token, word, max_distance)
+            if len(word) > len(token):
+                distance = min(distance, levenshtein(token, word[:len(token)], max_distance))
+            if distance <= max_distance:
+                similar[word] = distance
+        return similar
+
+    def refine(self, contact_ids: List[str], query: str) -> List[str]:
+        """Filtra un resultado anterior, para una consulta que lo extiende."""
+        query = normalize_text(query.strip())
+        texts = self._texts
+        docs = self._docs
+        return [contact_id for contact_id in contact_ids
+                if contact_id in docs and query in texts[docs[contact_id]]]
+
+def _insort(posting: array, doc: int) -> None:
+    """Inserta `doc` en una lista ordenada si todavía no está."""
+    position = bisect_left(posting, doc)
+    if position == len(posting) or posting[position] != doc:
+        posting.insert(position, doc)
+
+class IncrementalSearch:
+    """
+    Búsqueda mientras se escribe.
+
+    Si la consulta nueva contiene a la anterior (se siguió escribiendo), todo
+    resultado nuevo ya estaba en el anterior: se filtra ese resultado en
+    lugar de volver al índice. Las últimas SEARCH_CACHE_SIZE consultas se
+    guardan (LRU) para que borrar caracteres sea inmediato; cualquier cambio
+    en el índice las descarta. En modo "fuzzy" no se filtra el resultado
+    anterior: agregar letras puede sumar coincidencias.
+    """
+
+    def __init__(self, index: TrigramIndex, cache_size: int = SEARCH_CACHE_SIZE):
+        self.index = index
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, List[str]]" = OrderedDict()
+        self._version = index.version
+        self._last_query = ""
+        self._last_result: Optional[List[str]] = None
+
+    def search(self, query: str, mode: str = "contains") -> List[str]:
+        """Busca en modo "contains" (subcadena) o "fuzzy" (difusa)."""
+        query = normalize_text(query.strip())
+        if self.index.version != self._version:
+            self._cache.clear()
+            self._last_result = None
+            self._version = self.index.version
+        key = (mode, query)
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+        elif mode == "fuzzy":
+            result = self.index.fuzzy_search(query)
+        elif self._last_result is not None and self._last_query and self._last_query in query:
+            result = self.index.refine(self._last_result, query)
+        else:
+            result = self.index.search(query)
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        if mode == "contains":
+            self._last_query = query
+            self._last_result = result
+        return result
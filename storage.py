@@ -0,0 +1,480 @@
+"""
+Motores de almacenamiento para la aplicación Agenda
+Define la interfaz común de persistencia y dos implementaciones: el archivo
+encriptado de siempre (instantánea + diario) y una base SQLite con cada
+contacto encriptado por separado
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import Executor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from contacts import new_contact_id, normalize_phone
+from journal import ChangeJournal, JOURNAL_SUFFIX, apply_change
+from vault_format import VaultReader, read_keyslot, write_keyslot, write_vault
+
+Progress = Optional[Callable[[int, int], None]]
+
+def normalize_field(field: str, value: str) -> str:
+    """Normaliza un valor para compararlo por igualdad exacta."""
+    if field == "phone":
+        return normalize_phone(value)
+    return (value or "").strip().casefold()
+
+class StorageBackend:
+    """
+    Interfaz común de los motores de almacenamiento.
+
+    Los contactos son diccionarios con un campo "id" estable. Los cambios que
+    recibe `apply` tienen el mismo formato que los registros del diario:
+    {"op": "put", "contact": {...}} o {"op": "delete", "id": ...}.
+    Las implementaciones por defecto de get/query recorren todo; los motores
+    que tengan índices las reemplazan.
+
+    Cada motor guarda además la ranura de clave: la clave de datos envuelta
+    por la clave derivada de la contraseña (ver vault_session).
+    """
+
+    # Queda en True si después de cargar conviene reescribir todo
+    # (formato viejo, contactos sin id...)
+    needs_rewrite = False
+
+    def exists(self) -> bool:
+        raise NotImplementedError
+
+    def set_key(self, key: bytes) -> None:
+        """Recibe la clave Fernet de la sesión (falla si no corresponde)."""
+        raise NotImplementedError
+
+    def clear_key(self) -> None:
+        """Olvida la clave de la sesión (al bloquear o salir): sin clave no se lee ni se escribe."""
+        self._key = None
+        self._fernet = None
+
+    def _session_fernet(self) -> Fernet:
+        if self._fernet is None:
+            raise ValueError("Agenda bloqueada: no hay clave de sesión.")
+        return self._fernet
+
+    def read_keyslot(self) -> Optional[Dict]:
+        """Devuelve la ranura de clave guardada, o None si todavía no hay."""
+        raise NotImplementedError
+
+    def write_keyslot(self, keyslot: Dict) -> None:
+        """Guarda una ranura de clave nueva sin tocar los contactos."""
+        raise NotImplementedError
+
+    def iterate(self, progress: Progress = None) -> Iterator[Dict]:
+        raise NotImplementedError
+
+    def load(self, progress: Progress = None) -> List[Dict]:
+        return list(self.iterate(progress))
+
+    def get(self, contact_id: str) -> Optional[Dict]:
+        for contact in self.iterate():
+            if contact["id"] == contact_id:
+                return contact
+        return None
+
+    def query(self, field: str, value: str) -> List[Dict]:
+        """Devuelve los contactos cuyo campo coincide (normalizado) con `value`."""
+        wanted = normalize_field(field, value)
+        return [contact for contact in self.iterate()
+                if normalize_field(field, contact.get(field, "")) == wanted]
+
+    def put(self, contact: Dict) -> None:
+        self.apply([{"op": "put", "contact": contact}])
+
+    def delete(self, contact_id: str) -> None:
+        self.apply([{"op": "delete", "id": contact_id}])
+
+    def apply(self, changes: List[Dict]) -> None:
+        """Aplica un lote de cambios como una sola escritura."""
+        raise NotImplementedError
+
+    def replace_all(self, contacts: List[Dict], keyslot: Optional[Dict] = None) -> None:
+        """
+        Reemplaza todo el contenido por `contacts`.
+
+        Si se pasa `keyslot`, se guarda en la misma escritura que los contactos.
+        """
+        raise NotImplementedError
+
+    def rekey(self, key: bytes, keyslot: Optional[Dict] = None) -> None:
+        """Vuelve a encriptar todo con otra clave (y su ranura, si se pasa)."""
+        contacts = self.load()
+        old_key = self._key
+        self.set_key(key)
+        try:
+            self.replace_all(contacts, keyslot)
+        except Exception:
+            self.set_key(old_key)
+            raise
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        pass
+
+class FileBackend(StorageBackend):
+    """Archivo encriptado segmentado más el diario de cambios."""
+
+    def __init__(self, path: str, executor: Optional[Executor] = None):
+        self.path = path
+        self.executor = executor
+        self.journal = ChangeJournal(path + JOURNAL_SUFFIX)
+        self.snapshot_id = ""
+        self._key: Optional[bytes] = None
+        self._fernet: Optional[Fernet] = None
+        self._keyslot: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def set_key(self, key: bytes) -> None:
+        self._key = key
+        self._fernet = Fernet(key)
+
+    def read_keyslot(self) -> Optional[Dict]:
+        with self._lock:
+            if self.exists():
+                self._keyslot = read_keyslot(self.path)
+            return self._keyslot
+
+    def write_keyslot(self, keyslot: Dict) -> None:
+        with self._lock:
+            if self.exists():
+                self._keyslot = write_keyslot(self.path, keyslot)
+            else:
+                # Agenda nueva: la ranura se escribe con la primera instantánea
+                self._keyslot = keyslot
+
+    def iterate(self, progress: Progress = None) -> Iterator[Dict]:
+        """
+        Recorre la instantánea aplicando al vuelo los cambios del diario.
+
+        Las altas y ediciones del diario reemplazan al contacto en su lugar
+        y las bajas lo saltean, así que no hace falta tener toda la agenda
+        en memoria para reaplicar el diario.
+        """
+        fernet = self._session_fernet()
+        if not self.exists():
+            return
+        with self._lock:
+            reader = VaultReader(self.path, fernet)
+            records = self.journal.read_records(fernet, reader.snapshot_id)
+            self.snapshot_id = reader.snapshot_id
+        self.needs_rewrite = reader.is_legacy
+        puts: Dict[str, Dict] = {}
+        deleted = set()
+        for record in records:
+            if record["op"] == "put":
+                contact = record["contact"]
+                puts[contact["id"]] = contact
+                deleted.discard(contact["id"])
+            else:
+                puts.pop(record["id"], None)
+                deleted.add(record["id"])
+        for contact in reader.iter_contacts(self.executor, progress=progress):
+            if "id" not in contact:
+                contact["id"] = new_contact_id()
+                self.needs_rewrite = True
+            if contact["id"] in deleted:
+                continue
+            yield puts.pop(contact["id"], contact)
+        yield from puts.values()
+
+    def apply(self, changes: List[Dict]) -> None:
+        fernet = self._session_fernet()
+        with self._lock:
+            if not self.exists():
+                # La primera escritura crea la instantánea inicial
+                contacts = []
+                for change in changes:
+                    apply_change(contacts, change)
+                self._write_snapshot(contacts)
+                return
+            self.journal.append_many(fernet, self.snapshot_id, changes)
+
+    def replace_all(self, contacts: List[Dict], keyslot: Optional[Dict] = None) -> None:
+        with self._lock:
+            self._write_snapshot(contacts, keyslot)
+
+    def _write_snapshot(self, contacts: List[Dict], keyslot: Optional[Dict] = None) -> None:
+        keyslot = keyslot or self._keyslot
+        self.snapshot_id = write_vault(self.path, self._session_fernet(), contacts, self.executor,
+                                       keyslot=keyslot)
+        self._keyslot = keyslot
+        self.journal.reset()
+
+    def needs_compaction(self) -> bool:
+        return self.journal.needs_compaction()
+
+# Valor conocido encriptado en la base para comprobar la contraseña al abrirla
+_KEY_CHECK = b"contactvault"
+# Lote de filas que se desencriptan juntas al recorrer la base
+_SQLITE_BATCH = 256
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL UNIQUE,
+    payload BLOB NOT NULL,
+    name_mac BLOB,
+    phone_mac BLOB,
+    email_mac BLOB
+);
+CREATE INDEX IF NOT EXISTS contacts_name_mac ON contacts (name_mac);
+CREATE INDEX IF NOT EXISTS contacts_phone_mac ON contacts (phone_mac);
+CREATE INDEX IF NOT EXISTS contacts_email_mac ON contacts (email_mac);
+"""
+
+class SQLiteBackend(StorageBackend):
+    """
+    Base SQLite con una fila encriptada por contacto.
+
+    Cada fila guarda el contacto encriptado con Fernet y, para nombre,
+    teléfono y correo, un HMAC del valor normalizado. Así `get`, `query`
+    sobre esos campos y los cambios de un solo contacto tocan únicamente
+    las filas involucradas, sin exponer los datos en claro.
+    """
+
+    INDEXED_FIELDS = ("name", "phone", "email")
+
+    def __init__(self, path: str, executor: Optional[Executor] = None):
+        self.path = path
+        self.executor = executor
+        self._key: Optional[bytes] = None
+        self._fernet: Optional[Fernet] = None
+        self._mac_key = b""
+        self._check_pending = False
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        """La base existe si ya tiene clave guardada (no alcanza con el archivo)."""
+        if not os.path.exists(self.path):
+            return False
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM meta LIMIT 1").fetchone() is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(_SQLITE_SCHEMA)
+        return self._conn
+
+    def set_key(self, key: bytes) -> None:
+        fernet = Fernet(key)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM meta WHERE key = 'check'").fetchone()
+            if row is not None:
+                try:
+                    fernet.decrypt(row[0])
+                except InvalidToken:
+                    raise ValueError("Contraseña incorrecta.")
+        # Base nueva: la comprobación se guarda con la primera escritura
+        self._check_pending = row is None
+        self._key = key
+        self._fernet = fernet
+        self._mac_key = self._derive_mac_key(key)
+
+    def clear_key(self) -> None:
+        super().clear_key()
+        self._mac_key = b""
+
+    def _write_meta(self, conn: sqlite3.Connection, keyslot: Optional[Dict] = None) -> None:
+        """Escribe, dentro de la transacción en curso, la comprobación y la ranura."""
+        if self._check_pending:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('check', ?)",
+                         (self._session_fernet().encrypt(_KEY_CHECK),))
+            self._check_pending = False
+        if keyslot is not None:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('keyslot', ?)",
+                         (json.dumps(keyslot),))
+
+    def read_keyslot(self) -> Optional[Dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = 'keyslot'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_keyslot(self, keyslot: Dict) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._write_meta(conn, keyslot)
+
+    @staticmethod
+    def _derive_mac_key(key: bytes) -> bytes:
+        return hmac.new(base64.urlsafe_b64decode(key), b"contactvault-index", hashlib.sha256).digest()
+
+    def _mac(self, field: str, value: str, mac_key: Optional[bytes] = None) -> Optional[bytes]:
+        normalized = normalize_field(field, value)
+        if not normalized:
+            return None
+        message = field.encode('utf-8') + b"\0" + normalized.encode('utf-8')
+        return hmac.new(mac_key or self._mac_key, message, hashlib.sha256).digest()
+
+    def _encode(self, contact: Dict, fernet: Optional[Fernet] = None,
+                mac_key: Optional[bytes] = None) -> tuple:
+        data = json.dumps(contact, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        payload = (fernet or self._session_fernet()).encrypt(data)
+        macs = tuple(self._mac(field, contact.get(field, ""), mac_key) for field in self.INDEXED_FIELDS)
+        return (contact["id"], payload) + macs
+
+    def _decode(self, payload: bytes) -> Dict:
+        contact = json.loads(self._session_fernet().decrypt(payload))
+        contact.setdefault("birthday", "")
+        return contact
+
+    def _decode_many(self, payloads: List[bytes]) -> List[Dict]:
+        if self.executor:
+            return list(self.executor.map(self._decode, payloads))
+        return [self._decode(payload) for payload in payloads]
+
+    def iterate(self, progress: Progress = None) -> Iterator[Dict]:
+        """Recorre los contactos en orden, desencriptando de a lotes."""
+        self._session_fernet()
+        with self._lock:
+            (total,) = self._connect().execute("SELECT COUNT(*) FROM contacts").fetchone()
+        loaded = 0
+        position = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT position, payload FROM contacts WHERE position > ? ORDER BY position LIMIT ?",
+                    (position, _SQLITE_BATCH)).fetchall()
+            if not rows:
+                return
+            position = rows[-1][0]
+            contacts = self._decode_many([payload for _position, payload in rows])
+            loaded += len(contacts)
+            if progress:
+                progress(loaded, total)
+            yield from contacts
+
+    def get(self, contact_id: str) -> Optional[Dict]:
+        self._session_fernet()
+        with self._lock:
+            row = self._connect().execute("SELECT payload FROM contacts WHERE id = ?",
+                                          (contact_id,)).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def query(self, field: str, value: str) -> List[Dict]:
+        if field not in self.INDEXED_FIELDS:
+            return super().query(field, value)
+        self._session_fernet()
+        mac = self._mac(field, value)
+        if mac is None:
+            return super().query(field, value)
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT payload FROM contacts WHERE {field}_mac = ? ORDER BY position",
+                (mac,)).fetchall()
+        return self._decode_many([payload for (payload,) in rows])
+
+    def apply(self, changes: List[Dict]) -> None:
+        self._session_fernet()
+        encoded = [self._encode(change["contact"]) if change["op"] == "put" else None
+                   for change in changes]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._write_meta(conn)
+                for change, row in zip(changes, encoded):
+                    if row is not None:
+                        conn.execute(
+                            "INSERT INTO contacts (id, position, payload, name_mac, phone_mac, email_mac) "
+                            "VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM contacts), ?, ?, ?, ?) "
+                            "ON CONFLICT(id) DO UPDATE SET payload = excluded.payload, "
+                            "name_mac = excluded.name_mac, phone_mac = excluded.phone_mac, "
+                            "email_mac = excluded.email_mac",
+                            row)
+                    else:
+                        conn.execute("DELETE FROM contacts WHERE id = ?", (change["id"],))
+
+    def replace_all(self, contacts: List[Dict], keyslot: Optional[Dict] = None) -> None:
+        self._session_fernet()
+        if self.executor:
+            rows = list(self.executor.map(self._encode, contacts))
+        else:
+            rows = [self._encode(contact) for contact in contacts]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._write_meta(conn, keyslot)
+                conn.execute("DELETE FROM contacts")
+                conn.executemany(
+                    "INSERT INTO contacts (id, position, payload, name_mac, phone_mac, email_mac) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ((row[0], position) + row[1:] for position, row in enumerate(rows, 1)))
+
+    def rekey(self, key: bytes, keyslot: Optional[Dict] = None) -> None:
+        """Reencripta todas las filas y recalcula los HMAC en una transacción."""
+        fernet = Fernet(key)
+        mac_key = self._derive_mac_key(key)
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute("SELECT payload FROM contacts").fetchall()
+            updated = [self._encode(self._decode(payload), fernet, mac_key) for (payload,) in rows]
+            with conn:
+                conn.executemany(
+                    "UPDATE contacts SET payload = ?, name_mac = ?, phone_mac = ?, email_mac = ? WHERE id = ?",
+                    (row[1:] + (row[0],) for row in updated))
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('check', ?)",
+                             (fernet.encrypt(_KEY_CHECK),))
+                if keyslot is not None:
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('keyslot', ?)",
+                                 (json.dumps(keyslot),))
+        self._check_pending = False
+        self._key = key
+        self._fernet = fernet
+        self._mac_key = mac_key
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Motores disponibles, por nombre
+STORAGE_ENGINES = {
+    "file": FileBackend,
+    "sqlite": SQLiteBackend,
+}
+
+def create_backend(engine: str, path: str, executor: Optional[Executor] = None) -> StorageBackend:
+    """Crea el motor de almacenamiento `engine` sobre `path`."""
+    if engine not in STORAGE_ENGINES:
+        raise ValueError(f"Motor de almacenamiento desconocido: {engine}")
+    return STORAGE_ENGINES[engine](path, executor)
+
+def migrate(source: StorageBackend, target: StorageBackend, key: bytes) -> int:
+    """
+    Copia todos los contactos de `source` a `target` y devuelve cuántos copió.
+
+    `key` es la clave de datos ya abierta en `source`; la ranura de clave se
+    copia tal cual, así la contraseña sigue siendo la misma. Primero se lee
+    el origen, así una contraseña equivocada falla antes de crear nada en el
+    destino.
+    """
+    source.set_key(key)
+    contacts = source.load()
+    target.set_key(key)
+    target.replace_all(contacts, source.read_keyslot())
+    return len(contacts)
@@ -0,0 +1,170 @@
+"""
+Ordenamiento de la tabla de contactos para la aplicación Agenda
+Las claves de comparación (según el idioma del sistema) se calculan una sola
+vez por contacto y columna, y el orden de cada columna queda guardado: volver
+a hacer clic solo invierte la lista guardada
+"""
+
+import locale
+from bisect import bisect_right, insort
+from math import log2
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from contacts import Contact, normalize_phone
+from search_index import normalize_text
+
+# Columnas que se pueden ordenar (en el orden de la tabla)
+SORT_FIELDS = ("name", "phone", "email", "address", "birthday")
+# Columnas de texto, donde tiene sentido saltar a una letra
+LETTER_FIELDS = ("name", "email", "address")
+# Inicial de los valores que no empiezan con letra (van antes de la "a")
+OTHER_INITIAL = "#"
+
+def collation_key(field: str, value: str) -> tuple:
+    """
+    Clave de orden de un valor: los vacíos (y las fechas ilegibles) van al
+    final, los cumpleaños se comparan como fecha y los teléfonos por sus
+    dígitos.
+    """
+    value = (value or "").strip()
+    if field == "birthday":
+        try:
+            day, month, year = (int(part) for part in value.split("/"))
+        except ValueError:
+            return (1,)
+        return (0, year, month, day)
+    if field == "phone":
+        digits = normalize_phone(value)
+        return (0, digits) if digits else (1,)
+    if not value:
+        return (1,)
+    # Sin acentos antes de strxfrm: con el locale "C" las vocales acentuadas
+    # quedarían después de la z
+    return (0, locale.strxfrm(normalize_text(value)))
+
+class SortCache:
+    """
+    Claves y órdenes guardados por columna.
+
+    Las claves de una columna se calculan la primera vez que se ordena por
+    ella. Al editar un contacto solo se descarta el orden de las columnas
+    cuyo valor cambió; un alta se inserta en los órdenes guardados con
+    búsqueda binaria y una baja se quita de ellos, sin volver a ordenar.
+    """
+
+    def __init__(self, contacts: Iterable[Contact]):
+        self._contacts = contacts
+        self._keys: Dict[str, Dict[str, tuple]] = {}
+        self._orders: Dict[str, List[str]] = {}
+        self._reversed: Dict[str, List[str]] = {}
+
+    def _column_keys(self, field: str) -> Dict[str, tuple]:
+        keys = self._keys.get(field)
+        if keys is None:
+            keys = self._keys[field] = {contact.id: collation_key(field, getattr(contact, field))
+                                        for contact in self._contacts}
+        return keys
+
+    def order(self, field: str, descending: bool = False) -> List[str]:
+        """Ids de toda la agenda ordenados por `field` (a igual clave, en el orden de la agenda)."""
+        ascending = self._orders.get(field)
+        if ascending is None:
+            keys = self._column_keys(field)
+            ascending = self._orders[field] = sorted(keys, key=keys.__getitem__)
+            self._reversed.pop(field, None)
+        if not descending:
+            return ascending
+        descending_order = self._reversed.get(field)
+        if descending_order is None:
+            descending_order = self._reversed[field] = ascending[::-1]
+        return descending_order
+
+    def sort(self, contact_ids: List[str], field: str, descending: bool = False) -> List[str]:
+        """
+        Ordena un subconjunto (por ejemplo, el resultado de una búsqueda).
+
+        Si es chico conviene ordenarlo directamente con las claves guardadas;
+        si no, se filtra el orden completo de la columna.
+        """
+        keys = self._column_keys(field)
+        if len(contact_ids) * log2(len(contact_ids) + 2) >= len(keys):
+            wanted = set(contact_ids)
+            return [contact_id for contact_id in self.order(field, descending) if contact_id in wanted]
+        result = sorted(contact_ids, key=keys.__getitem__)
+        if descending:
+            # Invertir conserva el mismo orden que el de la columna completa
+            result.reverse()
+        return result
+
+    def insert_position(self, contact_ids: List[str], contact_id: str, field: str,
+                        descending: bool = False) -> int:
+        """Dónde va `contact_id` dentro de `contact_ids`, ya ordenados por `field`."""
+        keys = self._column_keys(field)
+        if not descending:
+            return bisect_right(contact_ids, keys[contact_id], key=keys.__getitem__)
+        # Orden descendente: antes del primero con clave menor o igual
+        key = keys[contact_id]
+        low, high = 0, len(contact_ids)
+        while low < high:
+            middle = (low + high) // 2
+            if keys[contact_ids[middle]] > key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def put(self, contact: Contact, old: Optional[Contact] = None) -> None:
+        """Registra un alta (`old` None) o una edición."""
+        for field, keys in self._keys.items():
+            value = getattr(contact, field)
+            if old is not None and getattr(old, field) == value:
+                continue
+            keys[contact.id] = collation_key(field, value)
+            self._reversed.pop(field, None)
+            if old is not None:
+                self._orders.pop(field, None)
+            elif field in self._orders:
+                insort(self._orders[field], contact.id, key=keys.__getitem__)
+
+    def remove(self, contact_id: str) -> None:
+        for field, keys in self._keys.items():
+            if keys.pop(contact_id, None) is None:
+                continue
+            order = self._orders.get(field)
+            if order is not None:
+                order.remove(contact_id)
+            self._reversed.pop(field, None)
+
+def initial(value: str) -> str:
+    """Letra inicial de un valor para el salto por letra ("" si está vacío)."""
+    first = normalize_text(value).strip()[:1]
+    if not first:
+        return ""
+    return first if "a" <= first <= "z" else OTHER_INITIAL
+
+def letter_offsets(contact_ids: List[str], value: Callable[[str], str]) -> Dict[str, int]:
+    """
+    Índice de saltos: primera posición de cada inicial dentro de
+    `contact_ids`, que tienen que estar ordenados por esa columna.
+    """
+    offsets: Dict[str, int] = {}
+    for position, contact_id in enumerate(contact_ids):
+        letter = initial(value(contact_id))
+        if letter and letter not in offsets:
+            offsets[letter] = position
+    return offsets
+
+def letter_position(offsets: Dict[str, int], letter: str, descending: bool = False) -> Optional[int]:
+    """
+    Posición a la que lleva saltar a `letter`: la de esa inicial o, si no
+    hay ninguna, la de la siguiente en el sentido del orden (None si no
+    queda ninguna).
+    """
+    letter = letter.lower()
+    if letter in offsets:
+        return offsets[letter]
+    if descending:
+        following = [current for current in offsets if current < letter]
+        return offsets[max(following)] if following else None
+    following = [current for current in offsets if current > letter]
+    return offsets[min(following)] if following else None
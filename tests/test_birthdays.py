@@ -0,0 +1,90 @@
+"""
+Pruebas del índice de cumpleaños
+"""
+
+import calendar
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from birthdays import BirthdayIndex, birthday_key, next_birthday
+from contacts import Contact
+
+def person(contact_id, birthday):
+    return Contact(contact_id, f"Persona {contact_id}", birthday=birthday)
+
+def celebrates(birthday, date):
+    """Si quien nació en `birthday` (DD/MM/YYYY) festeja en `date`."""
+    day, month, _year = (int(part) for part in birthday.split("/"))
+    if (month, day) == (2, 29) and not calendar.isleap(date.year):
+        return (date.month, date.day) == (2, 28)
+    return (date.month, date.day) == (month, day)
+
+def upcoming_scan(contacts, days, today):
+    result = []
+    for contact in contacts:
+        for remaining in range(days + 1):
+            date = today + datetime.timedelta(days=remaining)
+            if celebrates(contact.birthday, date):
+                result.append((contact.id, date, remaining))
+                break
+    return sorted(result, key=lambda item: (item[2], item[0]))
+
+def test_birthday_key():
+    assert birthday_key("01/01/1990") == 0
+    assert birthday_key("29/02/1992") == 59
+    assert birthday_key("01/03/1990") == 60
+    assert birthday_key("31/12/1990") == 365
+    for bad in ("", "31/02/1990", "1990-01-01", "aa/bb/cccc", None):
+        assert birthday_key(bad) is None
+
+def test_upcoming_wraps_around_new_year():
+    index = BirthdayIndex([person("1", "02/01/1980"), person("2", "26/12/1975"),
+                           person("3", "15/01/2000")])
+    today = datetime.date(2023, 12, 25)
+    assert index.upcoming(14, today) == [("2", datetime.date(2023, 12, 26), 1),
+                                         ("1", datetime.date(2024, 1, 2), 8)]
+
+def test_leap_day_birthday():
+    index = BirthdayIndex([person("1", "29/02/1992")])
+    # Fuera de los bisiestos se festeja el 28/02
+    assert index.upcoming(10, datetime.date(2023, 2, 20)) == [("1", datetime.date(2023, 2, 28), 8)]
+    assert index.upcoming(10, datetime.date(2024, 2, 20)) == [("1", datetime.date(2024, 2, 29), 9)]
+    assert index.upcoming(0, datetime.date(2023, 2, 28)) == [("1", datetime.date(2023, 2, 28), 0)]
+    assert index.upcoming(30, datetime.date(2023, 3, 1)) == []
+    assert next_birthday(birthday_key("29/02/1992"), datetime.date(2023, 3, 1)) == datetime.date(2024, 2, 29)
+    assert index.matching(29, 2) == ["1"]
+    assert index.matching(None, 2) == ["1"]
+
+def test_upcoming_matches_scan():
+    rng = random.Random(4)
+    start = datetime.date(2020, 1, 1)
+    contacts = [person(str(i), (start + datetime.timedelta(days=rng.randrange(366))).strftime("%d/%m/1990"))
+                for i in range(200)]
+    contacts.append(person("bisiesto", "29/02/1988"))
+    index = BirthdayIndex(contacts)
+    for today in [datetime.date(2023, 12, 20), datetime.date(2024, 2, 27), datetime.date(2023, 2, 27),
+                  datetime.date(2023, 1, 1), datetime.date(2024, 12, 31)]:
+        for days in (0, 1, 14, 60, 365):
+            found = sorted(index.upcoming(days, today), key=lambda item: (item[2], item[0]))
+            assert found == upcoming_scan(contacts, days, today), (today, days)
+
+def test_matching_after_changes():
+    index = BirthdayIndex([person("1", "05/03/1990"), person("2", "05/04/1991"),
+                           person("3", "31/02/1990"), person("4", "")])
+    assert index.matching(5) == ["1", "2"]
+    assert index.matching(None, 3) == ["1"]
+    assert index.matching(31, 2) == []
+    assert index.matching(1, 13) == []
+    assert index.unparsed() == ["3"]
+
+    index.update(person("3", "05/03/1985"))
+    index.update(person("1", "06/03/1990"))
+    index.remove("2")
+    assert index.matching(5) == ["3"]
+    assert index.matching(None, 3) == ["3", "1"]
+    assert index.unparsed() == []
+    assert len(index) == 2
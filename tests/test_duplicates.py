@@ -0,0 +1,74 @@
+"""
+Pruebas de la detección de contactos duplicados
+"""
+
+import os
+import random
+import sys
+from itertools import combinations
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from contacts import Contact
+from duplicates import (DUPLICATE_THRESHOLD, candidate_pairs, find_duplicates, merge_group,
+                        phonetic_key, score_pair)
+from search_index import normalize_text
+
+NAMES = ["José Chávez", "Jose Chaves", "Guillermo Vázquez", "Giyermo Basques", "Ana Gómez",
+         "Ana Gomez", "Carla Pérez", "Beto Ruiz"]
+
+def groups_scan(contacts, threshold=DUPLICATE_THRESHOLD):
+    """Grupos comparando todos contra todos."""
+    group_of = {contact.id: {contact.id} for contact in contacts}
+    for a, b in combinations(contacts, 2):
+        if score_pair(a, b) >= threshold and group_of[a.id] is not group_of[b.id]:
+            merged = group_of[a.id] | group_of[b.id]
+            for contact_id in merged:
+                group_of[contact_id] = merged
+    return {frozenset(group) for group in group_of.values() if len(group) > 1}
+
+def test_phonetic_key():
+    assert phonetic_key(normalize_text("Chávez")) == phonetic_key("xabes")
+    assert phonetic_key(normalize_text("Vázquez")) == phonetic_key("basques")
+    assert phonetic_key("llave") == phonetic_key("yabe")
+    assert phonetic_key("ana") != phonetic_key("ema")
+
+def test_find_duplicates_matches_all_pairs():
+    rng = random.Random(9)
+    contacts = []
+    for i in range(120):
+        phone = f"2966 {rng.randint(400000, 400060)}" if rng.random() < 0.7 else ""
+        email = f"{rng.choice(['ana', 'jose', 'beto'])}{rng.randint(1, 15)}@example.com" if rng.random() < 0.5 else ""
+        birthday = rng.choice(["", "01/02/1990", "03/04/1985"])
+        contacts.append(Contact(str(i), rng.choice(NAMES), phone, email, "", birthday))
+    found = find_duplicates(contacts)
+    assert {frozenset(c.id for c in group) for _, group in found} == groups_scan(contacts)
+    # De mayor a menor puntaje, cada uno el mejor par de su grupo
+    scores = [score for score, _ in found]
+    assert scores == sorted(scores, reverse=True)
+    for score, group in found:
+        assert score == max(score_pair(a, b) for a, b in combinations(group, 2))
+
+def test_candidate_pairs_share_a_block():
+    contacts = [Contact("1", "José Chávez", "+54 9 2966 123456"),
+                Contact("2", "Jose Chaves"),
+                Contact("3", "Otro", "2966-123456"),
+                Contact("4", "Nadie", "", "x@example.com")]
+    assert candidate_pairs(contacts) == {("1", "2"), ("1", "3")}
+
+def test_group_keeps_most_complete_first_and_merges():
+    sparse = Contact("1", "Ana Gómez", "2966 123456")
+    full = Contact("2", "Ana Gomez", "+54 9 2966 123456", "ana@example.com", "Roca 10", "01/02/1990")
+    other = Contact("3", "Beto Ruiz", "2966 999999")
+    (score, group), = find_duplicates([sparse, full, other])
+    assert score >= DUPLICATE_THRESHOLD
+    assert [c.id for c in group] == ["2", "1"]
+    merged = merge_group([sparse, full])
+    assert merged.id == "1" and merged.phone == "2966 123456"
+    assert merged.email == "ana@example.com" and merged.birthday == "01/02/1990"
+
+def test_different_birthdays_lower_the_score():
+    a = Contact("1", "Ana Gómez", "2966 123456", birthday="01/02/1990")
+    b = Contact("2", "Ana Gómez", "2966 123456", birthday="01/02/1990")
+    c = Contact("3", "Ana Gómez", "2966 123456", birthday="05/06/1970")
+    assert score_pair(a, b) > score_pair(a, c)
@@ -0,0 +1,55 @@
+"""
+Pruebas de las exportaciones en segundo plano
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import export_jobs
+import export_pdf
+
+def contacts(count):
+    return [{"id": f"{i:032x}", "name": f"Contacto {i}", "phone": str(i), "email": "",
+             "address": "", "birthday": ""} for i in range(count)]
+
+def wait(jobs, timeout=120):
+    start = time.time()
+    while jobs.active and time.time() - start < timeout:
+        jobs.poll()
+        time.sleep(0.05)
+    jobs.poll()
+
+@pytest.mark.parametrize("zip_output", [False, True])
+def test_failed_batch_leaves_no_partial_output(zip_output, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    items = contacts(export_jobs.BATCH_CHUNK * 2 + 5)
+    # Un nombre que no es texto hace fallar al proceso del segundo lote
+    items[export_jobs.BATCH_CHUNK + 3]["name"] = 5
+    jobs = export_jobs.ExportJobs()
+    try:
+        job = jobs.submit(export_jobs.BATCH_EXPORT, "lote", items, zip_output)
+        wait(jobs)
+    finally:
+        jobs.shutdown()
+    assert job.state == export_jobs.FAILED, job.message
+    assert os.listdir(tmp_path / export_pdf.EXPORT_DIR) == []
+
+def test_batch_reports_contacts_and_pages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    items = contacts(export_jobs.BATCH_CHUNK + 5)
+    # Una dirección de muchas líneas lleva a ese contacto a dos páginas
+    items[3]["address"] = "línea\n" * 45
+    jobs = export_jobs.ExportJobs()
+    try:
+        job = jobs.submit(export_jobs.BATCH_EXPORT, "lote", items, True)
+        wait(jobs)
+    finally:
+        jobs.shutdown()
+    assert job.state == export_jobs.DONE, job.message
+    assert job.rows == len(items)
+    assert job.pages == len(items) + 1
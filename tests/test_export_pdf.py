@@ -0,0 +1,80 @@
+"""
+Pruebas de la exportación de la lista de contactos a PDF
+"""
+
+import codecs
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from reportlab import rl_config
+from reportlab.platypus import Paragraph
+
+import export_pdf
+
+LONG_NAME = "Maximiliano Bartolomé Fernández de la Concepción"
+LONG_EMAIL = "maximiliano.bartolome.fernandez.concepcion@correo-institucional.example.org"
+
+def contacts(count):
+    return [{"id": f"{i:032x}", "name": f"{LONG_NAME} {i}", "phone": "+54 9 11 5555-0000",
+             "email": f"{i}.{LONG_EMAIL}", "birthday": "01/01/1990"} for i in range(count)]
+
+def rows(items):
+    return iter([[c["name"], c["phone"], c["email"], c["birthday"]] for c in items])
+
+def pdf_text(path):
+    """Texto de un PDF escrito sin compresión, en el orden en que se dibuja."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return "".join(codecs.escape_decode(part)[0].decode("cp1252")
+                   for part in re.findall(rb"\((.*?)\) Tj", data))
+
+def test_long_cells_wrap_instead_of_truncating():
+    header = ["Nombre", "Teléfono", "Correo", "Cumpleaños"]
+    items = contacts(30) + [{"name": "Ana", "phone": "1", "email": "a@b.c", "birthday": ""}]
+    tables = list(export_pdf.contact_table_chunks(rows(items), header, 300, 600))
+    assert tables[-1].rows_done == 31
+    cells = [row for table in tables for row in table._cellvalues[1:]]
+    assert len(cells) == 31
+    for row, item in zip(cells, items[:-1]):
+        # El nombre y el correo largos se parten en líneas con el texto completo
+        assert isinstance(row[0], Paragraph) and row[0].text == item["name"]
+        assert isinstance(row[2], Paragraph) and row[2].text == item["email"]
+        # Lo que entra no se toca
+        assert row[1] == "+54 9 11 5555-0000"
+    assert cells[-1] == ["Ana", "1", "a@b.c", ""]
+    # Cada tabla entra en su página; solo las filas partidas son más altas
+    for table, available in zip(tables, [300] + [600] * len(tables)):
+        assert sum(table._argH[1:]) <= available
+    heights = [height for table in tables for height in table._argH[1:]]
+    assert all(height > export_pdf.ROW_HEIGHT for height in heights[:-1])
+    assert heights[-1] == export_pdf.ROW_HEIGHT
+
+def test_long_name_and_email_reach_the_pdf(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_pdf, "EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(rl_config, "pageCompression", 0)
+    success, message = export_pdf.export_all_to_pdf(contacts(3))
+    assert success, message
+    text = pdf_text(os.path.join(tmp_path, os.listdir(tmp_path)[0]))
+    # Las líneas de un párrafo se dibujan por separado: se comparan sin espacios
+    compact = text.replace(" ", "")
+    for item in contacts(3):
+        assert item["name"].replace(" ", "") in compact
+        assert item["email"] in compact
+        assert item["birthday"] in compact
+
+def test_progress_follows_layout(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_pdf, "EXPORT_DIR", str(tmp_path))
+    calls = []
+    success, message = export_pdf.export_all_to_pdf(
+        contacts(200), progress=lambda rows, pages: calls.append((rows, pages)))
+    assert success, message
+    # Una llamada por página ya ubicada: filas y páginas crecen juntas
+    assert len(calls) > 1
+    assert [pages for _, pages in calls] == list(range(1, len(calls) + 1))
+    page_rows = calls[1][0] - calls[0][0]
+    assert all(rows == calls[0][0] + page_rows * i for i, (rows, _) in enumerate(calls[:-1]))
+    assert calls[-1][0] == 200
+    assert len(os.listdir(tmp_path)) == 1
@@ -0,0 +1,85 @@
+"""
+Pruebas del diario de cambios de la agenda
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cryptography.fernet import Fernet
+
+from journal import ChangeJournal, apply_change, snapshot_id
+
+def contact(contact_id, name):
+    return {"id": contact_id, "name": name, "phone": "", "email": "", "birthday": ""}
+
+def test_append_and_read_records(tmp_path):
+    fernet = Fernet(Fernet.generate_key())
+    journal = ChangeJournal(str(tmp_path / "agenda.journal"))
+    snap = snapshot_id(b"instantanea")
+    journal.append(fernet, snap, {"op": "put", "contact": contact("1", "Ana")})
+    journal.append_many(fernet, snap, [{"op": "put", "contact": contact("2", "Beto")},
+                                       {"op": "delete", "id": "1"}])
+
+    reopened = ChangeJournal(journal.path)
+    records = reopened.read_records(fernet, snap)
+    assert [record["op"] for record in records] == ["put", "put", "delete"]
+    assert reopened.records == 3
+    assert reopened.size == os.path.getsize(journal.path)
+
+    agenda = [contact("1", "Ana vieja")]
+    for record in records:
+        apply_change(agenda, record)
+    assert agenda == [contact("2", "Beto")]
+
+def test_apply_change_replaces_by_id():
+    agenda = [contact("1", "Ana"), contact("2", "Beto")]
+    apply_change(agenda, {"op": "put", "contact": contact("2", "Roberto")})
+    assert [c["name"] for c in agenda] == ["Ana", "Roberto"]
+
+def test_torn_tail_is_trimmed(tmp_path):
+    fernet = Fernet(Fernet.generate_key())
+    journal = ChangeJournal(str(tmp_path / "agenda.journal"))
+    journal.append(fernet, "snap", {"op": "put", "contact": contact("1", "Ana")})
+    complete = os.path.getsize(journal.path)
+    # Un corte a mitad de un append deja una línea sin terminar
+    with open(journal.path, "ab") as file:
+        file.write(fernet.encrypt(b'{"op":"put"}')[:20])
+
+    records = journal.read_records(fernet, "snap")
+    assert len(records) == 1
+    assert os.path.getsize(journal.path) == complete
+
+    # El próximo registro no queda pegado al pedazo recortado
+    journal.append(fernet, "snap", {"op": "delete", "id": "1"})
+    assert [record["op"] for record in journal.read_records(fernet, "snap")] == ["put", "delete"]
+
+def test_records_of_another_snapshot_are_skipped(tmp_path):
+    fernet = Fernet(Fernet.generate_key())
+    journal = ChangeJournal(str(tmp_path / "agenda.journal"))
+    journal.append(fernet, "vieja", {"op": "put", "contact": contact("1", "Ana")})
+    journal.append(fernet, "nueva", {"op": "put", "contact": contact("2", "Beto")})
+
+    records = journal.read_records(fernet, "nueva")
+    assert [record["contact"]["id"] for record in records] == ["2"]
+    assert journal.records == 1
+
+def test_needs_compaction_thresholds(tmp_path):
+    fernet = Fernet(Fernet.generate_key())
+    journal = ChangeJournal(str(tmp_path / "agenda.journal"), max_records=3, max_bytes=10 ** 6)
+    changes = [{"op": "delete", "id": str(i)} for i in range(3)]
+    journal.append_many(fernet, "snap", changes[:2])
+    assert not journal.needs_compaction()
+    journal.append(fernet, "snap", changes[2])
+    assert journal.needs_compaction()
+
+    journal.reset()
+    assert not os.path.exists(journal.path)
+    assert not journal.needs_compaction()
+
+    by_size = ChangeJournal(journal.path, max_records=100, max_bytes=200)
+    by_size.append(fernet, "snap", changes[0])
+    assert not by_size.needs_compaction()
+    by_size.append(fernet, "snap", changes[1])
+    assert by_size.needs_compaction()
@@ -0,0 +1,73 @@
+"""
+Pruebas de los índices exactos por teléfono, correo y dominio
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from contacts import Contact
+from lookup_index import LOOKUP_KINDS, LookupIndex, lookup_matches
+
+DOMAINS = ["example.com", "correo.ar", "Example.COM"]
+
+def random_contact(rng, contact_id):
+    local = rng.choice(["ana", "beto", "carla"])
+    number = f"{rng.randint(10, 99)}{rng.randint(100000, 999999)}"
+    phone = rng.choice([number, f"+54 9 2966 {number}", f"2966-{number}", number[-5:], ""])
+    email = rng.choice([f"{local}@{rng.choice(DOMAINS)}", f" {local.upper()}@correo.ar ", ""])
+    return Contact(contact_id, local, phone, email)
+
+def values(contacts):
+    """Valores a buscar: los de la agenda, en otras formas, y algunos que no están."""
+    found = ["", "123", "@example.com", "EXAMPLE.COM", "nadie@correo.ar", "+54 9 2966 12"]
+    for contact in contacts.values():
+        found += [contact.phone, contact.phone[-8:], f"0{contact.phone}", contact.email,
+                  contact.email.rpartition("@")[2]]
+    return found
+
+def check(index, contacts):
+    for kind in LOOKUP_KINDS:
+        for value in values(contacts):
+            expected = {c.id for c in contacts.values() if lookup_matches(kind, c, value)}
+            assert set(index.lookup(kind, value)) == expected, (kind, value)
+
+def test_lookup_matches_scan_after_changes():
+    rng = random.Random(2)
+    contacts = {str(i): random_contact(rng, str(i)) for i in range(80)}
+    index = LookupIndex(contacts.values())
+    check(index, contacts)
+    for step in range(40):
+        contact_id = rng.choice(list(contacts))
+        if step % 3 == 0:
+            del contacts[contact_id]
+            index.remove(contact_id)
+        else:
+            contacts[contact_id] = random_contact(rng, contact_id)
+            index.update(contacts[contact_id])
+    check(index, contacts)
+
+def test_local_and_international_phone_match():
+    index = LookupIndex([Contact("1", "Ana", "+54 9 2966 123456"), Contact("2", "Beto", "12345")])
+    assert index.by_phone("2966 123456") == ["1"]
+    assert index.by_phone("+54 (9) 2966-123456") == ["1"]
+    assert index.by_phone("3966 123456") == []
+    # Con pocos dígitos solo vale el número completo
+    assert index.by_phone("12345") == ["2"]
+    assert index.by_phone("2345") == []
+
+def test_results_keep_index_order():
+    contacts = [Contact(str(i), "x", "", f"c{i}@example.com") for i in range(5)]
+    index = LookupIndex(contacts)
+    assert index.by_domain("@EXAMPLE.com") == ["0", "1", "2", "3", "4"]
+    index.remove("2")
+    assert index.by_domain("example.com") == ["0", "1", "3", "4"]
+    assert index.by_email(" C3@Example.com ") == ["3"]
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        LookupIndex().lookup("address", "x")
@@ -0,0 +1,78 @@
+"""
+Pruebas del lenguaje de consultas y de su planificador
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from birthdays import BirthdayIndex
+from contacts import Contact, ContactStore
+from lookup_index import LookupIndex
+from query_language import QueryPlanner, QuerySyntaxError, parse_query
+from search_index import TrigramIndex
+
+QUERIES = [
+    "ana", "Gómez", "email:@example.com", "email:=@EXAMPLE.com", "correo:=ana1@example.com",
+    "phone:2966", "phone:=\"2966 123456\"", "teléfono:=\"+54 9 2966 123456\"", "birthday:03/*",
+    "birthday:=05/03/1990", "birthday:1?/*/19*", "birthday:31/*", "-address:\"\"", "address:\"\"",
+    "nombre:an*", "name:=ana gomez", "ana OR beto", "(ana OR beto) -phone:2966",
+    "-(email:@correo.ar OR birthday:\"\")", "\"roca 1\"", "dirección:roca", "zz", "http://x",
+    "ana email:@correo.ar birthday:*/03/*", "-ana", "a", "name:?na*",
+]
+
+def agenda(count, seed=1):
+    rng = random.Random(seed)
+    contacts = []
+    for i in range(count):
+        first, last = rng.choice(["Ana", "Beto", "Carla", "Dani"]), rng.choice(["Gómez", "Pérez", "Roca"])
+        phone = rng.choice(["2966 123456", "+54 9 2966 123456", f"11 {rng.randint(1000, 9999)}", ""])
+        email = rng.choice([f"{first.lower()}{i % 3}@example.com", f"{first.lower()}@correo.ar", ""])
+        address = rng.choice([f"Roca {rng.randint(1, 200)}", "San Martín 10", ""])
+        birthday = rng.choice(["05/03/1990", "15/03/1985", "31/12/2001", "29/02/1992", "31/02/1990", ""])
+        contacts.append(Contact(str(i), f"{first} {last}", phone, email, address, birthday))
+    return ContactStore(contacts)
+
+def planner(store):
+    return QueryPlanner(store, TrigramIndex(store), LookupIndex(store), BirthdayIndex(store))
+
+@pytest.mark.parametrize("text", [
+    'name:"sin cerrar', 'foo:"x"', '""', "(ana", "ana)", "", "   ", "ana OR", "()", "OR ana",
+])
+def test_syntax_errors(text):
+    with pytest.raises(QuerySyntaxError):
+        parse_query(text)
+
+def test_parse_tree():
+    assert str(parse_query('ana -email:"" OR phone:=2966')) == \
+        '((todo contiene "ana") Y (NO (email vacío))) O (phone = "2966")'
+    assert str(parse_query("nombre:Jos*")) == 'name como "jos*"'
+    assert str(parse_query("cumpleaños:=05/03/1990")) == 'birthday = "05/03/1990"'
+    # Un campo que no existe se busca como texto
+    assert str(parse_query("http://x")) == 'todo contiene "http://x"'
+
+def test_planner_matches_full_scan():
+    store = agenda(300)
+    query_planner = planner(store)
+    for text in QUERIES:
+        tree = parse_query(text)
+        expected = [contact.id for contact in store if tree.matches(contact)]
+        result, plan = query_planner.execute(text)
+        assert result == expected, text
+        assert plan.matched == len(expected)
+        assert plan.candidates >= len(expected)
+
+def test_planner_uses_the_most_selective_index():
+    store = agenda(300)
+    query_planner = planner(store)
+    _, plan = query_planner.execute('a phone:="2966 123456"')
+    assert plan.access.startswith("índice exacto")
+    _, plan = query_planner.execute("a birthday:31/12/*")
+    assert plan.access.startswith("índice de cumpleaños")
+    _, plan = query_planner.execute("-ana")
+    assert plan.access == "recorrido completo"
+    assert plan.candidates == len(store)
@@ -0,0 +1,137 @@
+"""
+Pruebas del índice de búsqueda contra un recorrido completo de la agenda
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from contacts import Contact
+from search_index import (IncrementalSearch, TrigramIndex, contact_text, levenshtein,
+                          max_typos, normalize_text, text_words, _WORD_RE)
+
+NAMES = ["Ana", "Andrés", "Martín", "María", "Zoe", "Íñigo", "Valentina", "Nicolás"]
+SURNAMES = ["Butterfield", "López", "Gómez", "Río", "Pérez", "Sánchez", "Romero"]
+STREETS = ["San Martín", "Roca", "Zapiola", "Alberdi"]
+QUERIES = ["a", "z", "í", "ri", "zz", "an", "ma", "río", "ez", "12", "5 1", "butter",
+           "lópez", "martín 1", "@example", "roca 2", "valentina.lopez", ""]
+FUZZY_QUERIES = ["nicloas", "butterfeld", "valentna", "sanchez romero", "ana", "lopes"]
+
+def random_contact(rng, contact_id):
+    first, last = rng.choice(NAMES), rng.choice(SURNAMES)
+    return Contact(contact_id, f"{first} {last}", f"+54 9 {rng.randint(100, 999)} {rng.randint(1000, 9999)}",
+                   f"{normalize_text(first)}.{normalize_text(last)}{rng.randint(1, 99)}@example.com",
+                   f"{rng.choice(STREETS)} {rng.randint(1, 3000)}")
+
+def agenda(count, seed=7):
+    rng = random.Random(seed)
+    return {str(i): random_contact(rng, str(i)) for i in range(count)}
+
+def scan(contacts, query):
+    needle = normalize_text(query.strip())
+    return [c.id for c in contacts.values() if needle in contact_text(c)]
+
+def fuzzy_scan(contacts, query):
+    """Búsqueda difusa contacto por contacto, con las mismas reglas que el índice."""
+    tokens = set(_WORD_RE.findall(normalize_text(query)))
+    scored = []
+    for order, contact in enumerate(contacts.values()):
+        words = text_words(contact_text(contact))
+        total = 0
+        for token in tokens:
+            limit = max_typos(token)
+            distances = [min(levenshtein(token, word, limit),
+                             levenshtein(token, word[:len(token)], limit)) for word in words]
+            best = min(distances, default=limit + 1)
+            if best > limit:
+                break
+            total += best
+        else:
+            if tokens:
+                scored.append((total, order, contact.id))
+    return [contact_id for _, _, contact_id in sorted(scored)]
+
+def check(index, contacts):
+    for query in QUERIES:
+        assert index.search(query) == scan(contacts, query), query
+    for query in FUZZY_QUERIES:
+        assert index.fuzzy_search(query) == fuzzy_scan(contacts, query), query
+
+def test_search_matches_scan():
+    contacts = agenda(400)
+    check(TrigramIndex(contacts.values()), contacts)
+
+def test_search_after_put_and_remove():
+    rng = random.Random(3)
+    contacts = agenda(300)
+    index = TrigramIndex(contacts.values())
+    # Las consultas cortas arman sus listas antes de los cambios
+    check(index, contacts)
+    for step in range(60):
+        action = rng.random()
+        if action < 0.4:
+            contact = random_contact(rng, f"n{step}")
+            contacts[contact.id] = contact
+            index.add(contact)
+        elif action < 0.7:
+            contact_id = rng.choice(list(contacts))
+            contact = random_contact(rng, contact_id)
+            contacts[contact_id] = contact
+            index.update(contact)
+        else:
+            contact_id = rng.choice(list(contacts))
+            del contacts[contact_id]
+            index.remove(contact_id)
+        if step % 10 == 0:
+            check(index, contacts)
+    check(index, contacts)
+
+def test_search_after_stale_rebuild():
+    rng = random.Random(5)
+    contacts = agenda(200)
+    index = TrigramIndex(contacts.values())
+    check(index, contacts)
+    rebuilds = []
+    rebuild = index._rebuild
+    index._rebuild = lambda: (rebuilds.append(len(index)), rebuild())
+    # Editar y borrar muchos contactos deja más de un cuarto de entradas obsoletas
+    for contact_id in list(contacts)[::2]:
+        contacts[contact_id] = random_contact(rng, contact_id)
+        index.update(contacts[contact_id])
+    for contact_id in list(contacts)[1::4]:
+        del contacts[contact_id]
+        index.remove(contact_id)
+    assert rebuilds
+    assert len(index) == len(contacts)
+    check(index, contacts)
+
+def test_incremental_search_matches_scan():
+    rng = random.Random(11)
+    contacts = agenda(300)
+    index = TrigramIndex(contacts.values())
+    live = IncrementalSearch(index)
+    typed = "valentina.lopez1"
+    # Escribir, borrar y volver a escribir, con cambios en el medio
+    for round_ in range(3):
+        for size in list(range(1, len(typed) + 1)) + list(range(len(typed), 0, -1)):
+            query = typed[:size]
+            assert live.search(query) == scan(contacts, query), query
+        contact = random_contact(rng, f"nuevo{round_}")
+        contact.email = f"valentina.lopez1{round_}@example.com"
+        contacts[contact.id] = contact
+        index.add(contact)
+        removed = rng.choice(list(contacts))
+        del contacts[removed]
+        index.remove(removed)
+    for query in FUZZY_QUERIES:
+        assert live.search(query, "fuzzy") == fuzzy_scan(contacts, query)
+
+def test_estimate_bounds_results():
+    contacts = agenda(300)
+    index = TrigramIndex(contacts.values())
+    for query in QUERIES:
+        assert index.estimate(query) >= len(scan(contacts, query)), query
+        index.search(query)
+        assert index.estimate(query) >= len(scan(contacts, query)), query
@@ -0,0 +1,32 @@
+"""
+Pruebas de la clave de sesión de los motores de almacenamiento
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cryptography.fernet import Fernet
+
+from storage import STORAGE_ENGINES, create_backend
+
+@pytest.mark.parametrize("engine", sorted(STORAGE_ENGINES))
+def test_clear_key_locks_the_backend(engine, tmp_path):
+    key = Fernet.generate_key()
+    storage = create_backend(engine, str(tmp_path / "agenda"))
+    storage.set_key(key)
+    storage.put({"id": "1", "name": "Ana", "phone": "123", "email": "", "birthday": ""})
+
+    storage.clear_key()
+    assert storage._key is None and storage._fernet is None
+    with pytest.raises(ValueError):
+        storage.load()
+    with pytest.raises(ValueError):
+        storage.put({"id": "2", "name": "Beto", "phone": "", "email": "", "birthday": ""})
+
+    storage.set_key(key)
+    assert [contact["name"] for contact in storage.load()] == ["Ana"]
+    storage.close()
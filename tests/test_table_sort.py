@@ -0,0 +1,97 @@
+"""
+Pruebas del ordenamiento de la tabla y de sus órdenes guardados
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from contacts import Contact, ContactStore
+from table_sort import (SORT_FIELDS, SortCache, collation_key, letter_offsets, letter_position)
+
+def random_contact(rng, contact_id):
+    return Contact(contact_id, rng.choice(["Ana", "ana", "Álvaro", "Beto", "zoe", "", "Éric"]),
+                   rng.choice(["2966 123", "+54 11 5555", "11-5555", ""]),
+                   rng.choice(["b@x.com", "a@x.com", ""]),
+                   rng.choice(["Roca 1", "roca 1", "", "Alberdi 2"]),
+                   rng.choice(["05/03/1990", "01/01/2000", "31/02/1990", "", "05/03/1989"]))
+
+def expected_order(store, field):
+    """Orden estable de la agenda por la clave de la columna."""
+    return [c.id for c in sorted(store, key=lambda c: collation_key(field, getattr(c, field)))]
+
+def check(cache, store):
+    for field in SORT_FIELDS:
+        expected = expected_order(store, field)
+        assert cache.order(field) == expected, field
+        assert cache.order(field, descending=True) == expected[::-1], field
+
+def test_collation_key():
+    assert collation_key("birthday", "05/03/1990") < collation_key("birthday", "01/01/2000")
+    assert collation_key("birthday", "31/02/x") == (1,)
+    assert collation_key("phone", "+54 11") == (0, "5411")
+    assert collation_key("name", "") > collation_key("name", "zoe")
+    assert collation_key("name", "Álvaro") < collation_key("name", "beto")
+
+def test_orders_stay_correct_after_put_and_remove():
+    rng = random.Random(6)
+    store = ContactStore(random_contact(rng, str(i)) for i in range(120))
+    cache = SortCache(store)
+    check(cache, store)
+    for step in range(80):
+        action = rng.random()
+        if action < 0.4:
+            contact = random_contact(rng, f"n{step}")
+            store.put(contact)
+            cache.put(contact)
+        elif action < 0.75:
+            contact_id = rng.choice([c.id for c in store])
+            old = store.get(contact_id)
+            contact = random_contact(rng, contact_id)
+            store.put(contact)
+            cache.put(contact, old)
+        else:
+            contact_id = rng.choice([c.id for c in store])
+            store.remove(contact_id)
+            cache.remove(contact_id)
+        # Algunos pasos consultan el orden y otros no, para cambiar sobre
+        # órdenes guardados y sobre órdenes descartados
+        if step % 3 == 0:
+            check(cache, store)
+    check(cache, store)
+
+def test_sort_subsets_and_insert_position():
+    rng = random.Random(8)
+    store = ContactStore(random_contact(rng, str(i)) for i in range(200))
+    cache = SortCache(store)
+    ids = [c.id for c in store]
+    for size in (0, 1, 5, 40, 200):
+        # Como el resultado de una búsqueda: en el orden de la agenda
+        wanted = set(rng.sample(ids, size))
+        subset = [contact_id for contact_id in ids if contact_id in wanted]
+        for field in SORT_FIELDS:
+            for descending in (False, True):
+                full = cache.order(field, descending)
+                assert cache.sort(subset, field, descending) == [i for i in full if i in wanted]
+    # Un alta va al final de la agenda: después de las claves iguales (antes
+    # en orden descendente), donde la deja también el orden completo
+    contact = Contact("nuevo", "ana", "2966 123", "a@x.com", "Roca 1", "05/03/1990")
+    store.put(contact)
+    cache.put(contact)
+    for field in SORT_FIELDS:
+        for descending in (False, True):
+            full = cache.order(field, descending)
+            ordered = [contact_id for contact_id in full if contact_id != "nuevo"]
+            assert cache.insert_position(ordered, "nuevo", field, descending) == full.index("nuevo")
+
+def test_letter_jumps():
+    names = {"1": "Álvaro", "2": "beto", "3": "", "4": "9 de julio", "5": "Zoe"}
+    ordered = ["4", "1", "2", "5", "3"]
+    offsets = letter_offsets(ordered, names.__getitem__)
+    assert offsets == {"#": 0, "a": 1, "b": 2, "z": 3}
+    assert letter_position(offsets, "c") == 3
+    assert letter_position(offsets, "C", descending=True) == 2
+    assert letter_position(offsets, "z") == 3
+    assert letter_position(offsets, "{") is None
@@ -0,0 +1,94 @@
+"""
+Pruebas del formato segmentado de la bóveda
+"""
+
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cryptography.fernet import Fernet
+
+import vault_format
+from journal import snapshot_id
+from vault_format import SEGMENT_SIZE, VaultReader, write_vault
+
+def contacts(count):
+    return [{"id": f"{i:032x}", "name": f"Contacto {i}", "phone": str(i), "email": "",
+             "birthday": "01/01/1990"} for i in range(count)]
+
+@pytest.mark.parametrize("encoding", ["json", "json+zlib", "json+lzma"])
+def test_segments_round_trip(tmp_path, encoding):
+    fernet = Fernet(Fernet.generate_key())
+    path = str(tmp_path / "agenda.enc")
+    items = contacts(2 * SEGMENT_SIZE + 10)
+    snapshot = write_vault(path, fernet, items, encoding=encoding)
+
+    reader = VaultReader(path, fernet)
+    assert not reader.is_legacy
+    assert reader.snapshot_id == snapshot
+    assert reader.total == len(items)
+    assert reader.segment_count == 3
+    assert reader.read_segment(2) == items[2 * SEGMENT_SIZE:]
+    assert reader.read_all() == items
+    with ThreadPoolExecutor(2) as executor:
+        assert list(reader.iter_contacts(executor, start=1)) == items[SEGMENT_SIZE:]
+
+def test_iter_contacts_reports_progress(tmp_path):
+    fernet = Fernet(Fernet.generate_key())
+    path = str(tmp_path / "agenda.enc")
+    write_vault(path, fernet, contacts(SEGMENT_SIZE + 1))
+    calls = []
+    list(VaultReader(path, fernet).iter_contacts(progress=lambda done, total: calls.append((done, total))))
+    assert calls == [(SEGMENT_SIZE, SEGMENT_SIZE + 1), (SEGMENT_SIZE + 1, SEGMENT_SIZE + 1)]
+
+def test_empty_agenda_has_no_segments(tmp_path):
+    fernet = Fernet(Fernet.generate_key())
+    path = str(tmp_path / "agenda.enc")
+    write_vault(path, fernet, [])
+    reader = VaultReader(path, fernet)
+    assert reader.segment_count == 0
+    assert reader.read_all() == []
+
+def test_legacy_single_token_file(tmp_path):
+    fernet = Fernet(Fernet.generate_key())
+    path = str(tmp_path / "agenda.enc")
+    # Formato viejo: un solo token Fernet con la lista entera y sin 'birthday'
+    items = [{"name": "Ana", "phone": "1", "email": ""}]
+    encrypted = fernet.encrypt(json.dumps(items).encode("utf-8"))
+    with open(path, "wb") as file:
+        file.write(encrypted)
+
+    reader = VaultReader(path, fernet)
+    assert reader.is_legacy
+    assert reader.snapshot_id == snapshot_id(encrypted)
+    assert reader.total == 1 and reader.segment_count == 1
+    assert reader.read_all() == [dict(items[0], birthday="")]
+
+def test_failed_write_keeps_previous_file(tmp_path, monkeypatch):
+    fernet = Fernet(Fernet.generate_key())
+    path = str(tmp_path / "agenda.enc")
+    snapshot = write_vault(path, fernet, contacts(3))
+    with open(path, "rb") as file:
+        before = file.read()
+
+    def fail(_fd):
+        raise OSError("disco lleno")
+    monkeypatch.setattr(vault_format.os, "fsync", fail)
+    with pytest.raises(OSError):
+        write_vault(path, fernet, contacts(5))
+    monkeypatch.undo()
+
+    with open(path, "rb") as file:
+        assert file.read() == before
+    reader = VaultReader(path, fernet)
+    assert reader.snapshot_id == snapshot
+    assert reader.read_all() == contacts(3)
+
+    # Una escritura posterior reemplaza el temporal que quedó a medias
+    write_vault(path, fernet, contacts(5))
+    assert VaultReader(path, fernet).read_all() == contacts(5)
@@ -0,0 +1,169 @@
+"""
+Pruebas de la sesión de la bóveda y de sus ranuras de clave A/B
+"""
+
+import base64
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import vault_session
+from storage import FileBackend
+from vault_format import KEYSLOT_SIZE, _KEYSLOT_START, decode_keyslot, read_keyslot
+from vault_session import VaultSession
+
+CONTACT = {"id": "1", "name": "Ana", "phone": "123", "email": "", "birthday": ""}
+
+@pytest.fixture(autouse=True)
+def cheap_kdf(monkeypatch):
+    """Parámetros de scrypt baratos: las pruebas no miden la máquina."""
+    def calibrate_kdf(algorithm=vault_session.KDF_ALGORITHM, target=None):
+        return {"name": "scrypt", "n": 2 ** 10, "r": 8, "p": 1,
+                "salt": base64.b64encode(os.urandom(16)).decode("ascii")}
+    monkeypatch.setattr(vault_session, "calibrate_kdf", calibrate_kdf)
+
+def new_agenda(path, password):
+    storage = FileBackend(path)
+    session = VaultSession()
+    session.unlock(password, storage)
+    storage.replace_all([CONTACT])
+    return storage, session
+
+def open_agenda(path, password):
+    storage = FileBackend(path)
+    session = VaultSession()
+    session.unlock(password, storage)
+    return storage, session
+
+def slot_generations(path):
+    """Generación de las ranuras A y B (None si está vacía o dañada)."""
+    with open(path, "rb") as file:
+        file.seek(_KEYSLOT_START)
+        raw = file.read(2 * KEYSLOT_SIZE)
+    slots = [decode_keyslot(raw[i:i + KEYSLOT_SIZE]) for i in (0, KEYSLOT_SIZE)]
+    return [None if slot is None else slot.get("gen", 0) for slot in slots]
+
+def corrupt_slot(path, number):
+    with open(path, "r+b") as file:
+        file.seek(_KEYSLOT_START + number * KEYSLOT_SIZE + 10)
+        byte = file.read(1)
+        file.seek(-1, os.SEEK_CUR)
+        file.write(bytes([byte[0] ^ 0xFF]))
+
+def test_keyslot_writes_alternate_slots(tmp_path):
+    path = str(tmp_path / "agenda.enc")
+    storage, session = new_agenda(path, "vieja")
+    assert slot_generations(path) == [0, None]
+
+    # Cada ranura nueva pisa la que no está vigente
+    storage.write_keyslot(session.rewrap("nueva"))
+    assert slot_generations(path) == [0, 1]
+    storage.write_keyslot(session.rewrap("otra"))
+    assert slot_generations(path) == [2, 1]
+    assert read_keyslot(path)["gen"] == 2
+
+def test_corrupt_keyslot_falls_back_to_other_slot(tmp_path):
+    path = str(tmp_path / "agenda.enc")
+    storage, session = new_agenda(path, "vieja")
+    storage.write_keyslot(session.rewrap("nueva"))
+    # Un corte a mitad de escribir la ranura B deja su suma de verificación mal
+    corrupt_slot(path, 1)
+    assert read_keyslot(path).get("gen", 0) == 0
+
+    storage, session = open_agenda(path, "vieja")
+    assert storage.load() == [CONTACT]
+    with pytest.raises(ValueError):
+        open_agenda(path, "nueva")
+
+def test_wrong_password_is_rejected(tmp_path):
+    path = str(tmp_path / "agenda.enc")
+    new_agenda(path, "correcta")
+    with pytest.raises(ValueError):
+        open_agenda(path, "incorrecta")
+    session = VaultSession()
+    with pytest.raises(ValueError):
+        session.unlock("incorrecta", FileBackend(path))
+    assert not session.is_unlocked
+
+def test_rewrap_accepts_new_password_only(tmp_path):
+    path = str(tmp_path / "agenda.enc")
+    storage, session = new_agenda(path, "vieja")
+    storage.write_keyslot(session.rewrap("nueva"))
+
+    # La clave de datos no cambia: los contactos se leen sin reescribirlos
+    storage, session = open_agenda(path, "nueva")
+    assert storage.load() == [CONTACT]
+    with pytest.raises(ValueError):
+        open_agenda(path, "vieja")
+
+def test_lock_clears_the_key(tmp_path):
+    _storage, session = new_agenda(str(tmp_path / "agenda.enc"), "clave")
+    assert session.is_unlocked
+    session.lock()
+    assert not session.is_unlocked
+    with pytest.raises(ValueError):
+        session.key
+
+def counting_derive(monkeypatch):
+    """Reemplaza derive_key por una versión lenta que anota cuántas corren a la vez."""
+    derive_key = vault_session.derive_key
+    lock = threading.Lock()
+    stats = {"running": 0, "most": 0, "calls": []}
+
+    def slow_derive(password, params=None):
+        with lock:
+            stats["running"] += 1
+            stats["most"] = max(stats["most"], stats["running"])
+            stats["calls"].append(password)
+        time.sleep(0.1)
+        try:
+            return derive_key(password, params)
+        finally:
+            with lock:
+                stats["running"] -= 1
+    monkeypatch.setattr(vault_session, "derive_key", slow_derive)
+    return stats
+
+def test_speculation_reuses_the_typed_password(tmp_path, monkeypatch):
+    path = str(tmp_path / "agenda.enc")
+    new_agenda(path, "clave")
+    stats = counting_derive(monkeypatch)
+    storage = FileBackend(path)
+    session = VaultSession()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        session.speculate("clave", storage, executor)
+        session.unlock("clave", storage)
+    assert stats["calls"] == ["clave"]
+    assert session.is_unlocked
+
+def test_at_most_one_derivation_runs(tmp_path, monkeypatch):
+    path = str(tmp_path / "agenda.enc")
+    new_agenda(path, "clave")
+    stats = counting_derive(monkeypatch)
+    storage = FileBackend(path)
+    session = VaultSession()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # Se escribe con pausas y se aprieta Enter mientras deriva otra
+        session.speculate("cl", storage, executor)
+        session.speculate("cla", storage, executor)
+        session.speculate("clav", storage, executor)
+        session.unlock("clave", storage)
+        assert stats["most"] == 1
+        assert stats["calls"] == ["cl", "clave"]
+        assert session._speculation is None and session._pending is None
+
+        # Bloquear descarta lo adelantado y la próxima espera a la que sigue corriendo
+        session.speculate("otra", storage, executor)
+        time.sleep(0.05)  # que llegue a empezar
+        session.lock()
+        assert session._speculation is None
+        session.speculate("clave", storage, executor)
+        session.unlock("clave", storage)
+    assert stats["most"] == 1
+    assert stats["calls"][-2:] == ["otra", "clave"]
@@ -0,0 +1,195 @@
+"""
+Pruebas de la tabla virtual, sobre un Treeview de mentira
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import virtual_table
+from virtual_table import ROW_BUFFER, VirtualTable
+
+class FakeTree:
+    """Lo que la tabla usa de un ttk.Treeview: filas en orden y selección."""
+
+    def __init__(self, height=10):
+        self.height = height
+        self.items = []
+        self.values = {}
+        self._selection = ()
+        self.bindings = {}
+
+    def cget(self, option):
+        return self.height
+
+    def configure(self, **kw):
+        pass
+
+    def bind(self, sequence, callback, add=None):
+        self.bindings[sequence] = callback
+
+    def winfo_height(self):
+        return 0
+
+    def insert(self, parent, index, iid, values):
+        assert iid not in self.values
+        self.items.insert(len(self.items) if index == "end" else index, iid)
+        self.values[iid] = values
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.items.remove(iid)
+            del self.values[iid]
+
+    def item(self, iid, values):
+        self.values[iid] = values
+
+    def see(self, iid):
+        pass
+
+    def selection(self):
+        return self._selection
+
+    def selection_set(self, items):
+        self._selection = tuple(items)
+
+    def yview(self, *args):
+        return 0.0, 1.0
+
+    def yview_moveto(self, fraction):
+        pass
+
+class FakeScrollbar:
+    def configure(self, **kw):
+        pass
+
+    def set(self, first, last):
+        self.fractions = (first, last)
+
+class FakeStyle:
+    def lookup(self, style, option):
+        return 20
+
+@pytest.fixture(autouse=True)
+def fake_style(monkeypatch):
+    monkeypatch.setattr(virtual_table.ttk, "Style", FakeStyle)
+
+def make_table(rows, values=None):
+    values = values if values is not None else {}
+    table = VirtualTable(FakeTree(), FakeScrollbar(), lambda contact_id: values.get(contact_id, (contact_id,)))
+    table.set_rows(rows)
+    return table
+
+def check(table, expected):
+    """El modelo es `expected` y el Treeview tiene justo la ventana que corresponde."""
+    assert table.rows == expected
+    assert len(table) == len(expected)
+    for contact_id in expected:
+        assert contact_id in table
+    start = max(0, table._offset - ROW_BUFFER)
+    assert table.tree.items == expected[start:table._offset + table._visible + ROW_BUFFER]
+
+def test_window_follows_scrolling():
+    rows = [str(i) for i in range(100)]
+    table = make_table(rows)
+    check(table, rows)
+    assert table.tree.items == rows[:20]
+    table.yview("moveto", "0.5")
+    check(table, rows)
+    assert table.tree.items[0] == "40"
+    table.yview("scroll", "1", "pages")
+    check(table, rows)
+    assert table.yview()[0] == pytest.approx(0.6)
+    table.yview("moveto", "1.0")
+    check(table, rows)
+    assert table.tree.items[-1] == "99"
+
+def test_insert_and_remove_rows_match_a_list():
+    rng = random.Random(3)
+    expected = [str(i) for i in range(60)]
+    table = make_table(expected)
+    table.yview("moveto", "0.4")
+    for step in range(200):
+        action = rng.random()
+        if action < 0.4:
+            position = rng.randint(0, len(expected))
+            expected.insert(position, f"n{step}")
+            table.insert_row(position, f"n{step}")
+        elif action < 0.7 and expected:
+            contact_id = rng.choice(expected)
+            expected.remove(contact_id)
+            table.remove_row(contact_id)
+        elif action < 0.9:
+            gone = set(rng.sample(expected, min(len(expected), rng.randint(0, 5))))
+            expected = [contact_id for contact_id in expected if contact_id not in gone]
+            table.remove_rows(list(gone) + ["no está"])
+        else:
+            table.yview("moveto", str(rng.random()))
+        check(table, expected)
+    assert "no está" not in table
+    assert all(contact_id not in table for contact_id in map(str, range(60)) if contact_id not in expected)
+
+def test_removing_above_keeps_the_view_still():
+    rows = [str(i) for i in range(100)]
+    table = make_table(rows)
+    table.yview("moveto", "0.5")
+    assert table._offset == 50
+    table.remove_rows(["1", "2", "70"])
+    assert table._offset == 48 and table.rows[48] == "50"
+    table.remove_row("3")
+    assert table._offset == 47 and table.rows[47] == "50"
+    table.insert_row(0, "nuevo")
+    assert table._offset == 48 and table.rows[48] == "50"
+
+def test_selection_survives_leaving_the_window():
+    rows = [str(i) for i in range(100)]
+    table = make_table(rows)
+    table.select("5")
+    assert table.tree.selection() == ("5",)
+    table.yview("moveto", "0.8")
+    assert table.tree.selection() == ()
+    assert table.selection() == ("5",)
+    # Se mueve sin perder la selección, y se pierde al quitarla
+    table.remove_rows(["5"], keep_selection=True)
+    table.insert_row(90, "5")
+    assert table.selection() == ("5",)
+    assert table.tree.selection() == ("5",)
+    table.remove_row("5")
+    assert table.selection() == ()
+    # set_rows conserva solo la selección que sigue en la vista
+    table.select("7")
+    table.set_rows(rows[:5])
+    assert table.selection() == ()
+
+def test_update_row_only_touches_created_rows():
+    values = {}
+    rows = [str(i) for i in range(100)]
+    table = make_table(rows, values)
+    values["1"] = ("uno",)
+    values["90"] = ("noventa",)
+    table.update_row("1")
+    table.update_row("90")
+    assert table.tree.values["1"] == ("uno",)
+    assert "90" not in table.tree.values
+
+def test_pages():
+    rows = [str(i) for i in range(45)]
+    table = make_table(rows)
+    table.yview("moveto", "0.5")
+    table.set_page_size(20)
+    assert table.page() == (1, 3)
+    assert table.tree.items == rows[20:40]
+    table.show_page(5)
+    assert table.page() == (2, 3)
+    assert table.tree.items == rows[40:]
+    table.show_row(3)
+    assert table.page() == (0, 3)
+    table.remove_rows(rows[:30])
+    assert table.page() == (0, 1)
+    assert table.tree.items == rows[30:]
+    table.set_page_size(0)
+    assert table.page() == (0, 1)
@@ -0,0 +1,258 @@
+"""
+Formato de archivo de la bóveda para la aplicación Agenda
+Los contactos se guardan en segmentos encriptados por separado, precedidos por
+un índice encriptado, para poder desencriptar solo la parte que hace falta
+
+Versiones del contenedor:
+  1: segmentos en JSON, tokens Fernet en base64
+  2: segmentos en JSON compacto y comprimido (según `encoding` en el índice),
+     tokens Fernet guardados en binario
+  3: igual que 2, más dos ranuras de clave (A/B) después de la versión con la
+     clave de datos envuelta por la clave derivada de la contraseña
+"""
+
+import base64
+import hashlib
+import json
+import lzma
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from cryptography.fernet import Fernet
+
+from journal import snapshot_id
+
+# Cabecera: MAGIC + versión (1 byte) + ranuras de clave (desde la versión 3)
+# + largo del índice encriptado (4 bytes)
+MAGIC = b"CVLT"
+FORMAT_VERSION = 3
+SEGMENT_SIZE = 256
+# Codificación de los segmentos al escribir; las demás se siguen pudiendo leer
+PAYLOAD_ENCODING = "json+zlib"
+# Segmentos que se desencriptan por adelantado al recorrer la agenda
+PREFETCH_SEGMENTS = 8
+_LENGTH = struct.Struct(">I")
+# Cada ranura: JSON con espacios de relleno + SHA-256 de lo anterior
+KEYSLOT_SIZE = 512
+KEYSLOT_COUNT = 2
+_KEYSLOT_START = len(MAGIC) + 1
+_DIGEST_SIZE = hashlib.sha256().digest_size
+
+# Compresión aplicada al JSON de cada segmento antes de encriptarlo
+_COMPRESSION = {
+    "json": (lambda data: data, lambda data: data),
+    "json+zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "json+lzma": (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+def encode_payload(contacts: List[Dict], encoding: str = PAYLOAD_ENCODING) -> bytes:
+    """Serializa contactos en JSON compacto y los comprime según `encoding`."""
+    compress, _decompress = _COMPRESSION[encoding]
+    return compress(json.dumps(contacts, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+def decode_payload(data: bytes, encoding: str) -> List[Dict]:
+    """Operación inversa de `encode_payload`."""
+    if encoding not in _COMPRESSION:
+        raise ValueError(f"Codificación de agenda no soportada: {encoding}")
+    _compress, decompress = _COMPRESSION[encoding]
+    return json.loads(decompress(data))
+
+def encode_keyslot(keyslot: Dict) -> bytes:
+    """Serializa una ranura de clave con su suma de verificación."""
+    body_size = KEYSLOT_SIZE - _DIGEST_SIZE
+    data = json.dumps(keyslot, separators=(',', ':')).encode('utf-8')
+    if len(data) > body_size:
+        raise ValueError("La ranura de clave no entra en la cabecera.")
+    body = data.ljust(body_size, b" ")
+    return body + hashlib.sha256(body).digest()
+
+def decode_keyslot(raw: bytes) -> Optional[Dict]:
+    """Devuelve la ranura o None si está vacía o a medio escribir."""
+    body, digest = raw[:-_DIGEST_SIZE], raw[-_DIGEST_SIZE:]
+    if len(raw) != KEYSLOT_SIZE or hashlib.sha256(body).digest() != digest:
+        return None
+    return json.loads(body)
+
+def _read_keyslots(path: str) -> List[Optional[Dict]]:
+    with open(path, 'rb') as file:
+        prefix = file.read(_KEYSLOT_START)
+        if not prefix.startswith(MAGIC) or prefix[len(MAGIC)] < 3:
+            return []
+        raw = file.read(KEYSLOT_SIZE * KEYSLOT_COUNT)
+    return [decode_keyslot(raw[i:i + KEYSLOT_SIZE]) for i in range(0, len(raw), KEYSLOT_SIZE)]
+
+def read_keyslot(path: str) -> Optional[Dict]:
+    """
+    Devuelve la ranura de clave vigente (la válida de mayor generación).
+
+    Los archivos anteriores a la versión 3 no tienen ranuras: devuelve None.
+    """
+    slots = [slot for slot in _read_keyslots(path) if slot is not None]
+    return max(slots, key=lambda slot: slot.get("gen", 0)) if slots else None
+
+def write_keyslot(path: str, keyslot: Dict) -> Dict:
+    """
+    Guarda una ranura de clave nueva sin tocar el resto del archivo.
+
+    Se sobrescribe la ranura que no está vigente, así que si el proceso se
+    corta a mitad de la escritura sigue valiendo la anterior. Devuelve la
+    ranura tal como quedó guardada (con su número de generación).
+    """
+    slots = _read_keyslots(path)
+    if len(slots) != KEYSLOT_COUNT:
+        raise ValueError("El archivo de la agenda no tiene ranuras de clave.")
+    generations = [slot.get("gen", 0) if slot else -1 for slot in slots]
+    target = generations.index(min(generations))
+    keyslot = dict(keyslot, gen=max(generations) + 1)
+    with open(path, 'r+b') as file:
+        file.seek(_KEYSLOT_START + target * KEYSLOT_SIZE)
+        file.write(encode_keyslot(keyslot))
+        file.flush()
+        os.fsync(file.fileno())
+    return keyslot
+
+def _encrypt_segment(fernet: Fernet, contacts: List[Dict], encoding: str) -> bytes:
+    # Fernet devuelve base64: en disco se guarda el token binario (1/4 menos)
+    return base64.urlsafe_b64decode(fernet.encrypt(encode_payload(contacts, encoding)))
+
+def write_vault(path: str, fernet: Fernet, contacts: List[Dict],
+                executor: Optional[Executor] = None,
+                encoding: str = PAYLOAD_ENCODING,
+                keyslot: Optional[Dict] = None) -> str:
+    """
+    Escribe la agenda en formato segmentado y devuelve el id de la instantánea.
+
+    `keyslot` va en la ranura A; la B queda vacía. El archivo se escribe en
+    un temporal y se renombra, así que un corte a mitad de camino deja
+    intacta la versión anterior.
+    """
+    chunks = [contacts[i:i + SEGMENT_SIZE] for i in range(0, len(contacts), SEGMENT_SIZE)]
+    encrypt = lambda chunk: _encrypt_segment(fernet, chunk, encoding)
+    tokens = list(executor.map(encrypt, chunks) if executor else map(encrypt, chunks))
+
+    segments = []
+    offset = 0
+    for chunk, token in zip(chunks, tokens):
+        segments.append([offset, len(token), len(chunk)])
+        offset += len(token)
+    snapshot = os.urandom(8).hex()
+    index = {"snapshot": snapshot, "total": len(contacts), "encoding": encoding,
+             "segments": segments}
+    header = fernet.encrypt(json.dumps(index).encode('utf-8'))
+
+    slots = encode_keyslot(keyslot) if keyslot else bytes(KEYSLOT_SIZE)
+    slots += bytes(KEYSLOT_SIZE * (KEYSLOT_COUNT - 1))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(MAGIC + bytes([FORMAT_VERSION]) + slots + _LENGTH.pack(len(header)))
+        file.write(header)
+        for token in tokens:
+            file.write(token)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    return snapshot
+
+class VaultReader:
+    """
+    Lector de la bóveda que desencripta los segmentos a pedido.
+
+    Al abrirlo solo se desencripta el índice. Los archivos del formato viejo
+    (un único token Fernet) no se pueden desencriptar por partes: se leen
+    enteros y se exponen como un solo segmento; `is_legacy` avisa que conviene
+    reescribirlos.
+    """
+
+    def __init__(self, path: str, fernet: Fernet):
+        self.path = path
+        self.fernet = fernet
+        self.is_legacy = False
+        self._legacy: Optional[List[Dict]] = None
+        with open(path, 'rb') as file:
+            prefix = file.read(_KEYSLOT_START)
+            if not prefix.startswith(MAGIC):
+                encrypted_data = prefix + file.read()
+                self.is_legacy = True
+                self.version = 0
+                self.encoding = "json"
+                self._legacy = json.loads(fernet.decrypt(encrypted_data))
+                self.snapshot_id = snapshot_id(encrypted_data)
+                self.total = len(self._legacy)
+                self.segments = [[0, len(encrypted_data), self.total]]
+                return
+            version = prefix[len(MAGIC)]
+            if version > FORMAT_VERSION:
+                raise ValueError(f"Versión de agenda no soportada: {version}")
+            if version >= 3:
+                file.seek(KEYSLOT_SIZE * KEYSLOT_COUNT, os.SEEK_CUR)
+            (header_length,) = _LENGTH.unpack(file.read(_LENGTH.size))
+            index = json.loads(fernet.decrypt(file.read(header_length)).decode('utf-8'))
+            self._data_start = file.tell()
+        self.version = version
+        self.encoding = index.get("encoding", "json")
+        self.snapshot_id = index["snapshot"]
+        self.total = index["total"]
+        self.segments = index["segments"]
+
+    @property
+    def segment_count(self) -> int:
+        return len(self.segments) if self.total else 0
+
+    def read_segment(self, number: int) -> List[Dict]:
+        """Desencripta un segmento y devuelve sus contactos."""
+        if self.is_legacy:
+            # Se entrega una sola vez para no retener una segunda copia
+            contacts, self._legacy = self._legacy or [], None
+        else:
+            offset, length, _count = self.segments[number]
+            with open(self.path, 'rb') as file:
+                file.seek(self._data_start + offset)
+                token = file.read(length)
+            if self.version >= 2:
+                token = base64.urlsafe_b64encode(token)
+            contacts = decode_payload(self.fernet.decrypt(token), self.encoding)
+            del token
+        # Asegurar que cada contacto tenga el campo 'birthday'
+        for contact in contacts:
+            contact.setdefault("birthday", "")
+        return contacts
+
+    def iter_contacts(self, executor: Optional[Executor] = None, start: int = 0,
+                      progress: Optional[Callable[[int, int], None]] = None) -> Iterator[Dict]:
+        """
+        Recorre los contactos segmento a segmento a partir del segmento `start`.
+
+        Con un executor se desencriptan hasta PREFETCH_SEGMENTS segmentos en
+        paralelo, nunca el archivo entero: en memoria quedan solo los contactos
+        ya entregados y esos pocos segmentos. `progress(cargados, total)` se
+        llama después de cada segmento (desde el hilo que recorre el iterador).
+        """
+        numbers = range(start, self.segment_count)
+        loaded = sum(count for _offset, _length, count in self.segments[:start])
+        if executor is None:
+            parts = map(self.read_segment, numbers)
+        else:
+            parts = self._prefetch(executor, numbers)
+        for part in parts:
+            loaded += len(part)
+            if progress:
+                progress(loaded, self.total)
+            yield from part
+
+    def _prefetch(self, executor: Executor, numbers: Iterable[int]) -> Iterator[List[Dict]]:
+        pending = deque()
+        for number in numbers:
+            pending.append(executor.submit(self.read_segment, number))
+            if len(pending) >= PREFETCH_SEGMENTS:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def read_all(self, executor: Optional[Executor] = None) -> List[Dict]:
+        """Desencripta todos los segmentos (en paralelo si se pasa un executor)."""
+        return list(self.iter_contacts(executor))
@@ -0,0 +1,291 @@
+"""
+Sesión de la bóveda para la aplicación Agenda
+Mantiene en memoria la clave de datos mientras la agenda está desbloqueada
+
+La agenda se encripta con una clave de datos aleatoria. Esa clave se guarda
+envuelta (encriptada) con la clave derivada de la contraseña en una ranura
+de clave del almacenamiento, así que cambiar la contraseña solo reescribe
+la ranura y no los contactos. La ranura guarda también el algoritmo, el
+costo y la salt con que se derivó la clave ("kdf").
+"""
+
+import base64
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, wait
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from cryptography.hazmat.primitives import hashes
+
+from storage import StorageBackend
+
+# Algoritmo para las ranuras nuevas y tiempo que se busca que tarde desbloquear
+KDF_ALGORITHM = "scrypt"
+KDF_TARGET_SECONDS = 0.5
+# Parámetros fijos de las versiones anteriores (ranuras sin "kdf")
+LEGACY_KDF = {"name": "pbkdf2-sha256", "iterations": 100000,
+              "salt": base64.b64encode(b'agenda_salt').decode('ascii')}
+# Límites de la calibración: nunca por debajo del costo de antes, y scrypt
+# hasta 128 MiB de memoria (n * r * 128 bytes)
+MIN_PBKDF2_ITERATIONS = 100000
+MIN_SCRYPT_N = 2 ** 14
+MAX_SCRYPT_N = 2 ** 17
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+def _kdf(params: Dict):
+    salt = base64.b64decode(params["salt"])
+    if params["name"] == "pbkdf2-sha256":
+        return PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt,
+                          iterations=params["iterations"])
+    if params["name"] == "scrypt":
+        return Scrypt(salt=salt, length=32, n=params["n"], r=params["r"], p=params["p"])
+    raise ValueError(f"Derivación de clave no soportada: {params['name']}")
+
+def derive_key(password: str, params: Optional[Dict] = None) -> bytes:
+    """Deriva una clave Fernet desde la contraseña con los parámetros de la ranura."""
+    kdf = _kdf(params or LEGACY_KDF)
+    return base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8')))
+
+def _kdf_seconds(params: Dict) -> float:
+    start = time.perf_counter()
+    _kdf(params).derive(b"calibracion")
+    return time.perf_counter() - start
+
+@lru_cache(maxsize=None)
+def _calibrated_cost(algorithm: str, target: float) -> tuple:
+    """Mide una derivación corta y extrapola el costo (se mide una vez por proceso)."""
+    salt = base64.b64encode(os.urandom(16)).decode('ascii')
+    if algorithm == "pbkdf2-sha256":
+        probe = 20000
+        elapsed = _kdf_seconds({"name": algorithm, "iterations": probe, "salt": salt})
+        iterations = int(probe * target / elapsed) // 1000 * 1000
+        return (("iterations", max(MIN_PBKDF2_ITERATIONS, iterations)),)
+    if algorithm == "scrypt":
+        # El tiempo de scrypt crece linealmente con n; n tiene que ser potencia de 2
+        n = 2 ** 12
+        elapsed = _kdf_seconds({"name": algorithm, "n": n, "r": SCRYPT_R, "p": SCRYPT_P, "salt": salt})
+        per_n = elapsed / n
+        while n < MAX_SCRYPT_N and per_n * n * 2 <= target:
+            n *= 2
+        return (("n", max(MIN_SCRYPT_N, n)), ("r", SCRYPT_R), ("p", SCRYPT_P))
+    raise ValueError(f"Derivación de clave no soportada: {algorithm}")
+
+def calibrate_kdf(algorithm: str = KDF_ALGORITHM, target: float = KDF_TARGET_SECONDS) -> Dict:
+    """
+    Elige parámetros para que derivar la clave tarde cerca de `target`
+    segundos en esta máquina, con una salt aleatoria nueva.
+    """
+    params = dict(_calibrated_cost(algorithm, target), name=algorithm)
+    params["salt"] = base64.b64encode(os.urandom(16)).decode('ascii')
+    return params
+
+def _cost(params: Dict) -> int:
+    return params["iterations"] if params["name"] == "pbkdf2-sha256" else params["n"]
+
+def needs_upgrade(params: Optional[Dict]) -> bool:
+    """
+    Indica si conviene volver a envolver la clave con parámetros nuevos:
+    ranuras sin parámetros (salt fija), de otro algoritmo, o con menos de
+    la mitad del costo que corresponde a esta máquina.
+    """
+    if params is None or params["name"] != KDF_ALGORITHM:
+        return True
+    return _cost(params) * 2 < _cost(calibrate_kdf())
+
+def wrap_key(password: str, data_key: bytes, params: Optional[Dict] = None) -> Dict:
+    """Arma la ranura de clave: la clave de datos encriptada con la contraseña."""
+    params = params or calibrate_kdf()
+    wrapped = Fernet(derive_key(password, params)).encrypt(data_key)
+    return {"kdf": params, "wrapped": wrapped.decode('ascii')}
+
+def unwrap_key(password: str, keyslot: Dict,
+               derive: Callable[[str, Optional[Dict]], bytes] = derive_key) -> bytes:
+    """Recupera la clave de datos de la ranura; falla si la contraseña no es la correcta."""
+    try:
+        key = derive(password, keyslot.get("kdf"))
+        return Fernet(key).decrypt(keyslot["wrapped"].encode('ascii'))
+    except InvalidToken:
+        raise ValueError("Contraseña incorrecta.")
+
+def _upgrade_keyslot(password: str, key: bytes, keyslot: Dict, storage: StorageBackend) -> None:
+    """Vuelve a envolver la clave de datos si la ranura quedó con parámetros débiles."""
+    if needs_upgrade(keyslot.get("kdf")):
+        try:
+            storage.write_keyslot(wrap_key(password, key))
+        except OSError:
+            pass  # Se reintenta en el próximo desbloqueo
+
+class VaultSession:
+    """
+    Clave de datos de una sesión desbloqueada.
+
+    La derivación se hace una sola vez al autenticarse; a partir de ahí
+    cada guardado reutiliza el mismo objeto Fernet. Al bloquear la sesión se
+    sobrescribe la copia de la clave que guardamos y se sueltan las referencias
+    (las copias internas de `cryptography` quedan a cargo del recolector).
+
+    Mientras se escribe la contraseña, `speculate` puede adelantar la
+    derivación en otro hilo: si al desbloquear la contraseña es la misma,
+    `unlock` usa ese resultado en lugar de volver a derivar. Nunca hay más
+    de una derivación a la vez (cada una puede ocupar 128 MiB con scrypt).
+    """
+
+    def __init__(self):
+        self._key: Optional[bytearray] = None
+        self._fernet: Optional[Fernet] = None
+        self._speculation_lock = threading.Lock()
+        # (contraseña, parámetros, derivación en curso o terminada)
+        self._speculation: Optional[Tuple[str, Dict, Future]] = None
+        self._pending: Optional[Tuple[str, Dict, Executor]] = None
+        # La última derivación adelantada mientras corre, aunque ya se haya descartado
+        self._running: Optional[Future] = None
+
+    @property
+    def is_unlocked(self) -> bool:
+        return self._fernet is not None
+
+    @property
+    def fernet(self) -> Fernet:
+        """Devuelve el Fernet de la sesión o falla si está bloqueada."""
+        if self._fernet is None:
+            raise ValueError("Agenda bloqueada: no hay clave de sesión.")
+        return self._fernet
+
+    @property
+    def key(self) -> bytes:
+        """Devuelve la clave Fernet (base64) para los motores de almacenamiento."""
+        if self._key is None:
+            raise ValueError("Agenda bloqueada: no hay clave de sesión.")
+        return bytes(self._key)
+
+    def unlock(self, password: str, storage: StorageBackend,
+               executor: Optional[Executor] = None) -> None:
+        """
+        Abre `storage` con la contraseña y deja la clave de datos en la sesión.
+
+        - Con ranura de clave: se desenvuelve la clave de datos. Si la ranura
+          usa parámetros de derivación viejos o más débiles que los que
+          corresponden a esta máquina, se vuelve a envolver (solo la ranura);
+          con `executor`, eso se hace en segundo plano.
+        - Agenda sin ranura (versiones anteriores, encriptada directamente con
+          la clave derivada): se reencripta una única vez con una clave de
+          datos nueva, guardada junto con su ranura en la misma escritura.
+        - Agenda nueva: se genera la clave de datos y su ranura.
+
+        Al terminar, bien o mal, se descarta la derivación adelantada.
+        """
+        try:
+            self._unlock(password, storage, executor)
+        finally:
+            self.cancel_speculation()
+
+    def _unlock(self, password: str, storage: StorageBackend, executor: Optional[Executor]) -> None:
+        keyslot = storage.read_keyslot() if storage.exists() else None
+        if keyslot is not None:
+            key = unwrap_key(password, keyslot, self._derive)
+            storage.set_key(key)
+            if executor is None:
+                _upgrade_keyslot(password, key, keyslot, storage)
+            else:
+                executor.submit(_upgrade_keyslot, password, key, keyslot, storage)
+        elif storage.exists():
+            storage.set_key(self._derive(password, LEGACY_KDF))
+            key = Fernet.generate_key()
+            storage.rekey(key, wrap_key(password, key))
+        else:
+            key = Fernet.generate_key()
+            storage.set_key(key)
+            storage.write_keyslot(wrap_key(password, key))
+        self._set_key(key)
+
+    def speculate(self, password: str, storage: StorageBackend, executor: Executor) -> None:
+        """
+        Empieza a derivar la clave de `password` en `executor` con los
+        parámetros de la ranura de `storage`.
+
+        Hay a lo sumo una derivación en curso (aunque se haya descartado):
+        si llega otra contraseña mientras tanto, queda pendiente la última y
+        se deriva al terminar.
+        Para una agenda nueva solo se adelanta la calibración.
+        """
+        if not password:
+            return
+        if not storage.exists():
+            executor.submit(calibrate_kdf)
+            return
+        keyslot = storage.read_keyslot()
+        params = keyslot.get("kdf") if keyslot is not None else None
+        params = params or LEGACY_KDF
+        with self._speculation_lock:
+            current = self._speculation
+            if current is not None and current[0] == password and current[1] == params:
+                return
+            if self._running is not None:
+                self._pending = (password, params, executor)
+                return
+            self._start_speculation(password, params, executor)
+        if keyslot is not None and keyslot.get("kdf") is not None:
+            # needs_upgrade calibra al desbloquear: dejarlo medido
+            executor.submit(calibrate_kdf)
+
+    def _start_speculation(self, password: str, params: Dict, executor: Executor) -> None:
+        # Se llama con _speculation_lock tomado
+        self._pending = None
+        future = executor.submit(derive_key, password, params)
+        self._speculation = (password, params, future)
+        self._running = future
+        future.add_done_callback(self._speculation_done)
+
+    def _speculation_done(self, future: Future) -> None:
+        with self._speculation_lock:
+            if self._running is future:
+                self._running = None
+            if self._pending is not None:
+                self._start_speculation(*self._pending)
+
+    def _derive(self, password: str, params: Optional[Dict]) -> bytes:
+        """Deriva la clave, usando la derivación adelantada si coincide."""
+        params = params or LEGACY_KDF
+        with self._speculation_lock:
+            speculation, self._speculation, self._pending = self._speculation, None, None
+            running = self._running
+        if speculation is not None and speculation[0] == password and speculation[1] == params:
+            try:
+                return speculation[2].result()
+            except Exception:
+                pass  # Se vuelve a intentar acá para que el error sea el de siempre
+        elif running is not None and not running.cancel():
+            # Ya empezó con otra contraseña: esperar a que termine en lugar de
+            # derivar las dos a la vez
+            wait([running])
+        return derive_key(password, params)
+
+    def cancel_speculation(self) -> None:
+        """Descarta la derivación adelantada (y su contraseña); si no empezó, no se hace."""
+        with self._speculation_lock:
+            speculation, self._speculation, self._pending = self._speculation, None, None
+        if speculation is not None:
+            speculation[2].cancel()
+
+    def rewrap(self, password: str) -> Dict:
+        """Devuelve la ranura de clave para una contraseña nueva (la clave de datos no cambia)."""
+        return wrap_key(password, self.key)
+
+    def _set_key(self, key: bytes) -> None:
+        self.lock()
+        self._key = bytearray(key)
+        self._fernet = Fernet(key)
+
+    def lock(self) -> None:
+        """Borra la clave de la sesión."""
+        self.cancel_speculation()
+        if self._key is not None:
+            for i in range(len(self._key)):
+                self._key[i] = 0
+        self._key = None
+        self._fernet = None
@@ -0,0 +1,299 @@
+"""
+Tabla virtual para la aplicación Agenda
+El Treeview solo contiene las filas visibles más un margen arriba y abajo;
+al desplazarse se quitan y agregan filas desde el modelo (la lista de ids de
+la vista). La barra de desplazamiento recibe la posición dentro de la lista
+completa, no dentro de las filas creadas
+
+En modo paginado se muestran páginas fijas de `page_size` filas: el
+Treeview tiene a lo sumo una página y su barra recorre solo esa página
+"""
+
+from tkinter import ttk
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Filas de más que se crean arriba y abajo de las visibles: permiten moverse
+# con las flechas y la rueda antes de que la tabla corra la ventana
+ROW_BUFFER = 10
+# Filas que se mueven por cada paso de la rueda del mouse
+WHEEL_ROWS = 3
+_DEFAULT_ROW_HEIGHT = 20
+# Bits de Shift y Control en event.state
+_EXTEND_MASK = 0x0001 | 0x0004
+
+class VirtualTable:
+    """
+    Vista virtual sobre un ttk.Treeview.
+
+    El iid de cada fila es el id del contacto, así que `identify_row` sigue
+    devolviendo ids. La selección se guarda en el modelo (las filas que salen
+    de la ventana dejan de existir en el Treeview): hay que leerla con
+    `selection()` y no con la del Treeview.
+
+    `on_render` (opcional) se llama cada vez que se vuelve a dibujar, por
+    ejemplo para actualizar un indicador de página.
+    """
+
+    def __init__(self, tree: ttk.Treeview, scrollbar: ttk.Scrollbar,
+                 row_values: Callable[[str], Tuple],
+                 on_render: Optional[Callable[[], None]] = None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_values = row_values
+        self.on_render = on_render
+        self._ids: List[str] = []
+        # Los mismos ids, para saber en O(1) si un contacto está en la vista
+        self._members: Set[str] = set()
+        # Cambia con cada modificación del modelo (para invalidar índices sobre las filas)
+        self.version = 0
+        # Filas por página (0: desplazamiento continuo)
+        self.page_size = 0
+        # Primera fila visible dentro de la lista completa (en modo paginado,
+        # la primera de la página)
+        self._offset = 0
+        # Filas creadas en el Treeview y cuántas de ellas quedan arriba de la vista
+        self._window: List[str] = []
+        self._above = 0
+        self._shown_offset = 0
+        self._visible = int(tree.cget("height") or 10)
+        self._selection: Dict[str, None] = {}
+        self._shown_selection: Tuple[str, ...] = ()
+        self._extend = False
+        tree.configure(yscrollcommand=self._on_tree_scroll)
+        scrollbar.configure(command=self.yview)
+        tree.bind('<<TreeviewSelect>>', self._on_select, add="+")
+        tree.bind('<ButtonPress-1>', self._on_input, add="+")
+        tree.bind('<KeyPress>', self._on_input, add="+")
+        tree.bind('<Configure>', self._on_resize, add="+")
+        tree.bind('<MouseWheel>', lambda event: self._wheel(-WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS))
+        tree.bind('<Button-4>', lambda event: self._wheel(-WHEEL_ROWS))
+        tree.bind('<Button-5>', lambda event: self._wheel(WHEEL_ROWS))
+        tree.bind('<Prior>', lambda event: self._scroll_and_break(-self._page_rows()))
+        tree.bind('<Next>', lambda event: self._scroll_and_break(self._page_rows()))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def set_rows(self, contact_ids: Sequence[str]) -> None:
+        """Reemplaza el modelo (conserva la posición y la selección que sigue en la vista)."""
+        self._ids = list(contact_ids)
+        self._members = set(self._ids)
+        self.version += 1
+        if self._selection:
+            self._selection = {contact_id: None for contact_id in self._selection
+                               if contact_id in self._members}
+        self._render(rebuild=True)
+
+    @property
+    def rows(self) -> List[str]:
+        """Ids de la vista, en orden (no modificar: usar insert_row/remove_row)."""
+        return self._ids
+
+    def __contains__(self, contact_id: str) -> bool:
+        return contact_id in self._members
+
+    def insert_row(self, position: int, contact_id: str) -> None:
+        """Agrega una fila al modelo; si cae en pantalla, solo se crea esa."""
+        self._ids.insert(position, contact_id)
+        self._members.add(contact_id)
+        self.version += 1
+        if position < self._offset and not self.page_size:
+            # Mantener quieta la vista si la fila entra por arriba
+            self._offset += 1
+        self._render()
+
+    def update_row(self, contact_id: str) -> None:
+        """Vuelve a pedir los valores de una fila (si está creada)."""
+        if contact_id in self._window:
+            self.tree.item(contact_id, values=self.row_values(contact_id))
+
+    def remove_row(self, contact_id: str, keep_selection: bool = False) -> None:
+        """
+        Quita una fila del modelo y de la selección (salvo `keep_selection`,
+        para moverla con insert_row sin perderla).
+        """
+        self.remove_rows([contact_id], keep_selection)
+
+    def remove_rows(self, contact_ids: Iterable[str], keep_selection: bool = False) -> None:
+        """
+        Como remove_row para varias filas a la vez: una sola pasada por el
+        modelo, en lugar de buscar la posición de cada una. Los ids que no
+        están en la vista se ignoran.
+        """
+        removed = self._members.intersection(contact_ids)
+        if not removed:
+            return
+        if len(removed) == 1:
+            position = self._ids.index(next(iter(removed)))
+            del self._ids[position]
+            above = int(position < self._offset)
+        else:
+            above = sum(1 for contact_id in self._ids[:self._offset] if contact_id in removed)
+            self._ids = [contact_id for contact_id in self._ids if contact_id not in removed]
+        self._members -= removed
+        self.version += 1
+        if not keep_selection:
+            for contact_id in removed:
+                self._selection.pop(contact_id, None)
+        if not self.page_size:
+            self._offset -= above
+        self._render()
+
+    def selection(self) -> Tuple[str, ...]:
+        """Ids seleccionados, incluidos los que no están en pantalla."""
+        return tuple(self._selection)
+
+    def select(self, contact_id: str) -> None:
+        """Selecciona solo ese contacto."""
+        self._selection = {contact_id: None}
+        self._render()
+
+    def set_page_size(self, page_size: int) -> None:
+        """Pasa a páginas de `page_size` filas (0: desplazamiento continuo), sin moverse de lugar."""
+        self.page_size = max(0, page_size)
+        if self.page_size:
+            self._offset -= self._offset % self.page_size
+        self._render(rebuild=True)
+
+    def page(self) -> Tuple[int, int]:
+        """(página actual, cantidad de páginas), contando desde 0; (0, 1) sin paginar."""
+        if not self.page_size:
+            return 0, 1
+        return self._offset // self.page_size, max(1, -(-len(self._ids) // self.page_size))
+
+    def show_page(self, page: int) -> None:
+        """Muestra la página `page` (se ajusta a las que existen)."""
+        if self.page_size:
+            self._offset = page * self.page_size
+            self._render()
+
+    def show_row(self, position: int) -> None:
+        """Lleva la vista a la fila `position`: su página, o arriba de todo sin paginar."""
+        if self.page_size:
+            self._offset = position - position % self.page_size
+        else:
+            self._offset = position
+        self._render()
+        contact_id = self._ids[position] if 0 <= position < len(self._ids) else None
+        if contact_id is not None and contact_id in self._window:
+            self.tree.see(contact_id)
+
+    def yview(self, *args):
+        """Comando de la barra de desplazamiento, en filas de la lista completa."""
+        if self.page_size:
+            # La barra recorre solo la página
+            return self.tree.yview(*args)
+        if not args:
+            return self._fractions()
+        if args[0] == "moveto":
+            self._offset = round(float(args[1]) * len(self._ids))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            self._offset += amount * self._visible if args[2] == "pages" else amount
+        self._render()
+
+    def _page_rows(self) -> int:
+        return self.page_size or self._visible
+
+    def _scroll_and_break(self, rows: int) -> str:
+        self._offset += rows
+        self._render()
+        return "break"
+
+    def _wheel(self, rows: int) -> Optional[str]:
+        if self.page_size:
+            return None  # Dentro de la página desplaza el Treeview
+        return self._scroll_and_break(rows)
+
+    def _fractions(self) -> Tuple[float, float]:
+        total = len(self._ids)
+        if not total:
+            return 0.0, 1.0
+        return self._offset / total, min(1.0, (self._offset + self._visible) / total)
+
+    def _estimated_rows(self) -> int:
+        """Filas que entran según el alto del widget (incluye una de más por el encabezado)."""
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or _DEFAULT_ROW_HEIGHT
+        return max(1, self.tree.winfo_height() // int(row_height))
+
+    def _render(self, rebuild: bool = False) -> None:
+        total = len(self._ids)
+        if self.page_size:
+            last_page = max(0, total - 1) // self.page_size
+            self._offset = max(0, min(self._offset // self.page_size, last_page)) * self.page_size
+            start, end = self._offset, self._offset + self.page_size
+        else:
+            self._offset = max(0, min(self._offset, total - self._visible))
+            start = max(0, self._offset - ROW_BUFFER)
+            end = self._offset + max(self._visible, self._estimated_rows()) + ROW_BUFFER
+        window = self._ids[start:end]
+        if rebuild:
+            if self._window:
+                self.tree.delete(*self._window)
+            for contact_id in window:
+                self.tree.insert("", "end", iid=contact_id, values=self.row_values(contact_id))
+        elif window != self._window:
+            # La ventana se corrió: las filas que siguen mantienen su orden
+            current = set(window)
+            stale = [contact_id for contact_id in self._window if contact_id not in current]
+            if stale:
+                self.tree.delete(*stale)
+            kept = set(self._window)
+            for position, contact_id in enumerate(window):
+                if contact_id not in kept:
+                    self.tree.insert("", position, iid=contact_id, values=self.row_values(contact_id))
+        self._window = window
+        self._above = self._offset - start
+        shown = tuple(contact_id for contact_id in window if contact_id in self._selection)
+        self._shown_selection = shown
+        if shown != self.tree.selection():
+            self.tree.selection_set(shown)
+        if self.page_size:
+            if rebuild or self._offset != self._shown_offset:
+                self.tree.yview_moveto(0)
+        else:
+            if window:
+                self.tree.yview_moveto(self._above / len(window))
+            self.scrollbar.set(*self._fractions())
+        self._shown_offset = self._offset
+        if self.on_render is not None:
+            self.on_render()
+
+    def _on_tree_scroll(self, first, last) -> None:
+        """El Treeview informa su vista: medir las filas visibles y seguir sus desplazamientos propios."""
+        if self.page_size:
+            self.scrollbar.set(first, last)
+            return
+        first, last = float(first), float(last)
+        count = len(self._window)
+        if not count:
+            self.scrollbar.set(*self._fractions())
+            return
+        if last < 1.0 or first > 0.0:
+            self._visible = max(1, round((last - first) * count))
+        top = round(first * count)
+        if top != self._above:
+            # Se movió con el teclado (o `see`) dentro del margen: correr la ventana
+            self._offset += top - self._above
+            self._render()
+        else:
+            self.scrollbar.set(*self._fractions())
+
+    def _on_resize(self, event=None) -> None:
+        self._render()
+
+    def _on_input(self, event) -> None:
+        # Con Shift o Control la selección se extiende: se conserva la que no está en pantalla
+        self._extend = bool(event.state & _EXTEND_MASK)
+
+    def _on_select(self, event=None) -> None:
+        selected = self.tree.selection()
+        if selected == self._shown_selection:
+            return  # la puso _render
+        if self._extend:
+            window = set(self._window)
+            kept = [contact_id for contact_id in self._selection if contact_id not in window]
+        else:
+            kept = []
+        self._selection = dict.fromkeys(kept + list(selected))
+        self._shown_selection = selected